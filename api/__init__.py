@@ -1,4 +1,5 @@
 import time
+from collections.abc import Iterator
 from functools import reduce
 from functools import wraps
 from http import HTTPStatus
@@ -10,6 +11,7 @@ from ratelimit import RateLimitException
 from api.metrics import api_request_count
 from api.segmentio import segmentio_track
 from app.logging import get_logger
+from app.logging import threadctx
 
 __all__ = ["api_operation"]
 
@@ -18,6 +20,9 @@ PROCESSING_TIME = "processing_time"
 
 ESCAPE_CHARS = '.?+*|{}[]()"\\#@&<>~$'
 
+# The approximate number of characters written at once by the streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
 logger = get_logger(__name__)
 
 
@@ -73,6 +78,66 @@ def flask_json_response(json_data, status=HTTPStatus.OK):
     return flask.Response(ujson.dumps(json_data), status=status, mimetype="application/json")
 
 
+def _json_array_fragments(items):
+    yield "["
+    for index, item in enumerate(items):
+        yield f"{',' if index else ''}{ujson.dumps(item)}"
+    yield "]"
+
+
+def _json_fragments(json_data):
+    if not isinstance(json_data, dict):
+        yield from _json_array_fragments(json_data)
+        return
+
+    yield "{"
+    for index, (key, value) in enumerate(json_data.items()):
+        yield f"{',' if index else ''}{ujson.dumps(key)}:"
+        if isinstance(value, (list, Iterator)):
+            yield from _json_array_fragments(value)
+        else:
+            yield ujson.dumps(value)
+    yield "}"
+
+
+def iter_json_chunks(json_data, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Serializes json_data as the same JSON as ujson.dumps, in chunks of about chunk_size characters.
+    json_data is a list or an iterator, or an object whose values may be. Their items are serialized
+    one at a time, so neither the whole document nor all of the items have to be held in memory.
+    """
+    chunk = []
+    chunk_length = 0
+    for fragment in _json_fragments(json_data):
+        chunk.append(fragment)
+        chunk_length += len(fragment)
+        if chunk_length >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            chunk_length = 0
+
+    if chunk:
+        yield "".join(chunk)
+
+
+def _log_stream_errors(chunks, request_id):
+    # The status and the first chunks may already have been sent when a later item fails to serialize,
+    # so the error can't be returned to the client. It is logged in the context of the request instead,
+    # and raised again, so that the server drops the connection rather than end an incomplete body.
+    try:
+        yield from chunks
+    except Exception:
+        threadctx.request_id = request_id
+        logger.exception("Streaming the response body failed; the response is incomplete")
+        raise
+
+
+def flask_json_stream_response(json_data, status=HTTPStatus.OK):
+    # The body is generated after the view returns, so it keeps the request context it needs.
+    chunks = _log_stream_errors(iter_json_chunks(json_data), getattr(threadctx, "request_id", None))
+    return flask.Response(flask.stream_with_context(chunks), status=status, mimetype="application/json")
+
+
 def build_collection_response(data, page, per_page, total):
     return {"total": total, "count": len(data), "page": page, "per_page": per_page, "results": data}
 
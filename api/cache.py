@@ -1,10 +1,24 @@
+import hashlib
+import json
+import time
 from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 import connexion
+import flask
 from flask_caching import Cache
 from redis import Redis
+from redis.exceptions import LockError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
+from api.metrics import api_cached_responses_coalesced
+from api.metrics import api_cached_responses_hit
+from app.auth import get_current_identity
+from app.auth.identity import IdentityType
 from app.logging import get_logger
+from app.models import db
+from lib.db import primary_reads
 
 CACHE_CONFIG = {"CACHE_TYPE": "NullCache"}
 CACHE = Cache(config=CACHE_CONFIG)
@@ -12,6 +26,14 @@ CACHE_PREFIX = "flask_cache_"
 CACHE_TYPE_REDIS_CACHE = "RedisCache"
 CACHE_EXECUTOR = None
 REDIS_CLIENT = None
+GENERATION_KEY_PREFIX = f"{CACHE_PREFIX}generation_"
+GENERATION_TIMEOUT = 0
+RESPONSE_CACHE_TIMEOUT = 0
+# How long a worker may compute a response before the workers waiting for it compute it themselves
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+# The session info key of the orgs whose cached responses are invalidated when the session commits
+PENDING_RESPONSE_INVALIDATIONS_KEY = "cached_response_org_ids"
 logger = get_logger("cache")
 
 
@@ -19,9 +41,17 @@ def init_cache(app_config, flask_app):
     global CACHE
     global CACHE_CONFIG
     global CACHE_EXECUTOR
+    global GENERATION_TIMEOUT
+    global RESPONSE_CACHE_TIMEOUT
     cache_type = "NullCache"
     logger.info("Initializing Cache")
 
+    RESPONSE_CACHE_TIMEOUT = app_config.api_response_cache_timeout
+    # The generations outlive every entry cached under them
+    GENERATION_TIMEOUT = max(
+        app_config.api_cache_timeout, app_config.cache_insights_client_system_timeout_sec, RESPONSE_CACHE_TIMEOUT
+    )
+
     CACHE_EXECUTOR = ThreadPoolExecutor(app_config.api_cache_max_thread_pool_workers)
     CACHE_CONFIG = {"CACHE_TYPE": cache_type, "CACHE_DEFAULT_TIMEOUT": app_config.api_cache_timeout}
     if app_config.api_cache_type == CACHE_TYPE_REDIS_CACHE and app_config._cache_host and app_config._cache_port:
@@ -42,57 +72,87 @@ def init_cache(app_config, flask_app):
         logger.info(f"Cache not initialized with app. Passed the following for the app={flask_app}.")
 
 
-def _delete_keys_redis(cache_key, wildcard=True):
-    global CACHE_CONFIG
+def _get_redis_client():
     global REDIS_CLIENT
+    if not REDIS_CLIENT:
+        REDIS_CLIENT = Redis(host=CACHE_CONFIG.get("CACHE_REDIS_HOST"), port=CACHE_CONFIG.get("CACHE_REDIS_PORT"))
+        logger.info("Instantiated Redis client")
+    return REDIS_CLIENT
+
+
+def _is_redis_cache():
+    return bool(CACHE_CONFIG) and CACHE_CONFIG.get("CACHE_TYPE") == CACHE_TYPE_REDIS_CACHE
+
+
+def _org_generation_key(org_id):
+    return f"{GENERATION_KEY_PREFIX}org={org_id}"
+
+
+def _system_generation_key(insights_id, org_id):
+    return f"{GENERATION_KEY_PREFIX}insights_id={insights_id}_org={org_id}"
+
+
+def _response_generation_key(org_id):
+    return f"{GENERATION_KEY_PREFIX}responses_org={org_id}"
+
+
+def versioned_system_key(system_key, insights_id, org_id):
+    """
+    Adds the current generations of the org's and the system's cached entries to the system key,
+    or returns None if they can't be read. The entries cached under older generations are never
+    read again, and expire on their own.
+    """
+    if not _is_redis_cache():
+        return system_key
+
     try:
-        if not REDIS_CLIENT:
-            REDIS_CLIENT = Redis(host=CACHE_CONFIG.get("CACHE_REDIS_HOST"), port=CACHE_CONFIG.get("CACHE_REDIS_PORT"))
-            logger.info("Instantiated Redis client")
-        if wildcard:
-            keys_to_delete = []
-            # Use SCAN to find keys to delete that start with the prefix; default prefix is flask_cache_
-            for key in REDIS_CLIENT.scan_iter(f"{CACHE_PREFIX}{cache_key}*"):
-                keys_to_delete.append(key)
-            if keys_to_delete:
-                REDIS_CLIENT.delete(*keys_to_delete)
-                logger.info(f"Deleted cache keys count: {len(keys_to_delete)}")
-            else:
-                logger.info(f"Found no matching cache keys for pattern: {CACHE_PREFIX}{cache_key}*")
-        else:
-            REDIS_CLIENT.delete(f"{CACHE_PREFIX}{cache_key}")
-            logger.info(f"Deleted single cache key: {CACHE_PREFIX}{cache_key}")
+        org_generation, system_generation = _get_redis_client().mget(
+            _org_generation_key(org_id), _system_generation_key(insights_id, org_id)
+        )
     except Exception as exec:
-        logger.exception("Cache deletion failed", exc_info=exec)
+        logger.exception("Reading the cache generations failed", exc_info=exec)
+        return None
 
+    return f"{system_key}_gen={int(org_generation or 0)}.{int(system_generation or 0)}"
 
-def delete_keys(cache_key, wildcard=True, spawn=False):
-    global CACHE_CONFIG
+
+def _increment_generation_redis(generation_key):
+    try:
+        # A generation starts from the current time instead of 0, so a generation key that expired
+        # and is created again does not go back to the generations the live entries were cached under.
+        pipeline = _get_redis_client().pipeline()
+        pipeline.set(generation_key, time.time_ns(), nx=True)
+        pipeline.incr(generation_key)
+        if GENERATION_TIMEOUT:
+            pipeline.expire(generation_key, GENERATION_TIMEOUT)
+        pipeline.execute()
+        logger.info(f"Incremented cache generation: {generation_key}")
+    except Exception as exec:
+        logger.exception("Cache invalidation failed", exc_info=exec)
+
+
+def increment_generation(generation_key, spawn=False):
     global CACHE_EXECUTOR
 
-    if CACHE_CONFIG and CACHE_CONFIG.get("CACHE_TYPE") == CACHE_TYPE_REDIS_CACHE and cache_key:
+    if _is_redis_cache():
         if spawn and CACHE_EXECUTOR:
-            logger.info("Submitted cache-deletion callable to executor")
-            CACHE_EXECUTOR.submit(_delete_keys_redis, cache_key, wildcard)
+            logger.info("Submitted cache-invalidation callable to executor")
+            CACHE_EXECUTOR.submit(_increment_generation_redis, generation_key)
         else:
-            _delete_keys_redis(cache_key=cache_key, wildcard=wildcard)
+            _increment_generation_redis(generation_key)
     else:
         if not CACHE_CONFIG:
-            logger.info("Not deleting cache: CACHE_CONFIG is falsy")
-        elif not cache_key:
-            logger.info("Not deleting cache: cache_key is falsy")
+            logger.info("Not invalidating cache: CACHE_CONFIG is falsy")
         else:
             cache_type = CACHE_CONFIG.get("CACHE_TYPE")
-            logger.info(f"Not deleting cache: CACHE_TYPE '{cache_type}' != '{CACHE_TYPE_REDIS_CACHE}'")
+            logger.info(f"Not invalidating cache: CACHE_TYPE '{cache_type}' != '{CACHE_TYPE_REDIS_CACHE}'")
 
 
-def delete_cached_system_keys(insights_id=None, org_id=None, owner_id=None, spawn=False):
-    if insights_id and org_id and owner_id:
-        delete_keys(f"insights_id={insights_id}_org={org_id}_user=SYSTEM-{owner_id}", wildcard=False, spawn=spawn)
-    elif insights_id and org_id and not owner_id:
-        delete_keys(f"insights_id={insights_id}_org={org_id}", wildcard=True, spawn=spawn)
-    elif not insights_id and org_id:
-        delete_keys(f"insights_id=*_org={org_id}", wildcard=True, spawn=spawn)
+def invalidate_cached_systems(insights_id=None, org_id=None, spawn=False):
+    if insights_id and org_id:
+        increment_generation(_system_generation_key(insights_id, org_id), spawn=spawn)
+    elif org_id:
+        increment_generation(_org_generation_key(org_id), spawn=spawn)
 
 
 def set_cached_system(system_key, host, config):
@@ -106,3 +166,122 @@ def set_cached_system(system_key, host, config):
         CACHE.set(key=system_key, value=host, timeout=config.cache_insights_client_system_timeout_sec)
     except Exception as exec:
         logger.exception("Cache deletion failed", exc_info=exec)
+
+
+def _response_cache_key(identity, rbac_filter):
+    # System identities only see the hosts they own, and the users only the groups RBAC gives them
+    owner_id = identity.system.get("cn") if identity.identity_type == IdentityType.SYSTEM else None
+    groups = sorted(str(group_id) for group_id in rbac_filter.get("groups", ())) if rbac_filter else None
+    request = flask.request
+    fingerprint = hashlib.sha256(
+        json.dumps(
+            {
+                "owner_id": owner_id,
+                "groups": groups,
+                "path": request.path,
+                "args": sorted(request.args.lists()),
+            },
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()
+    generation = _get_redis_client().get(_response_generation_key(identity.org_id))
+    return f"response_org={identity.org_id}_gen={int(generation or 0)}_{fingerprint}"
+
+
+def _cached_response(cached):
+    body, status, mimetype = cached
+    return flask.Response(body, status=status, mimetype=mimetype)
+
+
+def _wait_for_cached_response(cache_key, lock):
+    # Polls for the response the lock holder computes, until it's cached or the lock is released or expires
+    deadline = time.monotonic() + RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        if (cached := CACHE.get(cache_key)) is not None:
+            return cached
+        if not lock.locked():
+            return CACHE.get(cache_key)
+        time.sleep(RESPONSE_CACHE_POLL_INTERVAL)
+    return None
+
+
+def cached_response(func):
+    """
+    Caches the successful responses of a read endpoint in Redis, per org, RBAC groups, path and query.
+    Concurrent misses of the same response are computed once: the worker that takes the response's lock
+    computes it, and the others wait for its result. The org's cached responses are invalidated by
+    invalidate_cached_responses, called when its hosts change. The cached responses are computed
+    from the primary, not the read replica, which may not have the changes yet.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not RESPONSE_CACHE_TIMEOUT or not _is_redis_cache():
+            return func(*args, **kwargs)
+
+        try:
+            cache_key = _response_cache_key(get_current_identity(), kwargs.get("rbac_filter"))
+            if (cached := CACHE.get(cache_key)) is not None:
+                api_cached_responses_hit.inc()
+                return _cached_response(cached)
+
+            lock = _get_redis_client().lock(f"{CACHE_PREFIX}lock_{cache_key}", timeout=RESPONSE_CACHE_LOCK_TIMEOUT)
+            if not lock.acquire(blocking=False):
+                if (cached := _wait_for_cached_response(cache_key, lock)) is not None:
+                    api_cached_responses_coalesced.inc()
+                    return _cached_response(cached)
+                lock = None
+        except Exception as exec:
+            logger.exception("Reading the response cache failed", exc_info=exec)
+            return func(*args, **kwargs)
+
+        try:
+            with primary_reads(db.session):
+                response = func(*args, **kwargs)
+                if isinstance(response, flask.Response) and response.status_code == 200:
+                    # A streamed response is read whole here, to be cached
+                    CACHE.set(
+                        cache_key,
+                        (response.get_data(), response.status_code, response.mimetype),
+                        timeout=RESPONSE_CACHE_TIMEOUT,
+                    )
+            return response
+        finally:
+            if lock:
+                try:
+                    lock.release()
+                except LockError:
+                    logger.info(f"The response cache lock expired before the response was computed: {cache_key}")
+
+    return wrapper
+
+
+def invalidate_cached_responses(org_id, session=None):
+    """
+    Invalidates the org's cached responses when the session's transaction commits,
+    so that a response computed from the data before the commit is not read after it.
+    The writers invalidate whenever Redis is configured, even the jobs and consumers that don't cache responses.
+    """
+    if not _is_redis_cache():
+        return
+
+    if session is None:
+        session = db.session
+
+    session.info.setdefault(PENDING_RESPONSE_INVALIDATIONS_KEY, set()).add(org_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pending_cached_responses(session):
+    # An API write is invalidated before its request returns, so that a read right after it is not served
+    # the response cached before it. The consumers and jobs leave the invalidation to the executor.
+    spawn = not flask.has_request_context()
+    for org_id in sorted(session.info.pop(PENDING_RESPONSE_INVALIDATIONS_KEY, ())):
+        increment_generation(_response_generation_key(org_id), spawn=spawn)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_cached_responses_invalidations(session, transaction):
+    # The changes were rolled back, if the invalidations were not done with the commit.
+    if transaction.parent is None:
+        session.info.pop(PENDING_RESPONSE_INVALIDATIONS_KEY, None)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from copy import deepcopy
+from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
 from functools import partial
 from uuid import UUID
 
@@ -30,13 +32,18 @@ from app.models import HostGroupAssoc
 from app.models import db
 from app.serialization import serialize_staleness_to_dict
 from app.utils import Tag
+from lib.feature_flags import FLAG_INVENTORY_STALENESS_COLUMNS
+from lib.feature_flags import get_flag_value
 
 __all__ = (
     "canonical_fact_filter",
     "query_filters",
     "host_id_list_filter",
     "rbac_permissions_filter",
+    "stale_in_window_columns_filter",
     "stale_timestamp_filter",
+    "staleness_columns_filter",
+    "staleness_columns_enabled",
     "staleness_to_conditions",
     "update_query_for_owner_id",
 )
@@ -99,6 +106,31 @@ def stale_timestamp_filter(gt=None, lte=None):
     return and_(*filters)
 
 
+def staleness_columns_enabled() -> bool:
+    return get_flag_value(FLAG_INVENTORY_STALENESS_COLUMNS)
+
+
+def staleness_columns_filter(staleness_states):
+    """
+    Filters by staleness states using the stored staleness columns. These already account for
+    the host type and the org's staleness settings, so each state is a plain range condition.
+    """
+    now = datetime.now(timezone.utc)
+    conditions = {
+        "fresh": Host.stale_at > now,
+        "stale": and_(Host.stale_at <= now, Host.stale_warning_at > now),
+        "stale_warning": and_(Host.stale_warning_at <= now, Host.culled_at > now),
+        "culled": Host.culled_at <= now,
+        "not_culled": Host.culled_at > now,
+    }
+    return or_(False, *(conditions[state] for state in staleness_states if state != "unknown"))
+
+
+def stale_in_window_columns_filter(last_run_secs, job_start_time):
+    # The hosts that went stale in the last last_run_secs before job_start_time
+    return and_(Host.stale_at > job_start_time - timedelta(seconds=last_run_secs), Host.stale_at <= job_start_time)
+
+
 def _host_type_filter(host_type: str | None):
     return Host.system_profile_facts["host_type"].as_string() == host_type
 
@@ -162,6 +194,13 @@ def per_reporter_staleness_filter(staleness, reporter, host_type_filter, org_id)
 
 
 def _staleness_filter(staleness: list[str] | tuple[str, ...], host_type_filter: set[str | None], org_id) -> list:
+    if staleness_columns_enabled():
+        if len(host_type_filter) > 1:
+            # Like the expression filter below, the hosts are restricted to the requested host types
+            host_types = or_(*(_host_type_filter(host_type) for host_type in host_type_filter))
+            return [and_(staleness_columns_filter(staleness), host_types)]
+        return [staleness_columns_filter(staleness)]
+
     staleness_obj = serialize_staleness_to_dict(get_staleness_obj(org_id))
     staleness_conditions = []
     for host_type in host_type_filter:
@@ -9,12 +9,17 @@ from marshmallow import ValidationError
 from api import api_operation
 from api import build_collection_response
 from api import flask_json_response
+from api import flask_json_stream_response
 from api import metrics
 from api import pagination_params
 from api.cache import CACHE
-from api.cache import delete_cached_system_keys
+from api.cache import cached_response
+from api.cache import invalidate_cached_responses
+from api.cache import invalidate_cached_systems
+from api.cache import versioned_system_key
 from api.cache_key import make_system_cache_key
 from api.filtering.db_filters import update_query_for_owner_id
+from api.host_count_query import invalidate_host_count_cache
 from api.host_query import build_paginated_host_list_response
 from api.host_query import staleness_timestamps
 from api.host_query_db import get_all_hosts
@@ -69,6 +74,7 @@ logger = get_logger(__name__)
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_host_list(
     display_name=None,
@@ -89,10 +95,13 @@ def get_host_list(
     registered_with=None,
     filter=None,
     fields=None,
+    cursor=None,
+    total=None,
     rbac_filter=None,
 ):
-    total = 0
+    host_count = 0
     host_list = ()
+    next_cursor = None
     owner_id = None
     current_identity = get_current_identity()
     has_complex_params = any(
@@ -111,6 +120,8 @@ def get_host_list(
             registered_with,
             filter,
             fields,
+            cursor,
+            total,
         ]
     )
     is_cached_insights_client_system_query = (
@@ -125,8 +136,11 @@ def get_host_list(
     if is_cached_insights_client_system_query:
         logger.info(f"{FLAG_INVENTORY_USE_CACHED_INSIGHTS_CLIENT_SYSTEM} is applied")
         owner_id = current_identity.system.get("cn")
-        system_key = make_system_cache_key(insights_id, current_identity.org_id, owner_id)
-        stored_system = CACHE.get(f"{system_key}")
+        # The key is read before the hosts, so a host changed in between is not cached under the current generation
+        system_key = versioned_system_key(
+            make_system_cache_key(insights_id, current_identity.org_id, owner_id), insights_id, current_identity.org_id
+        )
+        stored_system = CACHE.get(system_key) if system_key else None
         if stored_system:
             host_list = [stored_system]
             json_data = build_paginated_host_list_response(1, page, per_page, host_list, serialize_hosts=False)
@@ -134,7 +148,7 @@ def get_host_list(
             return flask_json_response(json_data)
 
     try:
-        host_list, total, additional_fields, system_profile_fields = get_host_list_from_db(
+        host_list, host_count, additional_fields, system_profile_fields, next_cursor = get_host_list_from_db(
             display_name,
             fqdn,
             hostname_or_id,
@@ -154,21 +168,29 @@ def get_host_list(
             filter,
             fields,
             rbac_filter,
+            cursor,
+            total,
         )
     except ValueError as e:
         log_get_host_list_failed(logger)
         flask.abort(400, str(e))
 
     json_data = build_paginated_host_list_response(
-        total, page, per_page, host_list, additional_fields, system_profile_fields
+        host_count,
+        page,
+        per_page,
+        host_list,
+        additional_fields,
+        system_profile_fields,
+        next_cursor=next_cursor,
+        host_fields=(fields or {}).get("host"),
     )
-    if is_cached_insights_client_system_query and len(host_list) == 1:
-        system_key = make_system_cache_key(insights_id, current_identity.org_id, owner_id)
+    if is_cached_insights_client_system_query and system_key and len(host_list) == 1:
         output_host = serialize_host_with_params(host_list[0])
         timeout = inventory_config().cache_insights_client_system_timeout_sec
         CACHE.set(key=system_key, value=output_host, timeout=timeout)
 
-    return flask_json_response(json_data)
+    return flask_json_stream_response(json_data)
 
 
 @api_operation
@@ -319,11 +341,22 @@ def delete_host_by_id(host_id_list, rbac_filter=None):
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
-def get_host_by_id(host_id_list, page=1, per_page=100, order_by=None, order_how=None, fields=None, rbac_filter=None):
+def get_host_by_id(
+    host_id_list,
+    page=1,
+    per_page=100,
+    order_by=None,
+    order_how=None,
+    fields=None,
+    cursor=None,
+    total=None,
+    rbac_filter=None,
+):
     try:
-        host_list, total, additional_fields, system_profile_fields = get_host_list_by_id_list(
-            host_id_list, page, per_page, order_by, order_how, fields, rbac_filter
+        host_list, host_count, additional_fields, system_profile_fields, next_cursor = get_host_list_by_id_list(
+            host_id_list, page, per_page, order_by, order_how, fields, rbac_filter, cursor, total
         )
     except ValueError as e:
         log_get_host_list_failed(logger)
@@ -332,30 +365,47 @@ def get_host_by_id(host_id_list, page=1, per_page=100, order_by=None, order_how=
     log_get_host_list_succeeded(logger, host_list)
 
     json_data = build_paginated_host_list_response(
-        total, page, per_page, host_list, additional_fields, system_profile_fields
+        host_count,
+        page,
+        per_page,
+        host_list,
+        additional_fields,
+        system_profile_fields,
+        next_cursor=next_cursor,
+        host_fields=(fields or {}).get("host"),
     )
-    return flask_json_response(json_data)
+    return flask_json_stream_response(json_data)
 
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_host_system_profile_by_id(
-    host_id_list, page=1, per_page=100, order_by=None, order_how=None, fields=None, rbac_filter=None
+    host_id_list,
+    page=1,
+    per_page=100,
+    order_by=None,
+    order_how=None,
+    fields=None,
+    cursor=None,
+    total=None,
+    rbac_filter=None,
 ):
     try:
-        total, host_list = get_sparse_system_profile(
-            host_id_list, page, per_page, order_by, order_how, fields, rbac_filter
+        host_count, host_list, next_cursor = get_sparse_system_profile(
+            host_id_list, page, per_page, order_by, order_how, fields, rbac_filter, cursor, total
         )
     except ValueError as e:
         log_get_host_list_failed(logger)
         flask.abort(400, str(e))
 
-    json_output = build_collection_response(host_list, page, per_page, total)
-    return flask_json_response(json_output)
+    json_output = build_collection_response(host_list, page, per_page, host_count)
+    json_output["next_cursor"] = next_cursor
+    return flask_json_stream_response(json_output)
 
 
-def _emit_patch_event(serialized_host, host):
+def _emit_patch_event(serialized_host, host, wait=True):
     headers = message_headers(
         EventType.updated,
         host.canonical_facts.get("insights_id"),
@@ -366,7 +416,7 @@ def _emit_patch_event(serialized_host, host):
     )
     metadata = {"b64_identity": to_auth_header(get_current_identity())}
     event = build_event(EventType.updated, serialized_host, platform_metadata=metadata)
-    current_app.event_producer.write_event(event, str(host.id), headers, wait=True)
+    current_app.event_producer.write_event(event, str(host.id), headers, wait=wait)
 
 
 @api_operation
@@ -393,13 +443,17 @@ def patch_host_by_id(host_id_list, body, rbac_filter=None):
         host.patch(validated_patch_host_data)
 
         if db.session.is_modified(host):
+            invalidate_host_count_cache(host.org_id)
+            invalidate_cached_responses(host.org_id)
             db.session.commit()
             serialized_host = serialize_host(host, staleness_timestamps(), staleness=staleness)
-            _emit_patch_event(serialized_host, host)
+            _emit_patch_event(serialized_host, host, wait=False)
             insights_id = host.canonical_facts.get("insights_id")
             owner_id = host.system_profile_facts.get("owner_id")
             if insights_id and owner_id:
-                delete_cached_system_keys(insights_id=insights_id, org_id=current_identity.org_id, owner_id=owner_id)
+                invalidate_cached_systems(insights_id=insights_id, org_id=current_identity.org_id)
+
+    current_app.event_producer.flush()
 
     log_patch_host_success(logger, host_id_list)
     return 200
@@ -468,13 +522,17 @@ def update_facts_by_namespace(operation, host_id_list, namespace, fact_dict, rba
             host.merge_facts_in_namespace(namespace, fact_dict)
 
         if db.session.is_modified(host):
+            invalidate_host_count_cache(host.org_id)
+            invalidate_cached_responses(host.org_id)
             db.session.commit()
             serialized_host = serialize_host(host, staleness_timestamps(), staleness=staleness)
-            _emit_patch_event(serialized_host, host)
+            _emit_patch_event(serialized_host, host, wait=False)
             insights_id = host.canonical_facts.get("insights_id")
             owner_id = host.system_profile_facts.get("owner_id")
             if insights_id and owner_id:
-                delete_cached_system_keys(insights_id=insights_id, org_id=current_identity.org_id, owner_id=owner_id)
+                invalidate_cached_systems(insights_id=insights_id, org_id=current_identity.org_id)
+
+    current_app.event_producer.flush()
 
     logger.debug("hosts_to_update:%s", hosts_to_update)
 
@@ -483,6 +541,7 @@ def update_facts_by_namespace(operation, host_id_list, namespace, fact_dict, rba
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_host_tag_count(host_id_list, page=1, per_page=100, order_by=None, order_how=None, rbac_filter=None):
     limit, offset = pagination_params(page, per_page)
@@ -494,6 +553,7 @@ def get_host_tag_count(host_id_list, page=1, per_page=100, order_by=None, order_
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_host_tags(host_id_list, page=1, per_page=100, order_by=None, order_how=None, search=None, rbac_filter=None):
     limit, offset = pagination_params(page, per_page)
@@ -519,13 +579,15 @@ def host_checkin(body, rbac_filter=None):  # noqa: ARG001, required for all API
     staleness = get_staleness_obj(current_identity.org_id)
     if existing_host:
         existing_host._update_modified_date()
+        invalidate_host_count_cache(existing_host.org_id)
+        invalidate_cached_responses(existing_host.org_id)
         db.session.commit()
         serialized_host = serialize_host(existing_host, staleness_timestamps(), staleness=staleness)
         _emit_patch_event(serialized_host, existing_host)
         insights_id = existing_host.canonical_facts.get("insights_id")
         owner_id = existing_host.system_profile_facts.get("owner_id")
         if insights_id and owner_id:
-            delete_cached_system_keys(insights_id=insights_id, org_id=current_identity.org_id, owner_id=owner_id)
+            invalidate_cached_systems(insights_id=insights_id, org_id=current_identity.org_id)
         return flask_json_response(serialized_host, 201)
     else:
         flask.abort(404, "No hosts match the provided canonical facts.")
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from threading import Lock
+from threading import Thread
+
+from cachelib import SimpleCache
+from sqlalchemy import String
+from sqlalchemy import bindparam
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import scoped_session
+from sqlalchemy.sql.expression import ClauseElement
+from sqlalchemy.sql.expression import Executable
+
+from app.auth.identity import Identity
+from app.auth.identity import IdentityType
+from app.common import inventory_config
+from app.logging import get_logger
+from app.models import db
+from lib.db import listen_for_notifications
+from lib.db import primary_reads
+
+__all__ = (
+    "TOTAL_ESTIMATE",
+    "TOTAL_EXACT",
+    "count_hosts",
+    "estimate_host_count",
+    "init_host_count_cache",
+    "invalidate_host_count_cache",
+)
+
+logger = get_logger(__name__)
+
+TOTAL_EXACT = "exact"
+TOTAL_ESTIMATE = "estimate"
+
+HOSTS_CHANGED_CHANNEL = "hosts_changed"
+# One notification for each of the changed orgs, sent with a single statement
+NOTIFY_HOSTS_CHANGED = text("SELECT pg_notify(:channel, org_id) FROM unnest(:org_ids) AS org_id").bindparams(
+    bindparam("org_ids", type_=ARRAY(String))
+)
+# The session info key of the orgs whose cached host counts are invalidated when the session commits
+PENDING_HOST_COUNT_INVALIDATIONS_KEY = "host_count_org_ids"
+HOST_COUNT_CACHE = SimpleCache()
+
+# Cached counts are keyed by the org's generation, so an invalidation only has to bump it;
+# the counts of the older generations are never read again and expire on their own.
+_generations: dict[str, int] = {}
+_generations_lock = Lock()
+
+
+def init_host_count_cache(app_config, flask_app):
+    """
+    Sets up the in-process host count cache. When enabled, a daemon thread listens
+    for host changes made by the other processes and invalidates the changed orgs.
+    """
+    global HOST_COUNT_CACHE
+
+    HOST_COUNT_CACHE = SimpleCache(
+        threshold=app_config.host_count_cache_max_entries, default_timeout=app_config.host_count_cache_timeout
+    )
+    if app_config.host_count_cache_timeout:
+        logger.info(f"Host count cache enabled with a timeout of {app_config.host_count_cache_timeout} seconds")
+        Thread(
+            target=listen_for_notifications,
+            args=(flask_app, HOSTS_CHANGED_CHANNEL, _next_generation, _clear_host_count_cache),
+            daemon=True,
+            name="host-count-cache-listener",
+        ).start()
+
+
+def _next_generation(org_id):
+    with _generations_lock:
+        _generations[org_id] = _generations.get(org_id, 0) + 1
+
+
+def _clear_host_count_cache():
+    HOST_COUNT_CACHE.clear()
+
+
+def invalidate_host_count_cache(org_id: str, session: Session | scoped_session | None = None) -> None:
+    """
+    Invalidates the org's cached host counts when the session's transaction commits,
+    in this process and, with a notification sent once per commit, in the other processes.
+    """
+    if not inventory_config().host_count_cache_timeout:
+        return
+
+    if session is None:
+        session = db.session
+
+    session.info.setdefault(PENDING_HOST_COUNT_INVALIDATIONS_KEY, set()).add(org_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_pending_host_count_invalidations(session):
+    # The notifications are delivered when the transaction commits, and not at all if it's rolled back
+    if org_ids := session.info.get(PENDING_HOST_COUNT_INVALIDATIONS_KEY):
+        session.execute(NOTIFY_HOSTS_CHANGED, {"channel": HOSTS_CHANGED_CHANNEL, "org_ids": sorted(org_ids)})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pending_host_counts(session):
+    # This process doesn't wait for its own notifications, so that a read right after the write is fresh
+    for org_id in session.info.pop(PENDING_HOST_COUNT_INVALIDATIONS_KEY, ()):
+        _next_generation(org_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_host_count_invalidations(session, transaction):
+    # The changes were rolled back, if the invalidations were not done with the commit.
+    if transaction.parent is None:
+        session.info.pop(PENDING_HOST_COUNT_INVALIDATIONS_KEY, None)
+
+
+def _cache_key(identity: Identity, filters: dict, total: str) -> str:
+    # System identities only see the hosts they own, so their counts are kept apart.
+    owner_id = identity.system.get("cn") if identity.identity_type == IdentityType.SYSTEM else None
+    fingerprint = hashlib.sha256(
+        json.dumps({"owner_id": owner_id, "filters": filters}, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{identity.org_id}:{_generations.get(identity.org_id, 0)}:{total}:{fingerprint}"
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+
+def estimate_host_count(query: Query) -> int:
+    # The planner's row estimate costs a plan, not a scan. Small estimates are counted
+    # exactly, because a count is cheap there and estimates are least accurate.
+    plan = db.session.execute(_Explain(query.statement)).scalar_one()
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < inventory_config().host_count_estimate_threshold:
+        return query.with_entities(func.count()).scalar()
+
+    return estimate
+
+
+def count_hosts(query: Query, identity: Identity, filters: dict, total: str | None = None) -> int:
+    """
+    Counts the hosts matching the query. The filters are the request parameters the query
+    was built from, and identify its cached count together with the identity.
+    """
+    total = total or TOTAL_EXACT
+    cache_timeout = inventory_config().host_count_cache_timeout
+    if not cache_timeout:
+        return _count_hosts(query, total)
+
+    cache_key = _cache_key(identity, filters, total)
+    if (cached_count := HOST_COUNT_CACHE.get(cache_key)) is not None:
+        return cached_count
+
+    with primary_reads(query.session):
+        count = _count_hosts(query, total)
+    HOST_COUNT_CACHE.set(cache_key, count, timeout=cache_timeout)
+
+    return count
+
+
+def _count_hosts(query: Query, total: str) -> int:
+    return estimate_host_count(query) if total == TOTAL_ESTIMATE else query.with_entities(func.count()).scalar()
@@ -8,7 +8,15 @@ __all__ = ("build_paginated_host_list_response", "staleness_timestamps")
 
 
 def build_paginated_host_list_response(
-    total, page, per_page, host_list, additional_fields=tuple(), system_profile_fields=None, serialize_hosts=True
+    total,
+    page,
+    per_page,
+    host_list,
+    additional_fields=tuple(),
+    system_profile_fields=None,
+    serialize_hosts=True,
+    next_cursor=None,
+    host_fields=None,
 ):
     timestamps = staleness_timestamps()
     identity = get_current_identity()
@@ -16,16 +24,18 @@ def build_paginated_host_list_response(
 
     json_host_list = host_list
     if serialize_hosts:
-        json_host_list = [
-            serialize_host(host, timestamps, False, additional_fields, staleness, system_profile_fields)
+        # The hosts are serialized one at a time, as the response is written
+        json_host_list = (
+            serialize_host(host, timestamps, False, additional_fields, staleness, system_profile_fields, host_fields)
             for host in host_list
-        ]
+        )
     return {
         "total": total,
-        "count": len(json_host_list),
+        "count": len(host_list),
         "page": page,
         "per_page": per_page,
         "results": json_host_list,
+        "next_cursor": next_cursor,
     }
 
 
@@ -1,30 +1,45 @@
 from __future__ import annotations
 
-import re
+import base64
+import json
+import uuid
 from collections.abc import Iterator
-from itertools import islice
+from datetime import datetime
 from typing import Any
 
+from flask import abort
 from sqlalchemy import Boolean
+from sqlalchemy import DateTime
 from sqlalchemy import String
+from sqlalchemy import Uuid
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import column
+from sqlalchemy import distinct
 from sqlalchemy import func
+from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import true
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import MultipleResultsFound
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Query
 from sqlalchemy.orm import load_only
+from sqlalchemy.sql import operators
 from sqlalchemy.sql.expression import ColumnElement
-from sqlalchemy.sql.expression import cast
+from sqlalchemy.sql.expression import UnaryExpression
 
 from api.filtering.db_filters import canonical_fact_filter
 from api.filtering.db_filters import host_id_list_filter
 from api.filtering.db_filters import query_filters
 from api.filtering.db_filters import rbac_permissions_filter
 from api.filtering.db_filters import update_query_for_owner_id
+from api.host_count_query import count_hosts
 from api.host_query import staleness_timestamps
 from api.staleness_query import get_staleness_obj
 from app.auth import get_current_identity
 from app.auth.identity import Identity
+from app.auth.identity import IdentityType
 from app.config import ALL_STALENESS_STATES
 from app.exceptions import InventoryException
 from app.instrumentation import log_get_host_list_succeeded
@@ -33,8 +48,17 @@ from app.models import Group
 from app.models import Host
 from app.models import HostGroupAssoc
 from app.models import db
+from app.serialization import CANONICAL_FACTS_FIELDS
 from app.serialization import serialize_host_for_export_svc
+from lib.db import jsonb_subset
+from lib.db import read_replica
+from lib.facet_rollup import FACET_OPERATING_SYSTEM
+from lib.facet_rollup import FACET_SAP_SIDS
+from lib.facet_rollup import FACET_SAP_SYSTEM
+from lib.facet_rollup import FACET_TAGS
+from lib.facet_rollup import get_facet_rollup
 from lib.feature_flags import FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS
+from lib.feature_flags import FLAG_INVENTORY_FACET_ROLLUP
 from lib.feature_flags import get_flag_value
 
 __all__ = (
@@ -48,6 +72,8 @@ __all__ = (
 
 logger = get_logger(__name__)
 
+HOST_TYPE_COLUMN = Host.system_profile_facts["host_type"].label("host_type")
+
 DEFAULT_COLUMNS = [
     Host.canonical_facts,
     Host.id,
@@ -62,10 +88,32 @@ DEFAULT_COLUMNS = [
     Host.created_on,
     Host.modified_on,
     Host.groups,
-    Host.system_profile_facts["host_type"].label("host_type"),
+    HOST_TYPE_COLUMN,
     Host.last_check_in,
 ]
 
+# The columns the staleness timestamps are computed from
+_STALENESS_COLUMNS = (HOST_TYPE_COLUMN, Host.modified_on, Host.last_check_in)
+
+# The columns each top-level host field is serialized from, besides the id.
+# The canonical facts are selected from their column separately, as a single object.
+HOST_FIELD_COLUMNS = {
+    "account": (Host.account,),
+    "org_id": (Host.org_id,),
+    "display_name": (Host.display_name,),
+    "ansible_host": (Host.ansible_host,),
+    "facts": (Host.facts,),
+    "reporter": (Host.reporter,),
+    "per_reporter_staleness": (Host.per_reporter_staleness, HOST_TYPE_COLUMN),
+    "stale_timestamp": _STALENESS_COLUMNS,
+    "stale_warning_timestamp": _STALENESS_COLUMNS,
+    "culled_timestamp": _STALENESS_COLUMNS,
+    "created": (Host.created_on,),
+    "updated": (Host.modified_on,),
+    "groups": (Host.groups,),
+    "last_check_in": (Host.last_check_in,),
+}
+
 
 def get_all_hosts() -> list:
     query_results = _find_hosts_entities_query(columns=[Host.id]).all()
@@ -83,30 +131,160 @@ def _get_host_list_using_filters(
     param_order_by: str,
     param_order_how: str,
     fields: dict,
-) -> tuple[list[Host], int, tuple[str], list[str]]:
-    columns = DEFAULT_COLUMNS.copy()
-    if not get_flag_value(FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS):
-        columns.pop()
+    cursor: str | None = None,
+    count_filters: dict | None = None,
+    total: str | None = None,
+) -> tuple[list[Host], int, tuple[str], list[str], str | None]:
+    if fields and fields.get("host"):
+        columns = _host_field_columns(fields["host"])
+    else:
+        columns = DEFAULT_COLUMNS.copy()
+        if not get_flag_value(FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS):
+            columns.pop()
 
     system_profile_fields = ["host_type"]
     if fields and fields.get("system_profile"):
         additional_fields: tuple = ("system_profile",)
         system_profile_fields += list(fields.get("system_profile", {}).keys())
-        columns = list(columns)
-        columns.append(Host.system_profile_facts)
+        # Only the requested keys are read out of the system profile, not the whole (often TOASTed) column
+        columns.append(
+            func.jsonb_strip_nulls(jsonb_subset(Host.system_profile_facts, system_profile_fields)).label(
+                "system_profile_facts"
+            )
+        )
     else:
         additional_fields = tuple()
 
+    order_by = params_to_order_by(param_order_by, param_order_how)
     base_query = _find_hosts_entities_query(query_base=query_base, columns=columns).filter(*all_filters)
-    host_query = base_query.order_by(*params_to_order_by(param_order_by, param_order_how))
 
     # Count separately because the COUNT done by .paginate() is inefficient
-    count_total = base_query.with_entities(func.count()).scalar()
+    count_total = count_hosts(base_query, get_current_identity(), count_filters or {}, total)
 
-    query_results = host_query.paginate(page=page, per_page=per_page, error_out=True, count=False)
+    items, next_cursor = _paginate_with_cursor(
+        base_query, order_by, page, per_page, _cursor_order_key(param_order_by, param_order_how), cursor
+    )
     db.session.close()
 
-    return query_results.items, count_total, additional_fields, system_profile_fields
+    return items, count_total, additional_fields, system_profile_fields, next_cursor
+
+
+def _host_field_columns(host_fields: dict) -> list[ColumnElement]:
+    # The columns a sparse fieldset of top-level host fields is serialized from
+    columns = {"id": Host.id}
+    for field in host_fields:
+        for host_column in HOST_FIELD_COLUMNS.get(field, ()):
+            columns[host_column.key] = host_column
+
+    if canonical_facts := [field for field in CANONICAL_FACTS_FIELDS if field in host_fields]:
+        columns["canonical_facts"] = jsonb_subset(Host.canonical_facts, canonical_facts).label("canonical_facts")
+
+    return list(columns.values())
+
+
+def _paginate_with_cursor(
+    query: Query, order_by: tuple, page: int, per_page: int, order_key: str, cursor: str | None
+) -> tuple[list, str | None]:
+    # The ordering values are selected alongside the requested columns, so the next cursor
+    # can be built from the last row of the page without knowing which columns were requested.
+    keyset = _keyset_columns(order_by)
+    query = query.add_columns(*[key_column.label(f"_cursor_{i}") for i, (key_column, _, _) in enumerate(keyset)])
+    query = query.order_by(*order_by)
+
+    if cursor:
+        # Seek past the last row of the previous page instead of using OFFSET,
+        # so deep pages cost the same as the first one.
+        items = query.filter(_keyset_filter(keyset, _decode_cursor(cursor, order_key, keyset))).limit(per_page).all()
+    else:
+        items = query.paginate(page=page, per_page=per_page, error_out=True, count=False).items
+
+    next_cursor = None
+    if items and len(items) == per_page:
+        last = items[-1]
+        next_cursor = _encode_cursor(order_key, [getattr(last, f"_cursor_{i}") for i in range(len(keyset))])
+
+    return items, next_cursor
+
+
+def _cursor_order_key(order_by: str | None, order_how: str | None) -> str:
+    return f"{order_by or ''}:{order_how or ''}"
+
+
+def _keyset_columns(order_by: tuple) -> list[tuple[ColumnElement, bool, bool]]:
+    # Unwraps the ORDER BY clauses into (column, descending, nulls_first),
+    # applying the Postgres default NULL placement when it's not explicit.
+    keyset = []
+    for clause in order_by:
+        nulls_first = None
+        if isinstance(clause, UnaryExpression) and clause.modifier in (
+            operators.nulls_first_op,
+            operators.nulls_last_op,
+        ):
+            nulls_first = clause.modifier is operators.nulls_first_op
+            clause = clause.element
+
+        descending = isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+        if isinstance(clause, UnaryExpression) and clause.modifier in (operators.asc_op, operators.desc_op):
+            clause = clause.element
+
+        keyset.append((clause, descending, descending if nulls_first is None else nulls_first))
+    return keyset
+
+
+def _keyset_filter(keyset: list[tuple[ColumnElement, bool, bool]], values: list) -> ColumnElement:
+    # Rows after the cursor: (k1, k2, ...) > (v1, v2, ...) in the ordering's own terms,
+    # expanded column by column because the directions and NULL placements can differ.
+    conditions = []
+    equal_prefix: list[ColumnElement] = []
+    for (key_column, descending, nulls_first), value in zip(keyset, values):
+        if value is None:
+            # Nothing sorts after a NULL that is placed last, only the next columns can advance.
+            if nulls_first:
+                conditions.append(and_(*equal_prefix, key_column.is_not(None)))
+            equal_prefix.append(key_column.is_(None))
+        else:
+            after = key_column < value if descending else key_column > value
+            if not nulls_first:
+                after = or_(after, key_column.is_(None))
+            conditions.append(and_(*equal_prefix, after))
+            equal_prefix.append(key_column == value)
+
+    return or_(*conditions)
+
+
+def _encode_cursor(order_key: str, values: list) -> str:
+    payload = {
+        "order": order_key,
+        "values": [value.isoformat() if isinstance(value, datetime) else value for value in values],
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, order_key: str, keyset: list[tuple[ColumnElement, bool, bool]]) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        raw_values = payload["values"]
+        cursor_order_key = payload["order"]
+        if not isinstance(raw_values, list):
+            raise ValueError("The cursor values are not a list.")
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+    if cursor_order_key != order_key or len(raw_values) != len(keyset):
+        raise ValueError("The cursor does not match the requested ordering.")
+
+    values = []
+    for (key_column, _, _), value in zip(keyset, raw_values):
+        try:
+            if value is not None and isinstance(key_column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif value is not None and isinstance(key_column.type, Uuid):
+                value = uuid.UUID(value)
+        except (ValueError, TypeError) as e:
+            raise ValueError("Invalid cursor.") from e
+        values.append(value)
+
+    return values
 
 
 def get_host_list(
@@ -129,7 +307,9 @@ def get_host_list(
     filter: dict,
     fields: dict,
     rbac_filter: dict,
-) -> tuple[list[Host], int, tuple[str], list[str]]:
+    cursor: str | None = None,
+    total: str | None = None,
+) -> tuple[list[Host], int, tuple[str], list[str], str | None]:
     all_filters, query_base = query_filters(
         fqdn,
         display_name,
@@ -150,8 +330,34 @@ def get_host_list(
         get_current_identity(),
     )
 
+    count_filters = {
+        "display_name": display_name,
+        "fqdn": fqdn,
+        "hostname_or_id": hostname_or_id,
+        "insights_id": insights_id,
+        "provider_id": provider_id,
+        "provider_type": provider_type,
+        "updated_start": updated_start,
+        "updated_end": updated_end,
+        "group_name": group_name,
+        "tags": tags,
+        "staleness": staleness,
+        "registered_with": registered_with,
+        "filter": filter,
+        "rbac_filter": rbac_filter,
+    }
+
     return _get_host_list_using_filters(
-        query_base, all_filters, page, per_page, param_order_by, param_order_how, fields
+        query_base,
+        all_filters,
+        page,
+        per_page,
+        param_order_by,
+        param_order_how,
+        fields,
+        cursor,
+        count_filters,
+        total,
     )
 
 
@@ -163,15 +369,27 @@ def get_host_list_by_id_list(
     param_order_how: str,
     fields=None,
     rbac_filter=None,
-) -> tuple[list[Host], int, tuple[str], list[str]]:
+    cursor=None,
+    total=None,
+) -> tuple[list[Host], int, tuple[str], list[str], str | None]:
     all_filters = host_id_list_filter(host_id_list, get_current_identity().org_id)
     all_filters += rbac_permissions_filter(rbac_filter)
+    count_filters = {"host_id_list": sorted(host_id_list), "rbac_filter": rbac_filter}
 
-    items, total, additional_fields, system_profile_fields = _get_host_list_using_filters(
-        None, all_filters, page, per_page, param_order_by, param_order_how, fields
+    items, count_total, additional_fields, system_profile_fields, next_cursor = _get_host_list_using_filters(
+        None,
+        all_filters,
+        page,
+        per_page,
+        param_order_by,
+        param_order_how,
+        fields,
+        cursor,
+        count_filters,
+        total,
     )
 
-    return items, total, additional_fields, system_profile_fields
+    return items, count_total, additional_fields, system_profile_fields, next_cursor
 
 
 def get_host_id_by_insights_id(insights_id: str, rbac_filter=None) -> str | None:
@@ -362,7 +580,38 @@ def get_tag_list(
             "Providing ordering direction without a column is not supported. Provide order_by={tag,count}."
         )
 
-    columns = [Host.id, Host.tags]
+    identity = get_current_identity()
+    if _facet_rollup_applies(
+        identity,
+        staleness,
+        display_name,
+        fqdn,
+        hostname_or_id,
+        insights_id,
+        provider_id,
+        provider_type,
+        updated_start,
+        updated_end,
+        group_name,
+        tags,
+        search,
+        registered_with,
+        filter,
+        rbac_filter,
+    ):
+        # Sorted by the "namespace/key=value" string, and then by count, keeping that order among equal counts
+        tag_list = sorted(
+            ({"tag": tag, "count": count} for tag, count in _get_facet_rollup(FACET_TAGS, identity, staleness)),
+            key=lambda item: _tag_string(item["tag"]),
+            reverse=order_by == "tag" and order_how == "DESC",
+        )
+        if order_by == "count":
+            tag_list.sort(key=lambda item: item["count"], reverse=order_how == "DESC")
+        return [
+            {"tag": {**item["tag"], "value": _convert_null_string(item["tag"]["value"])}, "count": item["count"]}
+            for item in tag_list[offset : offset + limit]
+        ], len(tag_list)
+
     all_filters, query_base = query_filters(
         fqdn,
         display_name,
@@ -380,42 +629,140 @@ def get_tag_list(
         filter,
         rbac_filter,
         order_by,
-        get_current_identity(),
+        identity,
+    )
+    hosts = (
+        _find_hosts_entities_query(query_base=query_base, columns=[Host.id, Host.tags])
+        .filter(*all_filters)
+        .subquery("filtered_hosts")
     )
-    query = _find_hosts_entities_query(query_base=query_base, columns=columns)
 
-    query_results = query.filter(*all_filters).all()
-    db.session.close()
-    _, host_tags_dict = _expand_host_tags(query_results)
-    host_tags = host_tags_dict
+    # Expand the tags of the filtered hosts into (namespace, key, value) rows and aggregate them in the database.
+    # A key without values counts as a single tag without a value, and "null" stands for no namespace or value.
+    namespaces = (
+        func.jsonb_each(hosts.c.tags).table_valued(column("key", String), column("value", JSONB)).lateral("namespaces")
+    )
+    keys = (
+        func.jsonb_each(namespaces.c.value).table_valued(column("key", String), column("value", JSONB)).lateral("keys")
+    )
+    values = (
+        func.jsonb_array_elements_text(
+            case(
+                (func.jsonb_typeof(keys.c.value) == "array", keys.c.value),
+                else_=func.jsonb_build_array(keys.c.value),
+            )
+        )
+        .table_valued(column("value", String))
+        .lateral("tag_values")
+    )
+
+    tag_namespace = func.nullif(namespaces.c.key, "null")
+    tag_key = func.nullif(keys.c.key, "null")
+    tag_value = func.nullif(values.c.value, "null")
+    # The "namespace/key=value" string the tags are searched and sorted by, with None for the "null" parts
+    tag_string = func.concat(
+        func.coalesce(tag_namespace, "None"),
+        "/",
+        func.coalesce(tag_key, "None"),
+        "=",
+        case((values.c.value == "null", "None"), else_=func.coalesce(values.c.value, "")),
+    )
+    tag_count = func.count(distinct(hosts.c.id))
+
+    tags_query = (
+        select(
+            tag_namespace.label("namespace"),
+            tag_key.label("key"),
+            tag_value.label("value"),
+            tag_count.label("count"),
+            func.count().over().label("total"),
+        )
+        .select_from(hosts)
+        .join(namespaces, true())
+        .join(keys, true())
+        .outerjoin(values, true())
+        .group_by(tag_namespace, tag_key, tag_value, tag_string)
+    )
     if search:
-        regex = re.compile(search, re.IGNORECASE)
-        host_tags = {}
-        for key in host_tags_dict.keys():
-            if regex.search(key):
-                host_tags[key] = host_tags_dict[key]
-
-    tag_list = []
-    query_count = 0
-    tag_count_list = []
-    for stored_key, tag_contents in host_tags.items():
-        tag_count_item = {"tag": stored_key, "count": len(tag_contents.get("hosts"))}
-        tag_count_list.append(tag_count_item)
-    if order_by == "tag":
-        sorted_tag_count_list = sorted(tag_count_list, reverse=order_how == "DESC", key=lambda item: item["tag"])
-    if order_by == "count":
-        sorted_tag_count_list = sorted(tag_count_list, reverse=order_how == "DESC", key=lambda item: item["count"])
-    for tag_item in sorted_tag_count_list:
-        tag_key = tag_item.get("tag")
-        tag_dict = host_tags[tag_key]
-        output = {"tag": tag_dict.get("output", {}), "count": len(tag_dict.get("hosts", []))}
-        tag_list.append(output)
-
-    query_count = len(tag_list)
-    tag_list = list(islice(islice(tag_list, offset, None), limit))
+        tags_query = tags_query.where(tag_string.regexp_match(search, flags="i"))
+
+    # Sorted by code point, like the strings were sorted in Python
+    sorted_tag_string = tag_string.collate("C")
+    sort_column = sorted_tag_string if order_by == "tag" else tag_count
+    ordered_query = tags_query.order_by(
+        sort_column.desc() if order_how == "DESC" else sort_column.asc(), sorted_tag_string.asc()
+    )
+
+    rows = db.session.execute(ordered_query.limit(limit).offset(offset)).all()
+    if rows:
+        query_count = rows[0].total
+    else:
+        # Past the last page, the total has to be counted separately
+        query_count = db.session.execute(select(func.count()).select_from(tags_query.subquery())).scalar()
+    db.session.close()
+
+    tag_list = [
+        {"tag": {"namespace": row.namespace, "key": row.key, "value": row.value}, "count": row.count} for row in rows
+    ]
     return tag_list, query_count
 
 
+def _tag_string(tag: dict) -> str:
+    # The "namespace/key=value" string of a rolled up tag, like the one the tags query sorts by:
+    # None for the "null" parts, and nothing for a missing value
+    namespace = "None" if tag["namespace"] is None else tag["namespace"]
+    key = "None" if tag["key"] is None else tag["key"]
+    value = "None" if tag["value"] == "null" else tag["value"] or ""
+    return f"{namespace}/{key}={value}"
+
+
+def _facet_rollup_applies(identity: Identity, staleness: list[str] | None, *filters) -> bool:
+    """
+    The facet rollups count all the org's hosts, so they only serve the requests that filter the hosts
+    by nothing but the default staleness. System identities only see their own hosts.
+    """
+    if any(filters) or identity.identity_type == IdentityType.SYSTEM:
+        return False
+    if staleness and set(staleness) != set(ALL_STALENESS_STATES):
+        return False
+
+    return get_flag_value(FLAG_INVENTORY_FACET_ROLLUP, context={"orgId": identity.org_id})
+
+
+def _get_facet_rollup(facet: str, identity: Identity, staleness: list[str] | None) -> list[tuple[Any, int]]:
+    excluded_hosts_query = None
+    if staleness:
+        # The default staleness leaves out the culled hosts, which are counted until the reaper deletes them
+        culled_filters, query_base = query_filters(staleness=("culled",), identity=identity)
+        excluded_hosts_query = _find_hosts_entities_query(query_base=query_base, identity=identity).filter(
+            *culled_filters
+        )
+
+    results = get_facet_rollup(identity.org_id, facet, excluded_hosts_query)
+    db.session.close()
+    return results
+
+
+def _aggregate_facet(
+    query: Query, value_columns: list[ColumnElement], limit: int, offset: int, count: ColumnElement | None = None
+) -> tuple[list, int]:
+    """
+    Groups the filtered hosts query by the facet's value columns, and returns a page of the
+    (*values, count) rows with the most common values first, together with the number of values.
+    """
+    if count is None:
+        count = func.count()
+
+    facet_query = query.with_entities(*value_columns, count.label("count"), func.count().over().label("total"))
+    facet_query = facet_query.group_by(*value_columns)
+    rows = facet_query.order_by(count.desc(), *value_columns).limit(limit).offset(offset).all()
+    # Past the last page, the values have to be counted separately
+    total = rows[0].total if rows else db.session.query(func.count()).select_from(facet_query.subquery()).scalar()
+    db.session.close()
+
+    return rows, total
+
+
 def get_os_info(
     limit: int,
     offset: int,
@@ -426,10 +773,26 @@ def get_os_info(
     rbac_filter: dict,
     identity: Identity,
 ):
+    if _facet_rollup_applies(identity, staleness, tags, registered_with, filter, rbac_filter):
+        os_list = [
+            {"value": value, "count": count}
+            for value, count in _get_facet_rollup(FACET_OPERATING_SYSTEM, identity, staleness)
+        ]
+        os_list.sort(
+            key=lambda item: (
+                -item["count"],
+                item["value"]["name"],
+                str(item["value"]["major"]),
+                str(item["value"]["minor"]),
+            )
+        )
+        return os_list[offset : offset + limit], len(os_list)
+
+    operating_system = Host.system_profile_facts["operating_system"]
     columns = [
-        Host.system_profile_facts["operating_system"]["name"].label("name"),
-        cast(Host.system_profile_facts["operating_system"]["major"], String).label("major"),
-        cast(Host.system_profile_facts["operating_system"]["minor"], String).label("minor"),
+        operating_system["name"].astext.label("name"),
+        operating_system["major"].astext.label("major"),
+        operating_system["minor"].astext.label("minor"),
     ]
 
     filters, query_base = query_filters(
@@ -442,30 +805,14 @@ def get_os_info(
     )
     os_query = _find_hosts_entities_query(query_base=query_base, columns=columns)
 
-    # Only include records that have set an operating_system.name
-    filters += (columns[0].isnot(None),)
+    # Only include records that have set a complete operating_system
+    filters += tuple(column.isnot(None) for column in columns)
 
-    query_results = os_query.filter(*filters).all()
-    db.session.close()
-    os_dict = {}
-    for result in query_results:
-        if not result or None in result:
-            continue
-        operating_system = ".".join(result)
-        if operating_system not in os_dict:
-            os_dict[operating_system] = 1
-        else:
-            os_dict[operating_system] += 1
-
-    os_count_list = []
-    for os_joined, count in os_dict.items():
-        os = os_joined.split(".")
-        os_count_item = {"value": {"name": os[0], "major": int(os[1]), "minor": int(os[2])}, "count": count}
-        os_count_list.append(os_count_item)
-
-    os_count_list = sorted(os_count_list, reverse=True, key=lambda item: item["count"])  # type: ignore [arg-type, return-value]
-    query_count = len(os_count_list)
-    os_list = list(islice(islice(os_count_list, offset, None), limit))
+    rows, query_count = _aggregate_facet(os_query.filter(*filters), columns, limit, offset)
+    os_list = [
+        {"value": {"name": row.name, "major": int(row.major), "minor": int(row.minor)}, "count": row.count}
+        for row in rows
+    ]
     return os_list, query_count
 
 
@@ -479,6 +826,20 @@ def get_sap_system_info(
     rbac_filter: dict,
     identity: Identity,
 ):
+    if _facet_rollup_applies(identity, staleness, tags, registered_with, filter, rbac_filter):
+        sap_list = sorted(
+            (
+                {"value": value, "count": count}
+                for value, count in _get_facet_rollup(FACET_SAP_SYSTEM, identity, staleness)
+            ),
+            key=lambda item: (-item["count"], item["value"]),
+        )
+        result = sap_list[(page - 1) * per_page : page * per_page]
+        # Like the paginated query, a page past the last one is not found
+        if not result and page != 1:
+            abort(404)
+        return result, len(sap_list)
+
     columns = [
         Host.system_profile_facts["sap_system"].label("value"),
     ]
@@ -517,10 +878,16 @@ def get_sap_sids_info(
     search: str,
     identity: Identity,
 ):
-    columns = [
-        Host.id,
-        func.jsonb_array_elements_text(Host.system_profile_facts["sap_sids"]).label("sap_sids"),
-    ]
+    if _facet_rollup_applies(identity, staleness, tags, registered_with, filter, rbac_filter, search):
+        sap_sids_list = sorted(
+            (
+                {"value": value, "count": count}
+                for value, count in _get_facet_rollup(FACET_SAP_SIDS, identity, staleness)
+            ),
+            key=lambda item: (-item["count"], item["value"]),
+        )
+        return sap_sids_list[offset : offset + limit], len(sap_sids_list)
+
     filters, query_base = query_filters(
         tags=tags,
         staleness=staleness,
@@ -529,35 +896,24 @@ def get_sap_sids_info(
         rbac_filter=rbac_filter,
         identity=identity,
     )
-    sap_sids_query = _find_hosts_entities_query(query_base=query_base, columns=columns)
-    query_results = sap_sids_query.filter(*filters).all()
-    db.session.close()
-    sap_sids = {}
-    for result in query_results:
-        host_id = result[0]
-        sap_sid = result[1]
-        if sap_sid not in sap_sids:
-            sap_sids[sap_sid] = {host_id}
-        else:
-            sap_sids[sap_sid].add(host_id)
-
-    sap_sids_dict = sap_sids
+    sap_sids_array = Host.system_profile_facts["sap_sids"]
+    sap_sids = (
+        func.jsonb_array_elements_text(
+            case((func.jsonb_typeof(sap_sids_array) == "array", sap_sids_array), else_=func.jsonb_build_array())
+        )
+        .table_valued(column("value", String))
+        .lateral("sap_sids")
+    )
+    sap_sids_query = (
+        _find_hosts_entities_query(query_base=query_base, columns=[Host.id]).join(sap_sids, true()).filter(*filters)
+    )
     if search:
-        regex = re.compile(search, re.IGNORECASE)
-        sap_sids_dict = {}
-        for key in sap_sids.keys():
-            if regex.search(key):
-                sap_sids_dict[key] = sap_sids[key]
-
-    sap_sids_list = []
-    query_count = 0
-    sap_sids_count_list = []
-    for sap_sid, host_list in sap_sids_dict.items():
-        sap_sid_count_item = {"value": sap_sid, "count": len(host_list)}
-        sap_sids_count_list.append(sap_sid_count_item)
-    sap_sids_count_list = sorted(sap_sids_count_list, reverse=True, key=lambda item: item["count"])
-    query_count = len(sap_sids_count_list)
-    sap_sids_list = list(islice(islice(sap_sids_count_list, offset, None), limit))
+        sap_sids_query = sap_sids_query.filter(sap_sids.c.value.regexp_match(search, flags="i"))
+
+    rows, query_count = _aggregate_facet(
+        sap_sids_query, [sap_sids.c.value], limit, offset, count=func.count(distinct(Host.id))
+    )
+    sap_sids_list = [{"value": row.value, "count": row.count} for row in rows]
     return sap_sids_list, query_count
 
 
@@ -569,7 +925,9 @@ def get_sparse_system_profile(
     param_order_how: str,
     fields: dict[str, list[str]],
     rbac_filter: dict,
-) -> tuple[int, list[dict[str, str | dict]]]:
+    cursor: str | None = None,
+    total: str | None = None,
+) -> tuple[int, list[dict[str, str | dict]], str | None]:
     if fields and fields.get("system_profile"):
         columns = [
             Host.id,
@@ -589,16 +947,17 @@ def get_sparse_system_profile(
     all_filters = host_id_list_filter(host_id_list, get_current_identity().org_id) + rbac_permissions_filter(
         rbac_filter
     )
-    sp_query = (
-        _find_hosts_entities_query(columns=columns)
-        .filter(*all_filters)
-        .order_by(*params_to_order_by(param_order_by, param_order_how))
-    )
+    sp_query = _find_hosts_entities_query(columns=columns).filter(*all_filters)
+    order_by = params_to_order_by(param_order_by, param_order_how)
 
-    query_results = sp_query.paginate(page=page, per_page=per_page, error_out=True)
+    count_filters = {"host_id_list": sorted(host_id_list), "rbac_filter": rbac_filter}
+    count_total = count_hosts(sp_query, get_current_identity(), count_filters, total)
+    items, next_cursor = _paginate_with_cursor(
+        sp_query, order_by, page, per_page, _cursor_order_key(param_order_by, param_order_how), cursor
+    )
     db.session.close()
 
-    return query_results.total, [{"id": str(item[0]), "system_profile": item[1]} for item in query_results.items]
+    return count_total, [{"id": str(item[0]), "system_profile": item[1]} for item in items], next_cursor
 
 
 def get_host_ids_list(
@@ -676,12 +1035,13 @@ def get_hosts_to_export(
     export_host_query = export_host_query.execution_options(yield_per=batch_size)
 
     try:
-        num_hosts_query = select(func.count()).select_from(export_host_query.subquery())
-        num_hosts = db.session.scalar(num_hosts_query)
-        logger.debug(f"Number of hosts to be exported: {num_hosts}")
+        with read_replica():
+            num_hosts_query = select(func.count()).select_from(export_host_query.subquery())
+            num_hosts = db.session.scalar(num_hosts_query)
+            logger.info(f"Number of hosts to be exported: {num_hosts}")
 
-        for host in db.session.scalars(export_host_query):
-            yield serialize_host_for_export_svc(host, staleness_timestamps=st_timestamps, staleness=staleness)
+            for host in db.session.scalars(export_host_query):
+                yield serialize_host_for_export_svc(host, staleness_timestamps=st_timestamps, staleness=staleness)
 
     except SQLAlchemyError as e:  # Most likely ObjectDeletedError, but catching all DB errors
         raise InventoryException(title="DB Error", detail=str(e)) from e
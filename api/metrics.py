@@ -12,3 +12,10 @@ outbound_http_response_time = Histogram(
     ["dependency"],
 )
 api_cached_systems_hit = Counter("inventory_api_cached_systems_hit_count", "The total amount of system cache hits")
+api_cached_responses_hit = Counter(
+    "inventory_api_cached_responses_hit_count", "The total amount of response cache hits"
+)
+api_cached_responses_coalesced = Counter(
+    "inventory_api_cached_responses_coalesced_count",
+    "The total amount of response cache misses served by another worker's computation",
+)
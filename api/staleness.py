@@ -11,7 +11,7 @@ from api import api_operation
 from api import flask_json_response
 from api import json_error_response
 from api import metrics
-from api.cache import delete_cached_system_keys
+from api.cache import invalidate_cached_systems
 from api.staleness_query import get_staleness_obj
 from app import RbacPermission
 from app import RbacResourceType
@@ -62,7 +62,7 @@ def _update_hosts_staleness_async(org_id, app):
                     host._update_all_per_reporter_staleness()
                 hosts_query.session.commit()
 
-                delete_cached_system_keys(org_id=org_id, spawn=True)
+                invalidate_cached_systems(org_id=org_id, spawn=True)
             logger.info("Leaving host staleness update thread")
         except Exception as e:
             raise e
@@ -85,7 +85,7 @@ def _validate_flag_and_call_thread(org_id):
         )
         update_hosts_thread.start()
     else:
-        delete_cached_system_keys(org_id=org_id, spawn=True)
+        invalidate_cached_systems(org_id=org_id, spawn=True)
 
 
 @api_operation
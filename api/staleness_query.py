@@ -1,14 +1,66 @@
+from threading import Thread
+
+from cachelib import SimpleCache
+from sqlalchemy import text
 from sqlalchemy.orm.exc import NoResultFound
 
+from app.common import inventory_config
 from app.logging import get_logger
 from app.models import Staleness
+from app.models import db
+from app.staleness_serialization import AttrDict
 from app.staleness_serialization import build_serialized_acc_staleness_obj
 from app.staleness_serialization import build_staleness_sys_default
+from lib.db import listen_for_notifications
+from lib.db import primary_reads
 
 logger = get_logger(__name__)
 
+STALENESS_CHANGED_CHANNEL = "staleness_changed"
+STALENESS_CACHE = SimpleCache()
 
-def get_staleness_obj(org_id):
+
+def init_staleness_cache(app_config, flask_app):
+    """
+    Sets up the in-process staleness cache. When enabled, a daemon thread listens
+    for staleness changes made by the other processes and drops the changed orgs.
+    """
+    global STALENESS_CACHE
+
+    STALENESS_CACHE = SimpleCache(
+        threshold=app_config.staleness_cache_max_entries, default_timeout=app_config.staleness_cache_timeout
+    )
+    if app_config.staleness_cache_timeout:
+        logger.info(f"Staleness cache enabled with a timeout of {app_config.staleness_cache_timeout} seconds")
+        Thread(
+            target=listen_for_notifications,
+            args=(flask_app, STALENESS_CHANGED_CHANNEL, _drop_cached_staleness, _clear_staleness_cache),
+            daemon=True,
+            name="staleness-cache-listener",
+        ).start()
+
+
+def _drop_cached_staleness(org_id):
+    logger.debug(f"Staleness changed for org_id {org_id}, dropping it from the cache")
+    STALENESS_CACHE.delete(org_id)
+
+
+def _clear_staleness_cache():
+    STALENESS_CACHE.clear()
+
+
+def invalidate_staleness_cache(org_id):
+    """
+    Drops the org's staleness from this process's cache, and notifies the other processes.
+    The notification is delivered when the current transaction is committed.
+    """
+    STALENESS_CACHE.delete(org_id)
+    db.session.execute(
+        text("SELECT pg_notify(:channel, :org_id)"), {"channel": STALENESS_CHANGED_CHANNEL, "org_id": org_id}
+    )
+
+
+def _get_staleness_obj_from_db(org_id):
     try:
         staleness = Staleness.query.filter(Staleness.org_id == org_id).one()
         logger.info("Using custom account staleness")
@@ -19,3 +71,18 @@ def get_staleness_obj(org_id):
         return staleness
 
     return staleness
+
+
+def get_staleness_obj(org_id):
+    if not inventory_config().staleness_cache_timeout:
+        return _get_staleness_obj_from_db(org_id)
+
+    # The cache stores a serialized copy, so callers are free to modify the returned object.
+    if (cached_staleness := STALENESS_CACHE.get(org_id)) is not None:
+        return AttrDict(cached_staleness)
+
+    with primary_reads():
+        staleness = _get_staleness_obj_from_db(org_id)
+    STALENESS_CACHE.set(org_id, dict(staleness))
+
+    return staleness
@@ -9,6 +9,7 @@ from api import custom_escape
 from api import flask_json_response
 from api import metrics
 from api import pagination_params
+from api.cache import cached_response
 from api.host_query_db import get_os_info
 from api.host_query_db import get_sap_sids_info
 from api.host_query_db import get_sap_system_info
@@ -29,6 +30,7 @@ logger = get_logger(__name__)
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_sap_system(
     tags=None, page=None, per_page=None, staleness=None, registered_with=None, filter=None, rbac_filter=None
@@ -49,6 +51,7 @@ def get_sap_system(
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_sap_sids(
     search=None,
@@ -83,6 +86,7 @@ def get_sap_sids(
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_operating_system(
     tags=None,
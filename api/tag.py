@@ -6,6 +6,7 @@ from api import custom_escape
 from api import flask_json_response
 from api import metrics
 from api import pagination_params
+from api.cache import cached_response
 from api.host_query_db import get_tag_list as get_tag_list_db
 from app import RbacPermission
 from app import RbacResourceType
@@ -19,6 +20,7 @@ logger = get_logger(__name__)
 
 @api_operation
 @rbac(RbacResourceType.HOSTS, RbacPermission.READ)
+@cached_response
 @metrics.api_request_time.time()
 def get_tags(
     search=None,
@@ -16,9 +16,11 @@ from prance import _TranslatingParser as TranslatingParser
 from prometheus_flask_exporter.multiprocess import GunicornPrometheusMetrics
 
 from api.cache import init_cache
+from api.host_count_query import init_host_count_cache
 from api.mgmt import monitoring_blueprint
 from api.parsing import customURIParser
 from api.spec import spec_blueprint
+from api.staleness_query import init_staleness_cache
 from app import payload_tracker
 from app.config import Config
 from app.custom_validator import build_validator_map
@@ -26,6 +28,7 @@ from app.exceptions import InventoryException
 from app.logging import configure_logging
 from app.logging import get_logger
 from app.logging import threadctx
+from app.models import READ_REPLICA_BIND_KEY
 from app.models import SPECIFICATION_DIR
 from app.models import db
 from app.queue.event_producer import EventProducer
@@ -37,6 +40,7 @@ from app.queue.metrics import notification_event_producer_success
 from app.queue.metrics import rbac_access_denied
 from app.queue.notifications import NotificationType
 from lib.check_org import check_org_id
+from lib.db import use_read_replica
 from lib.feature_flags import SchemaStrategy
 from lib.feature_flags import init_unleash_app
 from lib.handlers import register_shutdown
@@ -278,6 +282,15 @@ def create_app(runtime_environment):
         "options": f"-c statement_timeout={app_config.db_statement_timeout} -c lock_timeout={app_config.db_lock_timeout}"  # noqa
     }
 
+    if app_config.read_replica_db_uri:
+        flask_app.config["SQLALCHEMY_BINDS"] = {
+            READ_REPLICA_BIND_KEY: {
+                "url": app_config.read_replica_db_uri,
+                "pool_pre_ping": True,
+                "connect_args": {"options": f"-c statement_timeout={app_config.db_statement_timeout}"},
+            }
+        }
+
     flask_app.config["INVENTORY_CONFIG"] = app_config
     flask_app.config["SYSTEM_PROFILE_SPEC"] = sp_spec
     flask_app.config["USE_SUBMAN_ID"] = app_config.use_sub_man_id_for_host_id
@@ -305,6 +318,8 @@ def create_app(runtime_environment):
         logger.warning(unleash_fallback_msg)
 
     db.init_app(flask_app)
+    init_staleness_cache(app_config, flask_app)
+    init_host_count_cache(app_config, flask_app)
 
     flask_app.register_blueprint(monitoring_blueprint, url_prefix=app_config.mgmt_url_path_prefix)
     for api_url in app_config.api_urls:
@@ -314,6 +329,12 @@ def create_app(runtime_environment):
     def set_request_id():
         threadctx.request_id = request.headers.get(REQUEST_ID_HEADER)
 
+    @flask_app.before_request
+    def route_reads_to_read_replica():
+        # The read-only requests read from the replica, unless it lags too far behind the primary
+        if request.method == "GET":
+            use_read_replica()
+
     @flask_app.after_request
     def after_request_org_check(response):
         if any(endpoint in request.endpoint for endpoint in ORG_ID_CHECK_ENDPOINTS):
@@ -34,6 +34,8 @@ class Config:
         if cfg.database.rdsCa:
             self._db_ssl_cert = cfg.rds_ca()
 
+        # The read replica serves the read-only requests next to the primary, see lib.db.use_read_replica
+        self._read_replica_db = None
         use_read_replica = os.getenv("INVENTORY_API_USE_READREPLICA", "false").lower() == "true"
         read_replica_file_list = [
             "/etc/db/readreplica/db_host",
@@ -44,16 +46,10 @@ class Config:
         ]
         if use_read_replica and all(list(map(os.path.isfile, read_replica_file_list))):
             self.logger.info("Read replica files exist.")
-            with open("/etc/db/readreplica/db_host") as file:
-                self._db_host = file.read().rstrip()
-            with open("/etc/db/readreplica/db_port") as file:
-                self._db_port = file.read().rstrip()
-            with open("/etc/db/readreplica/db_name") as file:
-                self._db_name = file.read().rstrip()
-            with open("/etc/db/readreplica/db_user") as file:
-                self._db_user = file.read().rstrip()
-            with open("/etc/db/readreplica/db_password") as file:
-                self._db_password = file.read().rstrip()
+            self._read_replica_db = {}
+            for field, file_name in zip(("host", "port", "name", "user", "password"), read_replica_file_list):
+                with open(file_name) as file:
+                    self._read_replica_db[field] = file.read().rstrip()
         self._cache_host = None
         self._cache_port = None
         if cfg.inMemoryDb:
@@ -136,6 +132,15 @@ class Config:
         self._db_host = os.getenv("INVENTORY_DB_HOST", "localhost")
         self._db_port = os.getenv("INVENTORY_DB_PORT", 5432)
         self._db_name = os.getenv("INVENTORY_DB_NAME", "insights")
+        self._read_replica_db = None
+        if read_replica_host := os.getenv("INVENTORY_DB_READ_REPLICA_HOST"):
+            self._read_replica_db = {
+                "host": read_replica_host,
+                "port": os.getenv("INVENTORY_DB_READ_REPLICA_PORT", self._db_port),
+                "name": os.getenv("INVENTORY_DB_READ_REPLICA_NAME", self._db_name),
+                "user": os.getenv("INVENTORY_DB_READ_REPLICA_USER", self._db_user),
+                "password": os.getenv("INVENTORY_DB_READ_REPLICA_PASS", self._db_password),
+            }
         self.rbac_endpoint = os.environ.get("RBAC_ENDPOINT", "http://localhost:8111")
         self.export_service_endpoint = os.environ.get("EXPORT_SERVICE_ENDPOINT", "http://localhost:10010")
         self.host_ingress_topic = os.environ.get("KAFKA_HOST_INGRESS_TOPIC", "platform.inventory.host-ingress")
@@ -187,8 +192,21 @@ class Config:
             os.getenv("INVENTORY_CACHE_INSIGHTS_CLIENT_SYSTEM_TIMEOUT_SEC", "129600")
         )
         self.api_cache_max_thread_pool_workers = int(os.getenv("INVENTORY_CACHE_THREAD_POOL_MAX_WORKERS", "5"))
+        self.api_response_cache_timeout = int(os.getenv("INVENTORY_API_RESPONSE_CACHE_TIMEOUT_SECONDS", "0"))
+        self.staleness_cache_timeout = int(os.getenv("INVENTORY_STALENESS_CACHE_TIMEOUT_SECONDS", "0"))
+        self.staleness_cache_max_entries = int(os.getenv("INVENTORY_STALENESS_CACHE_MAX_ENTRIES", "10000"))
+        self.host_count_cache_timeout = int(os.getenv("INVENTORY_HOST_COUNT_CACHE_TIMEOUT_SECONDS", "0"))
+        self.host_count_cache_max_entries = int(os.getenv("INVENTORY_HOST_COUNT_CACHE_MAX_ENTRIES", "10000"))
+        self.host_count_estimate_threshold = int(os.getenv("INVENTORY_HOST_COUNT_ESTIMATE_THRESHOLD", "10000"))
 
         self.db_uri = self._build_db_uri(self._db_ssl_mode)
+        self.read_replica_db_uri = (
+            self._build_db_uri(self._db_ssl_mode, db=self._read_replica_db) if self._read_replica_db else None
+        )
+        self.read_replica_max_lag_seconds = float(os.getenv("INVENTORY_READ_REPLICA_MAX_LAG_SECONDS", "5"))
+        self.read_replica_lag_check_interval = float(
+            os.getenv("INVENTORY_READ_REPLICA_LAG_CHECK_INTERVAL_SECONDS", "5")
+        )
 
         self.base_url_path = self._build_base_url_path()
         self.api_url_path_prefix = self._build_api_path()
@@ -324,10 +342,19 @@ class Config:
         self.host_delete_chunk_size = int(os.getenv("HOST_DELETE_CHUNK_SIZE", "1000"))
         self.script_chunk_size = int(os.getenv("SCRIPT_CHUNK_SIZE", "500"))
         self.export_svc_batch_size = int(os.getenv("EXPORT_SVC_BATCH_SIZE", "500"))
+        # The exports run on a pool of worker threads when there are any, or in the consumer loop otherwise.
+        # Every worker holds a DB connection while it runs, so the DB pool must be larger than the pool.
+        self.export_svc_workers = int(os.getenv("EXPORT_SVC_WORKERS", "0"))
+        self.export_svc_max_exports_per_org = int(os.getenv("EXPORT_SVC_MAX_EXPORTS_PER_ORG", "1"))
+        self.export_svc_max_wait_seconds = int(os.getenv("EXPORT_SVC_MAX_WAIT_SECONDS", "600"))
         self.rebuild_events_time_limit = int(os.getenv("REBUILD_EVENTS_TIME_LIMIT", "3600"))  # 1 hour
         self.sp_authorized_users = os.getenv("SP_AUTHORIZED_USERS", "tuser@redhat.com").split()
         self.mq_db_batch_max_messages = int(os.getenv("MQ_DB_BATCH_MAX_MESSAGES", "1"))
         self.mq_db_batch_max_seconds = float(os.getenv("MQ_DB_BATCH_MAX_SECONDS", "0.5"))
+        self.mq_db_batch_dedup = os.getenv("MQ_DB_BATCH_DEDUP", "false").lower() == "true"
+        self.mq_prevalidation_workers = int(os.getenv("MQ_PREVALIDATION_WORKERS", "0"))
+        self.mq_coalesce_host_events = os.getenv("MQ_COALESCE_HOST_EVENTS", "false").lower() == "true"
+        self.mq_skip_unchanged_host_events = os.getenv("MQ_SKIP_UNCHANGED_HOST_EVENTS", "false").lower() == "true"
 
         self.s3_access_key_id = os.getenv("S3_AWS_ACCESS_KEY_ID")
         self.s3_secret_access_key = os.getenv("S3_AWS_SECRET_ACCESS_KEY")
@@ -360,15 +387,24 @@ class Config:
         api_path = f"{base_url_path}/{version}"
         return api_path
 
-    def _build_db_uri(self, ssl_mode, hide_password=False):
-        db_user = self._db_user
-        db_password = self._db_password
+    def _build_db_uri(self, ssl_mode, hide_password=False, db=None):
+        # The primary database, unless the connection fields of another one are given
+        if db is None:
+            db = {
+                "host": self._db_host,
+                "port": self._db_port,
+                "name": self._db_name,
+                "user": self._db_user,
+                "password": self._db_password,
+            }
+        db_user = db["user"]
+        db_password = db["password"]
 
         if hide_password:
             db_user = "xxxx"
             db_password = "XXXX"
 
-        db_uri = f"postgresql://{db_user}:{db_password}@{self._db_host}:{self._db_port}/{self._db_name}"
+        db_uri = f"postgresql://{db_user}:{db_password}@{db['host']}:{db['port']}/{db['name']}"
         if ssl_mode == self.SSL_VERIFY_FULL:
             db_uri += f"?sslmode={self._db_ssl_mode}&sslrootcert={self._db_ssl_cert}"
         return db_uri
@@ -397,6 +433,8 @@ class Config:
         self.logger.info("DB Host: %s", self._db_host)
         self.logger.info("DB Name: %s", self._db_name)
         self.logger.info("DB Connection URI: %s", self._build_db_uri(self._db_ssl_mode, hide_password=True))
+        if self._read_replica_db:
+            self.logger.info("DB Read Replica Host: %s", self._read_replica_db["host"])
 
         if self._db_ssl_mode == self.SSL_VERIFY_FULL:
             self.logger.info("Using SSL for DB connection:")
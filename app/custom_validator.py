@@ -13,8 +13,13 @@ from jsonschema import Draft4Validator
 from jsonschema import ValidationError
 from jsonschema import draft4_format_checker
 
+from app.serialization import HOST_FIELDS
+
 logger = logging.getLogger(__name__)
 
+# The objects whose fields can be requested with the sparseFields parameters
+SPARSE_FIELDSETS = ("system_profile", "host")
+
 
 class CustomResponseValidator(AbstractResponseBodyValidator):
     """Response body validator for json content types."""
@@ -63,15 +68,17 @@ class CustomParameterValidator(ParameterValidator):
             query_params = {k: request.query_params.getlist(k) for k in request.query_params}
             query_params = self.uri_parser.resolve_query(query_params)
             fields = query_params.get(param["name"])
-            if any(item.startswith("system_profile") for item in fields):
-                query_fields = list(fields.get("system_profile").keys())
-                system_profile_schema = self.sp_spec
-                for field in query_fields:
-                    if field not in system_profile_schema.keys():
-                        flask.abort(400, f"Requested field '{field}' is not present in the system_profile schema.")
-            else:
+            if not fields or any(item not in SPARSE_FIELDSETS for item in fields):
                 flask.abort(400)
 
+            system_profile_schema = self.sp_spec
+            for field in fields.get("system_profile", {}):
+                if field not in system_profile_schema.keys():
+                    flask.abort(400, f"Requested field '{field}' is not present in the system_profile schema.")
+            for field in fields.get("host", {}):
+                if field not in HOST_FIELDS:
+                    flask.abort(400, f"Requested field '{field}' is not a host field.")
+
         return super().validate_query_parameter_list(request, security_params)
 
 
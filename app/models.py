@@ -7,6 +7,7 @@ from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
 from enum import Enum
+from itertools import chain
 from os.path import join
 
 from connexion.utils import coerce_type
@@ -14,10 +15,12 @@ from dateutil.parser import isoparse
 from flask import current_app
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from jsonschema import RefResolver
 from jsonschema import ValidationError as JsonSchemaValidationError
-from jsonschema import validate as jsonschema_validate
+from jsonschema.exceptions import best_match
 from jsonschema.validators import Draft4Validator
+from jsonschema.validators import validator_for
 from marshmallow import EXCLUDE
 from marshmallow import Schema as MarshmallowSchema
 from marshmallow import ValidationError as MarshmallowValidationError
@@ -33,13 +36,16 @@ from sqlalchemy import String
 from sqlalchemy import UniqueConstraint
 from sqlalchemy import case
 from sqlalchemy import cast
+from sqlalchemy import event
 from sqlalchemy import func
 from sqlalchemy import orm
+from sqlalchemy import select
 from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import column_property
+from sqlalchemy.orm import object_session
 from sqlalchemy.orm.base import instance_state
 from sqlalchemy.orm.exc import NoResultFound
 from yaml import safe_load
@@ -64,7 +70,32 @@ from lib.feature_flags import get_flag_value
 
 logger = get_logger(__name__)
 
-db = SQLAlchemy()
+# The bind of the read replica engine, when one is configured
+READ_REPLICA_BIND_KEY = "read_replica"
+# The session info key that routes the session's reads to the read replica
+USE_READ_REPLICA_KEY = "use_read_replica"
+
+
+class ReadReplicaRoutingSession(FlaskSQLAlchemySession):
+    """
+    Sends the plain SELECT statements to the read replica while the session's reads are routed
+    to it (see lib.db.use_read_replica). Flushes, locking reads and every other statement go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and self.info.get(USE_READ_REPLICA_KEY)
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+            and getattr(clause, "_for_update_arg", None) is None
+        ):
+            return self._db.engines[READ_REPLICA_BIND_KEY]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": ReadReplicaRoutingSession})
 migrate = Migrate(db)
 
 TAG_NAMESPACE_VALIDATION = marshmallow_validate.Length(max=255)
@@ -82,6 +113,28 @@ NEW_TO_OLD_REPORTER_MAP = {"satellite": "yupana", "discovery": "yupana"}
 # Used in filtering.
 OLD_TO_NEW_REPORTER_MAP = {"yupana": ("satellite", "discovery")}
 
+# The host's data, as opposed to the fields updated on every check-in.
+HOST_CONTENT_FIELDS = (
+    "display_name",
+    "ansible_host",
+    "account",
+    "org_id",
+    "facts",
+    "tags",
+    "tags_alt",
+    "canonical_facts",
+    "system_profile_facts",
+    "groups",
+    "reporter",
+)
+
+# The stored staleness columns, and the staleness setting each one is computed with.
+STALENESS_COLUMNS = {
+    "stale_at": "time_to_stale",
+    "stale_warning_at": "time_to_stale_warning",
+    "culled_at": "time_to_delete",
+}
+
 MIN_CANONICAL_FACTS_VERSION = 0
 MAX_CANONICAL_FACTS_VERSION = 1
 
@@ -162,12 +215,26 @@ class SystemProfileNormalizer:
 
         self.schema = {**system_profile_spec, "$ref": "#/$defs/SystemProfile"}
         self._resolver = RefResolver.from_schema(system_profile_spec)
+        self._schema_objs = {}
+
+        # Checking the schema and building the validator is costly, so it's done only once.
+        validator_class = validator_for(self.schema)
+        validator_class.check_schema(self.schema)
+        self._validator = validator_class(self.schema, format_checker=Draft4Validator.FORMAT_CHECKER)
+
+    def validate(self, payload):
+        """
+        Validates the payload against the system profile schema.
+        Raises the same error as jsonschema.validate() would.
+        """
+        if error := best_match(self._validator.iter_errors(payload)):
+            raise error
 
     def filter_keys(self, payload, schema_dict=None):
         if schema_dict is None:
             schema_dict = self._system_profile_definition()
 
-        schema_obj = self.Schema.from_dict(schema_dict, self._resolver)
+        schema_obj = self._schema_obj(schema_dict)
         if schema_obj.schema_type == self.Schema.Types.object:
             self._object_filter(schema_obj, payload)
         elif schema_obj.schema_type == self.Schema.Types.array:
@@ -181,6 +248,16 @@ class SystemProfileNormalizer:
     def _system_profile_definition(self):
         return self.schema["$defs"]["SystemProfile"]
 
+    def _schema_obj(self, schema_dict):
+        # Resolved schemas are kept by the identity of their dict, along with the dict itself,
+        # so that the id can't be reused by another dict.
+        cached = self._schema_objs.get(id(schema_dict))
+        if cached is None or cached[0] is not schema_dict:
+            cached = (schema_dict, self.Schema.from_dict(schema_dict, self._resolver))
+            self._schema_objs[id(schema_dict)] = cached
+
+        return cached[1]
+
     def _object_filter(self, schema, payload):
         if not schema.properties or type(payload) is not dict:
             return
@@ -210,6 +287,9 @@ class LimitedHost(db.Model):  # type: ignore [name-defined]
         Index("idxdisplay_name", "display_name"),
         Index("idxsystem_profile_facts", "system_profile_facts", postgresql_using="gin"),
         Index("idxgroups", "groups", postgresql_using="gin"),
+        Index("idxhosts_stale_at", "stale_at"),
+        Index("idxhosts_stale_warning_at", "stale_warning_at"),
+        Index("idxhosts_culled_at", "culled_at"),
         {"schema": INVENTORY_SCHEMA},
     )
 
@@ -318,12 +398,29 @@ class LimitedHost(db.Model):  # type: ignore [name-defined]
     groups = db.Column(JSONB)
     host_type = column_property(system_profile_facts["host_type"])
     last_check_in = db.Column(db.DateTime(timezone=True))
+    # When the host becomes stale, stale warning and culled, computed on write
+    # from modified_on, the host type and the org's staleness settings.
+    stale_at = db.Column(db.DateTime(timezone=True))
+    stale_warning_at = db.Column(db.DateTime(timezone=True))
+    culled_at = db.Column(db.DateTime(timezone=True))
+
+    def update_staleness_columns(self, staleness):
+        staleness_type = (
+            "immutable" if (self.system_profile_facts or {}).get("host_type") == "edge" else "conventional"
+        )
+        for column, staleness_field in STALENESS_COLUMNS.items():
+            offset = timedelta(seconds=int(staleness[f"{staleness_type}_{staleness_field}"]))
+            setattr(self, column, self.modified_on + offset)
 
 
 class Host(LimitedHost):
     stale_timestamp = db.Column(db.DateTime(timezone=True))
     reporter = db.Column(db.String(255))
     per_reporter_staleness = db.Column(JSONB)
+    # Rows of the canonical facts lookup table; the DB deletes them along with the host.
+    canonical_fact_rows = orm.relationship(
+        "HostCanonicalFact", cascade="all, delete-orphan", passive_deletes=True, lazy="select"
+    )
 
     def __init__(
         self,
@@ -437,9 +534,11 @@ class Host(LimitedHost):
             self.canonical_facts,
             canonical_facts,
         )
-        self.canonical_facts.update(canonical_facts)
+        updated_canonical_facts = {**self.canonical_facts, **canonical_facts}
+        if updated_canonical_facts != self.canonical_facts:
+            self.canonical_facts = updated_canonical_facts
+            orm.attributes.flag_modified(self, "canonical_facts")
         logger.debug("Host (id=%s) has updated canonical_facts (%s)", self.id, self.canonical_facts)
-        orm.attributes.flag_modified(self, "canonical_facts")
 
     def update_facts(self, facts_dict):
         if facts_dict:
@@ -506,8 +605,9 @@ class Host(LimitedHost):
         self.modified_on = datetime.now(timezone.utc)
 
     def replace_facts_in_namespace(self, namespace, facts_dict):
-        self.facts[namespace] = facts_dict
-        orm.attributes.flag_modified(self, "facts")
+        if self.facts.get(namespace) != facts_dict:
+            self.facts = {**self.facts, namespace: facts_dict}
+            orm.attributes.flag_modified(self, "facts")
 
     def _update_tags(self, tags_dict):
         if self.tags is None:
@@ -532,8 +632,9 @@ class Host(LimitedHost):
                 self._delete_tags_alt_namespace(namespace)
 
     def _replace_tags_in_namespace(self, namespace, tags):
-        self.tags[namespace] = tags
-        orm.attributes.flag_modified(self, "tags")
+        if self.tags.get(namespace) != tags:
+            self.tags = {**self.tags, namespace: tags}
+            orm.attributes.flag_modified(self, "tags")
 
     def _replace_tags_alt_in_namespace(self, tags_dict):
         final_tags_alt = []
@@ -546,15 +647,14 @@ class Host(LimitedHost):
                 for value in values:
                     final_tags_alt.append({"namespace": ns, "key": key, "value": value})
 
-        self.tags_alt = final_tags_alt
-
-        orm.attributes.flag_modified(self, "tags_alt")
+        if final_tags_alt != self.tags_alt:
+            self.tags_alt = final_tags_alt
+            orm.attributes.flag_modified(self, "tags_alt")
 
     def _delete_tags_namespace(self, namespace):
-        with suppress(KeyError):
+        if namespace in self.tags:
             del self.tags[namespace]
-
-        orm.attributes.flag_modified(self, "tags")
+            orm.attributes.flag_modified(self, "tags")
 
     def _delete_tags_alt_namespace(self, namespace):
         if self.tags_alt:
@@ -563,7 +663,7 @@ class Host(LimitedHost):
                     with suppress(KeyError):
                         del self.tags_alt[i]
 
-                orm.attributes.flag_modified(self, "tags_alt")
+                    orm.attributes.flag_modified(self, "tags_alt")
 
     def _cleanup_tags(self):
         namespaces_to_delete = tuple(namespace for namespace, items in self.tags.items() if not items)
@@ -584,11 +684,24 @@ class Host(LimitedHost):
     def update_system_profile(self, input_system_profile):
         logger.debug("Updating host's (id=%s) system profile", self.id)
         if not self.system_profile_facts:
-            self.system_profile_facts = input_system_profile
+            updated_system_profile = input_system_profile
         else:
             # Update the fields that were passed in
-            self.system_profile_facts = {**self.system_profile_facts, **input_system_profile}
-        orm.attributes.flag_modified(self, "system_profile_facts")
+            updated_system_profile = {**self.system_profile_facts, **input_system_profile}
+
+        # Unchanged JSONB columns are left out of the UPDATE, so a check-in with identical data
+        # doesn't rewrite the whole system profile.
+        if updated_system_profile != self.system_profile_facts:
+            self.system_profile_facts = updated_system_profile
+            orm.attributes.flag_modified(self, "system_profile_facts")
+
+    def content_modified(self):
+        """
+        Tells whether the host's data was changed since it was loaded or last flushed,
+        not counting the check-in and staleness fields.
+        """
+        state = instance_state(self)
+        return any(state.attrs[field].history.has_changes() for field in HOST_CONTENT_FIELDS)
 
     def reporter_stale(self, reporter):
         prs = self.per_reporter_staleness.get(reporter, None)
@@ -692,6 +805,53 @@ class HostGroupAssoc(db.Model):  # type: ignore [name-defined]
     group_id = db.Column(UUID(as_uuid=True), ForeignKey(f"{INVENTORY_SCHEMA}.groups.id"), primary_key=True)
 
 
+class HostCanonicalFact(db.Model):  # type: ignore [name-defined]
+    """
+    One row per canonical fact value of a host (one per item for list facts),
+    so that deduplication can look hosts up with B-tree equality instead of JSONB containment.
+    """
+
+    __tablename__ = "host_canonical_facts"
+    __table_args__ = (
+        Index("idxhostcanonicalfacts_lookup", "org_id", "fact_name", "fact_value"),
+        {"schema": INVENTORY_SCHEMA},
+    )
+
+    def __init__(self, org_id, fact_name, fact_value):
+        self.org_id = org_id
+        self.fact_name = fact_name
+        self.fact_value = fact_value
+
+    host_id = db.Column(
+        UUID(as_uuid=True), ForeignKey(f"{INVENTORY_SCHEMA}.hosts.id", ondelete="CASCADE"), primary_key=True
+    )
+    fact_name = db.Column(db.String(64), primary_key=True)
+    fact_value = db.Column(db.Text, primary_key=True)
+    org_id = db.Column(db.String(36), nullable=False)
+
+
+class FacetRollup(db.Model):  # type: ignore [name-defined]
+    """
+    The number of an org's hosts with each value of a facet (tags, operating_system, sap_sids, sap_system),
+    so that the unfiltered facet counts are read in O(values) instead of aggregated over all the hosts.
+    The values are stored as canonical JSON.
+    """
+
+    __tablename__ = "facet_rollup"
+    __table_args__ = ({"schema": INVENTORY_SCHEMA},)
+
+    def __init__(self, org_id, facet, value, count):
+        self.org_id = org_id
+        self.facet = facet
+        self.value = value
+        self.count = count
+
+    org_id = db.Column(db.String(36), primary_key=True)
+    facet = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Text, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+
 class Staleness(db.Model):  # type: ignore [name-defined]
     __tablename__ = "staleness"
     __table_args__ = (
@@ -747,6 +907,78 @@ class Staleness(db.Model):  # type: ignore [name-defined]
     modified_on = db.Column(db.DateTime(timezone=True), default=_time_now, onupdate=_time_now)
 
 
+# The staleness of the orgs whose hosts are being flushed, kept in the session's info during the flush
+STALENESS_FOR_FLUSH_KEY = "staleness_for_flush"
+
+
+def _load_staleness_objs(connection, org_ids) -> dict:
+    custom_staleness = {
+        staleness.org_id: build_serialized_acc_staleness_obj(staleness)
+        for staleness in connection.execute(select(*Staleness.__table__.columns).where(Staleness.org_id.in_(org_ids)))
+    }
+    return {org_id: custom_staleness.get(org_id) or build_staleness_sys_default(org_id) for org_id in org_ids}
+
+
+@event.listens_for(orm.Session, "before_flush")
+def _load_staleness_for_flush(session, flush_context, instances):  # noqa: ARG001, required by SQLAlchemy
+    # Loads the staleness of all the orgs whose hosts are about to be written with a single query,
+    # instead of one query per host in the before_insert and before_update listeners.
+    modified_hosts = (host for host in session.dirty if session.is_modified(host, include_collections=False))
+    if org_ids := {
+        host.org_id for host in chain(session.new, modified_hosts) if isinstance(host, LimitedHost) and host.org_id
+    }:
+        session.info[STALENESS_FOR_FLUSH_KEY] = _load_staleness_objs(session.connection(), org_ids)
+
+
+@event.listens_for(orm.Session, "after_flush_postexec")
+def _drop_staleness_for_flush(session, flush_context):  # noqa: ARG001, required by SQLAlchemy
+    session.info.pop(STALENESS_FOR_FLUSH_KEY, None)
+
+
+def _get_staleness_obj_for_flush(connection, host):
+    staleness_for_flush = object_session(host).info.get(STALENESS_FOR_FLUSH_KEY, {})
+    if (staleness := staleness_for_flush.get(host.org_id)) is not None:
+        return staleness
+
+    # The host wasn't pending when the flush started, so its org's staleness is read now.
+    # The session is in the middle of a flush, so the query goes through the connection being flushed.
+    return _load_staleness_objs(connection, {host.org_id})[host.org_id]
+
+
+@event.listens_for(LimitedHost, "before_insert", propagate=True)
+def _set_staleness_columns_on_insert(mapper, connection, host):  # noqa: ARG001, required by SQLAlchemy
+    if host.modified_on is None:
+        host.modified_on = _time_now()
+    host.update_staleness_columns(_get_staleness_obj_for_flush(connection, host))
+
+
+@event.listens_for(LimitedHost, "before_update", propagate=True)
+def _set_staleness_columns_on_update(mapper, connection, host):  # noqa: ARG001, required by SQLAlchemy
+    if not object_session(host).is_modified(host, include_collections=False):
+        return
+
+    # Sets modified_on the way its onupdate would, so that the staleness columns can be computed from it.
+    if not instance_state(host).attrs.modified_on.history.has_changes():
+        host.modified_on = _time_now()
+    host.update_staleness_columns(_get_staleness_obj_for_flush(connection, host))
+
+
+def staleness_columns_values(staleness, modified_on) -> dict:
+    """
+    The values of the staleness columns for a bulk UPDATE of an org's hosts, last modified at modified_on.
+    modified_on is either a datetime or the Host.modified_on column.
+    """
+    is_edge = LimitedHost.system_profile_facts["host_type"].as_string() == "edge"
+    return {
+        column: modified_on
+        + case(
+            (is_edge, timedelta(seconds=int(staleness[f"immutable_{staleness_field}"]))),
+            else_=timedelta(seconds=int(staleness[f"conventional_{staleness_field}"])),
+        )
+        for column, staleness_field in STALENESS_COLUMNS.items()
+    }
+
+
 class HostInventoryMetadata(db.Model):  # type: ignore [name-defined]
     __tablename__ = "hbi_metadata"
     __table_args__ = ({"schema": INVENTORY_SCHEMA},)
@@ -1000,9 +1232,7 @@ class LimitedHostSchema(CanonicalFactsSchema):
     @validates("system_profile")
     def system_profile_is_valid(self, system_profile, data_key):  # noqa: ARG002, required for marshmallow validator functions
         try:
-            jsonschema_validate(
-                system_profile, self.system_profile_normalizer.schema, format_checker=Draft4Validator.FORMAT_CHECKER
-            )
+            self.system_profile_normalizer.validate(system_profile)
         except JsonSchemaValidationError as error:
             raise MarshmallowValidationError(f"System profile does not conform to schema.\n{error}") from error
 
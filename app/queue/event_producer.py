@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from confluent_kafka import KafkaError
 from confluent_kafka import KafkaException
 from confluent_kafka import Producer as KafkaProducer
@@ -16,20 +18,29 @@ def _encode_headers(headers):
 
 
 class MessageDetails:
-    def __init__(self, topic: str, event: str, headers: list[tuple], key: str):
+    """
+    Details of a produced message. It is returned by EventProducer.write_event() and serves as
+    the delivery handle: once the producer is flushed, the delivery outcome is known.
+    """
+
+    def __init__(self, topic: str, event: bytes, headers: list[tuple], key: bytes | None):
         self.event = event
         self.headers = headers
         self.key = key
         self.topic = topic
+        self.delivered = False
+        self.error = None
 
     def on_delivered(self, error, message):
         message_to_send = None
         if error:
+            self.error = error
             if error.code() == KafkaError.MSG_SIZE_TOO_LARGE:
                 message_to_send = message
                 produce_large_message_failure.inc()
             message_not_produced(logger, error, self.topic, self.event, self.key, self.headers, message_to_send)
         else:
+            self.delivered = True
             produced_message_size.observe(len(str(message).encode("utf-8")))
             message_produced(logger, message, self.headers)
 
@@ -40,7 +51,11 @@ class EventProducer:
         self._kafka_producer = KafkaProducer({"bootstrap.servers": config.bootstrap_servers, **config.kafka_producer})
         self.mq_topic = topic
 
-    def write_event(self, event, key, headers, *, wait=False):
+    def write_event(self, event, key, headers, *, wait=False) -> MessageDetails:
+        """
+        Produces the event. With wait=True, blocks until all the outstanding messages are delivered.
+        Otherwise, the returned MessageDetails can be checked for the delivery outcome after flush().
+        """
         logger.debug("Topic: %s, key: %s, event: %s, headers: %s", self.mq_topic, key, event, headers)
 
         k = key.encode("utf-8") if key else None
@@ -56,6 +71,8 @@ class EventProducer:
                 self._kafka_producer.flush()
             else:
                 self._kafka_producer.poll()
+
+            return messageDetails
         except KafkaException as error:
             message_not_produced(logger, error, topic, event=v, key=k, headers=h)
             raise error
@@ -63,5 +80,15 @@ class EventProducer:
             message_not_produced(logger, error, topic, event=v, key=k, headers=h)
             raise error
 
+    def flush(self, timeout: float | None = None) -> int:
+        """
+        Waits for all the outstanding messages to be delivered, or for the timeout (in seconds) to expire.
+        Returns the number of messages that are still waiting for delivery.
+        """
+        if timeout is None:
+            return self._kafka_producer.flush()
+
+        return self._kafka_producer.flush(timeout)
+
     def close(self):
         self._kafka_producer.flush()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from itertools import count
+from threading import Lock
+
+from confluent_kafka import TopicPartition
+
+from app.logging import get_logger
+from app.queue import metrics
+
+logger = get_logger(__name__)
+
+
+@dataclass(order=True)
+class _PendingExport:
+    size: int
+    sequence: int
+    org_id: str = field(compare=False)
+    run: Callable[[], None] = field(compare=False)
+    on_done: Callable[[], None] = field(compare=False)
+    queued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class ExportScheduler:
+    """
+    Runs the exports on a bounded pool of worker threads. The smallest pending export starts first,
+    unless one has waited for longer than max_wait_seconds, and an org runs at most max_per_org
+    exports at a time, so that neither a large export nor a busy org holds up the others.
+    """
+
+    def __init__(self, workers: int, max_per_org: int, max_wait_seconds: float):
+        self.workers = workers
+        self.max_per_org = max_per_org
+        self.max_wait_seconds = max_wait_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-worker")
+        self._lock = Lock()
+        self._pending: list[_PendingExport] = []
+        self._running = 0
+        self._running_per_org: Counter = Counter()
+        self._sequence = count()
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def ready_count(self) -> int:
+        """The number of pending exports that can start as soon as a worker is free, within their org's limit."""
+        with self._lock:
+            pending_per_org = Counter(export.org_id for export in self._pending)
+            return sum(
+                min(count, max(self.max_per_org - self._running_per_org[org_id], 0))
+                for org_id, count in pending_per_org.items()
+            )
+
+    def submit(self, org_id: str, size: int, run: Callable[[], None], on_done: Callable[[], None]) -> None:
+        """Queues the export. on_done is called when it has run, even if it failed."""
+        with self._lock:
+            self._pending.append(_PendingExport(size, next(self._sequence), org_id, run, on_done))
+            self._dispatch()
+
+    def shutdown(self) -> None:
+        """Waits for the running exports. The pending ones are dropped without calling their on_done."""
+        with self._lock:
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def _next_export(self) -> _PendingExport | None:
+        eligible = [export for export in self._pending if self._running_per_org[export.org_id] < self.max_per_org]
+        if not eligible:
+            return None
+
+        now = time.monotonic()
+        if overdue := [export for export in eligible if now - export.queued_at >= self.max_wait_seconds]:
+            return min(overdue, key=lambda export: export.sequence)
+        return min(eligible)
+
+    def _dispatch(self) -> None:
+        # Called with the lock held
+        while self._running < self.workers and (export := self._next_export()) is not None:
+            self._pending.remove(export)
+            self._running += 1
+            self._running_per_org[export.org_id] += 1
+            metrics.export_service_export_wait_time.observe(time.monotonic() - export.queued_at)
+            self._executor.submit(self._run, export)
+
+    def _run(self, export: _PendingExport) -> None:
+        try:
+            export.run()
+        except Exception:
+            logger.exception(f"Export for org_id {export.org_id} failed")
+        finally:
+            export.on_done()
+            with self._lock:
+                self._running -= 1
+                self._running_per_org[export.org_id] -= 1
+                if not self._running_per_org[export.org_id]:
+                    del self._running_per_org[export.org_id]
+                self._dispatch()
+
+
+class OffsetTracker:
+    """
+    Tracks the offsets of the messages that are being processed out of order. The offset to commit for
+    a partition is that of its oldest unfinished message, so a message is never committed before every
+    message before it has been processed.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._unfinished: dict[tuple[str, int], set[int]] = {}
+        self._next_offsets: dict[tuple[str, int], int] = {}
+        self._committable: dict[tuple[str, int], int] = {}
+
+    def started(self, topic: str, partition: int, offset: int) -> None:
+        with self._lock:
+            self._unfinished.setdefault((topic, partition), set()).add(offset)
+            self._next_offsets[(topic, partition)] = max(self._next_offsets.get((topic, partition), 0), offset + 1)
+
+    def finished(self, topic: str, partition: int, offset: int) -> None:
+        with self._lock:
+            unfinished = self._unfinished[(topic, partition)]
+            unfinished.discard(offset)
+            self._committable[(topic, partition)] = min(unfinished, default=self._next_offsets[(topic, partition)])
+
+    def pop_committable(self) -> list[TopicPartition]:
+        """The offsets that can be committed since the last call."""
+        with self._lock:
+            committable = [
+                TopicPartition(topic, partition, offset) for (topic, partition), offset in self._committable.items()
+            ]
+            self._committable.clear()
+
+        return committable
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
 import json
+import zlib
+from collections.abc import Iterable
+from collections.abc import Iterator
 from http import HTTPStatus
+from itertools import chain
 from uuid import UUID
 
+import zstandard
 from requests import Response
 from requests import Session
 from requests.adapters import HTTPAdapter
 
+from api import iter_json_chunks
+from api.host_count_query import estimate_host_count
 from api.host_query_db import get_hosts_to_export
 from app import IDENTITY_HEADER
 from app import REQUEST_ID_HEADER
@@ -18,13 +25,27 @@ from app.auth.identity import from_auth_header
 from app.config import Config
 from app.exceptions import InventoryException
 from app.logging import get_logger
+from app.models import Host
+from app.models import db
 from lib import metrics
 from lib.middleware import get_rbac_filter
+from utils.json_to_csv import iter_csv_chunks
 from utils.json_to_csv import json_arr_to_csv
+from utils.json_to_parquet import iter_parquet_chunks
 
 logger = get_logger(__name__)
 
-HEADER_CONTENT_TYPE = {"json": "application/json; charset=utf-8", "csv": "text/csv; charset=utf-8"}
+HEADER_CONTENT_TYPE = {
+    "json": "application/json; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_FORMATS = tuple(HEADER_CONTENT_TYPE)
+# The JSON and CSV exports are uploaded with the compression as their content encoding.
+# The Parquet exports compress their columns with it instead.
+EXPORT_COMPRESSIONS = ("gzip", "zstd")
+# The zlib window bits that make the compressed stream a gzip file
+GZIP_WBITS = zlib.MAX_WBITS | 16
 
 
 def extract_export_svc_data(export_svc_data: dict) -> tuple[str, UUID, str, str, str]:
@@ -54,16 +75,18 @@ def build_headers(
     return rbac_request_headers, request_headers
 
 
-def get_host_list(identity: Identity, rbac_filter: dict | None, inventory_config: Config) -> list[dict]:
-    host_data = list(
-        get_hosts_to_export(
-            identity,
-            rbac_filter=rbac_filter,
-            batch_size=inventory_config.export_svc_batch_size,
-        )
-    )
+def estimate_export_size(org_id: str) -> int:
+    # The planner's estimate of the org's hosts, which costs a query plan instead of a count
+    return estimate_host_count(db.session.query(Host).filter(Host.org_id == org_id))
 
-    return host_data
+
+def get_host_list(identity: Identity, rbac_filter: dict | None, inventory_config: Config) -> Iterator[dict]:
+    # The hosts are read in batches from the DB cursor as the export is uploaded
+    return get_hosts_to_export(
+        identity,
+        rbac_filter=rbac_filter,
+        batch_size=inventory_config.export_svc_batch_size,
+    )
 
 
 @metrics.create_export_processing_time.time()
@@ -86,6 +109,8 @@ def create_export(
 
     exportFormat, exportUUID, applicationName, resourceUUID, x_rh_identity = extract_export_svc_data(export_svc_data)
 
+    compression = export_svc_data["data"]["resource_request"].get("compression")
+
     rbac_request_headers, request_headers = build_headers(x_rh_identity, exportUUID, inventory_config, exportFormat)
 
     allowed, rbac_filter = get_rbac_filter(
@@ -116,6 +141,8 @@ def create_export(
     try:
         # create a generator with serialized host data
         host_data = get_host_list(identity, rbac_filter, inventory_config)
+        # Only the first host is read ahead, to tell an empty export apart
+        first_host = next(host_data, None)
 
         request_url = _build_export_request_url(
             export_service_endpoint, exportUUID, applicationName, resourceUUID, "upload"
@@ -125,15 +152,24 @@ def create_export(
 
         logger.info(f"Trying to get data for org_id: {identity.org_id}")
 
-        if host_data:
+        if first_host is not None:
             logger.debug(f"Trying to upload data using URL:{request_url}")
             logger.info(
-                f"{len(host_data)} hosts will be exported (format: {exportFormat}) for org_id {identity.org_id}"
+                f"Hosts will be exported (format: {exportFormat}, compression: {compression}) "
+                f"for org_id {identity.org_id}"
             )
+            upload_headers = dict(request_headers)
+            if compression and exportFormat != "parquet":
+                upload_headers["content-encoding"] = compression
             response = session.post(
                 url=request_url,
-                headers=request_headers,
-                data=_format_export_data(host_data, exportFormat).encode("utf-8"),
+                headers=upload_headers,
+                data=_export_data_chunks(
+                    chain((first_host,), host_data),
+                    exportFormat,
+                    compression=compression,
+                    batch_size=inventory_config.export_svc_batch_size,
+                ),
             )
             _handle_export_response(response, exportUUID, exportFormat)
             export_created = True
@@ -193,6 +229,42 @@ def _handle_export_response(response: Response, exportUUID: UUID, exportFormat:
         logger.info(f"{response.text} for export ID {str(exportUUID)} in {exportFormat.upper()} format")
 
 
+def _compressor(compression: str):
+    # The streaming compressor of the compression, with the compress() and flush() methods
+    if compression == "gzip":
+        return zlib.compressobj(wbits=GZIP_WBITS)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unsupported export compression: {compression}")
+
+
+def _compress_chunks(chunks: Iterable[bytes], compression: str) -> Iterator[bytes]:
+    compressor = _compressor(compression)
+    for chunk in chunks:
+        if compressed_chunk := compressor.compress(chunk):
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+def _export_data_chunks(
+    data: Iterable[dict], exportFormat: str, compression: str | None = None, batch_size: int = 500
+) -> Iterator[bytes]:
+    # The body is uploaded with chunked transfer encoding. The hosts are serialized as they're sent,
+    # so neither the whole document nor all of the hosts are ever held in memory.
+    if exportFormat == "parquet":
+        return iter_parquet_chunks(data, batch_size, compression=compression)
+
+    if exportFormat == "json":
+        chunks = iter_json_chunks(data)
+    elif exportFormat == "csv":
+        chunks = iter_csv_chunks(data)
+    else:
+        raise ValueError(f"Unsupported export format: {exportFormat}")
+
+    encoded_chunks = (chunk.encode("utf-8") for chunk in chunks)
+    return _compress_chunks(encoded_chunks, compression) if compression else encoded_chunks
+
+
 def _format_export_data(data: list[dict], exportFormat: str) -> str:
     if exportFormat == "json":
         return json.dumps(data)
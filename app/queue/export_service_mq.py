@@ -1,13 +1,24 @@
+from functools import partial
+
+from confluent_kafka import KafkaException
 from marshmallow import Schema
 from marshmallow import ValidationError
 from marshmallow import fields
+from marshmallow import validate
 
 from app.common import inventory_config
 from app.logging import get_logger
+from app.models import db
 from app.queue import metrics
+from app.queue.export_scheduler import ExportScheduler
+from app.queue.export_scheduler import OffsetTracker
+from app.queue.export_service import EXPORT_COMPRESSIONS
+from app.queue.export_service import EXPORT_FORMATS
 from app.queue.export_service import create_export
+from app.queue.export_service import estimate_export_size
 from app.queue.host_mq import HBIMessageConsumerBase
 from app.queue.mq_common import common_message_parser
+from lib.db import session_guard
 
 logger = get_logger(__name__)
 
@@ -20,7 +31,8 @@ class ExportResourceRequest(Schema):
     application = fields.Str(required=True)
     export_request_uuid = fields.UUID(required=True)
     filters = fields.Dict()
-    format = fields.Str(required=True)
+    format = fields.Str(required=True, validate=validate.OneOf(EXPORT_FORMATS))
+    compression = fields.Str(validate=validate.OneOf(EXPORT_COMPRESSIONS))
     resource = fields.Str(required=True)
     uuid = fields.Str(required=True)
     x_rh_identity = fields.Str(required=True, data_key="x-rh-identity")
@@ -43,28 +55,35 @@ class ExportEventSchema(Schema):
     data = fields.Nested(ExportDataSchema, required=True)
 
 
+def _is_inventory_export(validated_msg: dict) -> bool:
+    return (
+        validated_msg["source"] == EXPORT_EVENT_SOURCE
+        and validated_msg["data"]["resource_request"]["application"] == EXPORT_SERVICE_APPLICATION
+    )
+
+
 class ExportServiceConsumer(HBIMessageConsumerBase):
     @metrics.export_service_message_handler_time.time()
     def handle_message(self, message):
         validated_msg = parse_export_service_message(message)
+        if not _is_inventory_export(validated_msg):
+            logger.debug("Found export message not related to host-inventory")
+            return False
+
+        return self.export(validated_msg)
+
+    def export(self, validated_msg: dict) -> bool:
         message_handled = False
         try:
-            if (
-                validated_msg["source"] == EXPORT_EVENT_SOURCE
-                and validated_msg["data"]["resource_request"]["application"] == EXPORT_SERVICE_APPLICATION
-            ):
-                logger.info("Found host-inventory application export message")
-                logger.debug("parsed_message: %s", validated_msg)
-                base64_x_rh_identity = validated_msg["data"]["resource_request"]["x_rh_identity"]
-
-                if create_export(validated_msg, base64_x_rh_identity, inventory_config()):
-                    metrics.export_service_message_handler_success.inc()
-                    message_handled = True
-                else:
-                    metrics.export_service_message_handler_failure.inc()
-                    message_handled = False
+            logger.info("Found host-inventory application export message")
+            logger.debug("parsed_message: %s", validated_msg)
+            base64_x_rh_identity = validated_msg["data"]["resource_request"]["x_rh_identity"]
+
+            if create_export(validated_msg, base64_x_rh_identity, inventory_config()):
+                metrics.export_service_message_handler_success.inc()
+                message_handled = True
             else:
-                logger.debug("Found export message not related to host-inventory")
+                metrics.export_service_message_handler_failure.inc()
                 message_handled = False
         except Exception as e:
             logger.error(e)
@@ -73,6 +92,82 @@ class ExportServiceConsumer(HBIMessageConsumerBase):
 
         return message_handled
 
+    def event_loop(self, interrupt):
+        config = self.flask_app.app.config["INVENTORY_CONFIG"]
+        if not config.export_svc_workers:
+            return super().event_loop(interrupt)
+
+        scheduler = ExportScheduler(
+            config.export_svc_workers, config.export_svc_max_exports_per_org, config.export_svc_max_wait_seconds
+        )
+        offsets = OffsetTracker()
+        paused = False
+        with self.flask_app.app.app_context():
+            try:
+                while not interrupt():
+                    # The consumer keeps polling while the queue is full, so it stays in the consumer group,
+                    # but stops fetching until the workers catch up. The exports held back by their org's limit
+                    # don't count, so that an org with many exports doesn't hold up the other orgs' exports.
+                    if scheduler.ready_count >= scheduler.workers:
+                        self.consumer.pause(self.consumer.assignment())
+                        paused = True
+                    elif paused:
+                        self.consumer.resume(self.consumer.assignment())
+                        paused = False
+
+                    with session_guard(db.session):
+                        messages = self.consumer.consume(
+                            num_messages=scheduler.workers, timeout=CONSUMER_POLL_TIMEOUT_SECONDS
+                        )
+                        for msg in messages:
+                            self._schedule_export(msg, scheduler, offsets)
+
+                    self._store_offsets(offsets)
+            finally:
+                scheduler.shutdown()
+                self._store_offsets(offsets)
+
+    def _schedule_export(self, msg, scheduler: ExportScheduler, offsets: OffsetTracker) -> None:
+        if msg is None:
+            return
+        elif msg.error():
+            logger.error(f"Message received but has an error, which is {str(msg.error())}")
+            metrics.export_service_message_handler_failure.inc()
+            return
+
+        # The message's offset is committed only once its export has finished
+        offsets.started(msg.topic(), msg.partition(), msg.offset())
+        on_done = partial(offsets.finished, msg.topic(), msg.partition(), msg.offset())
+        try:
+            validated_msg = parse_export_service_message(msg.value())
+            if not _is_inventory_export(validated_msg):
+                logger.debug("Found export message not related to host-inventory")
+                on_done()
+                return
+
+            org_id = validated_msg["redhatorgid"]
+            size = estimate_export_size(org_id)
+        except Exception:
+            logger.exception("Unable to schedule export", extra={"incoming_message": msg.value()})
+            metrics.export_service_message_handler_failure.inc()
+            on_done()
+            return
+
+        scheduler.submit(org_id, size, partial(self._run_export, validated_msg), on_done)
+
+    def _run_export(self, validated_msg: dict) -> None:
+        # Runs on an export worker thread, with its own app context and DB session
+        with self.flask_app.app.app_context(), session_guard(db.session):
+            self.export(validated_msg)
+
+    def _store_offsets(self, offsets: OffsetTracker) -> None:
+        if committable := offsets.pop_committable():
+            try:
+                self.consumer.store_offsets(offsets=committable)
+            except KafkaException as e:
+                # The partition was revoked, and its unfinished messages will be processed again
+                logger.warning(f"Unable to store the offsets of the finished exports: {e}")
+
 
 @metrics.export_service_message_parsing_time.time()
 def parse_export_service_message(message):
@@ -3,12 +3,16 @@ from __future__ import annotations
 import base64
 import json
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from copy import deepcopy
 from functools import partial
+from multiprocessing import get_context
 from uuid import UUID
 
 from confluent_kafka import Consumer
-from flask.app import Flask
+from connexion import FlaskApp
 from marshmallow import Schema
 from marshmallow import ValidationError
 from marshmallow import fields
@@ -16,8 +20,9 @@ from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.exc import StaleDataError
 
-from api.cache import delete_cached_system_keys
+from api.cache import invalidate_cached_systems
 from api.cache import set_cached_system
+from api.cache import versioned_system_key
 from api.cache_key import make_system_cache_key
 from api.staleness_query import get_staleness_obj
 from app.auth.identity import Identity
@@ -37,6 +42,7 @@ from app.logging import get_logger
 from app.logging import threadctx
 from app.models import Host
 from app.models import HostGroupAssoc
+from app.models import HostSchema
 from app.models import LimitedHostSchema
 from app.models import db
 from app.payload_tracker import PayloadTrackerContext
@@ -44,6 +50,7 @@ from app.payload_tracker import PayloadTrackerProcessingContext
 from app.payload_tracker import get_payload_tracker
 from app.queue import metrics
 from app.queue.event_producer import EventProducer
+from app.queue.event_producer import MessageDetails
 from app.queue.events import HOST_EVENT_TYPE_CREATED
 from app.queue.events import EventType
 from app.queue.events import build_event
@@ -52,7 +59,9 @@ from app.queue.events import operation_results_to_event_type
 from app.queue.mq_common import common_message_parser
 from app.queue.notifications import NotificationType
 from app.queue.notifications import send_notification
+from app.serialization import deserialize_canonical_facts
 from app.serialization import deserialize_host
+from app.serialization import deserialize_validated_host
 from app.serialization import remove_null_canonical_facts
 from app.serialization import serialize_group
 from app.serialization import serialize_host
@@ -99,20 +108,21 @@ class DebeziumEnvelopeSchema(Schema):
 
 # Helper class to facilitate batch operations
 class OperationResult:
-    def __init__(self, hr, pm, st, so, et, sl):
+    def __init__(self, hr, pm, st, so, et, sl, skip_event=False):
         self.host_row = hr
         self.platform_metadata = pm
         self.staleness_timestamps = st
         self.staleness_object = so
         self.event_type = et
         self.success_logger = sl
+        self.skip_event = skip_event
 
 
 class HBIMessageConsumerBase:
     def __init__(
         self,
         consumer: Consumer,
-        flask_app: Flask,
+        flask_app: FlaskApp,
         event_producer: EventProducer,
         notification_event_producer: EventProducer,
     ) -> None:
@@ -128,6 +138,9 @@ class HBIMessageConsumerBase:
     def handle_message(self, *args, **kwargs) -> OperationResult | None:
         raise NotImplementedError("Not implemented in the HBIMessageConsumerBase class")
 
+    def prepare_batch(self, messages: list):
+        pass  # No action is taken by default
+
     def post_process_rows(self, processed_rows: list[OperationResult]):
         pass  # No action is taken by default
 
@@ -140,6 +153,7 @@ class HBIMessageConsumerBase:
                         num_messages=inventory_config().mq_db_batch_max_messages,
                         timeout=inventory_config().mq_db_batch_max_seconds,
                     )
+                    self.prepare_batch([msg.value() for msg in messages if msg is not None and not msg.error()])
 
                     for msg in messages:
                         if msg is None:
@@ -217,9 +231,47 @@ class WorkspaceMessageConsumer(HBIMessageConsumerBase):
 
 
 class HostMessageConsumer(HBIMessageConsumerBase):
+    host_schema: type[LimitedHostSchema] = HostSchema
+    prevalidation_pool: ProcessPoolExecutor | None = None
+    prevalidated_messages: dict = {}
+
+    def prepare_batch(self, messages: list):
+        self.prevalidated_messages = {}
+        if not inventory_config().mq_prevalidation_workers or len(messages) < 2:
+            return
+
+        try:
+            with metrics.ingress_message_prevalidation_time.time():
+                if not self.prevalidation_pool:
+                    # "spawn" avoids forking the process with the Kafka client's threads running.
+                    self.prevalidation_pool = ProcessPoolExecutor(
+                        max_workers=inventory_config().mq_prevalidation_workers, mp_context=get_context("spawn")
+                    )
+
+                results = self.prevalidation_pool.map(
+                    partial(prevalidate_host_operation_message, host_schema=self.host_schema), messages
+                )
+                self.prevalidated_messages = {
+                    message: result for message, result in zip(messages, results) if result is not None
+                }
+        except Exception as exc:
+            # The messages are validated one at a time instead.
+            metrics.ingress_batch_preparation_failure.inc()
+            logger.exception("Prevalidating the batch failed; validating the messages individually")
+            self.prevalidated_messages = {}
+            if isinstance(exc, BrokenProcessPool) and self.prevalidation_pool:
+                # A broken pool can't run anything anymore; a new one is started for the next batch.
+                self.prevalidation_pool.shutdown(wait=False)
+                self.prevalidation_pool = None
+
     @metrics.ingress_message_handler_time.time()
     def handle_message(self, message) -> OperationResult:
-        validated_operation_msg = parse_operation_message(message, HostOperationSchema)
+        # Identical messages share the prevalidated result, so it can only be used once.
+        if (prevalidated := self.prevalidated_messages.pop(message, None)) is not None:
+            validated_operation_msg, validated_host_data = prevalidated
+        else:
+            validated_operation_msg = parse_operation_message(message, HostOperationSchema)
+            validated_host_data = None
         platform_metadata = validated_operation_msg.get("platform_metadata", {})
 
         request_id = platform_metadata.get("request_id")
@@ -233,10 +285,16 @@ class HostMessageConsumer(HBIMessageConsumerBase):
             try:
                 host = validated_operation_msg["data"]
                 host_row, operation_result, identity, success_logger = self.process_message(
-                    host, platform_metadata, validated_operation_msg.get("operation_args", {})
+                    host, platform_metadata, validated_operation_msg.get("operation_args", {}), validated_host_data
                 )
                 staleness_timestamps = Timestamps.from_config(inventory_config())
                 event_type = operation_results_to_event_type(operation_result)
+                # A check-in that carries the same data as the stored host only refreshes its staleness.
+                skip_event = (
+                    event_type == EventType.updated
+                    and inventory_config().mq_skip_unchanged_host_events
+                    and not host_row.content_modified()
+                )
 
                 return OperationResult(
                     host_row,
@@ -245,6 +303,7 @@ class HostMessageConsumer(HBIMessageConsumerBase):
                     get_staleness_obj(identity.org_id),
                     event_type,
                     success_logger,
+                    skip_event,
                 )
 
             except ValidationException as ve:
@@ -275,7 +334,12 @@ class HostMessageConsumer(HBIMessageConsumerBase):
                 db.session.commit()
                 # The above session is automatically committed or rolled back.
                 # Now we need to send out messages for the batch of hosts we just processed.
-                write_message_batch(self.event_producer, self.notification_event_producer, processed_rows)
+                write_message_batch(
+                    self.event_producer,
+                    self.notification_event_producer,
+                    processed_rows,
+                    coalesce=inventory_config().mq_coalesce_host_events,
+                )
 
         except StaleDataError as exc:
             metrics.ingress_message_handler_failure.inc(amount=len(processed_rows))
@@ -287,21 +351,62 @@ class HostMessageConsumer(HBIMessageConsumerBase):
 
 
 class IngressMessageConsumer(HostMessageConsumer):
-    def process_message(self, host_data, platform_metadata, operation_args=None):
+    batch_host_finder: host_repository.BatchHostFinder | None = None
+
+    def prepare_batch(self, messages: list):
+        super().prepare_batch(messages)
+
+        self.batch_host_finder = None
+        if not inventory_config().mq_db_batch_dedup or len(messages) < 2:
+            return
+
+        # Load the existing hosts for the whole batch at once, instead of looking them up one message at a time.
+        # Messages that can't be parsed here are skipped; they get reported when they're handled individually.
+        canonical_facts_by_org = defaultdict(list)
+        for message in messages:
+            try:
+                if message in self.prevalidated_messages:
+                    host_data = self.prevalidated_messages[message][0]["data"]
+                else:
+                    host_data = json.loads(message)["data"]
+                canonical_facts_by_org[host_data["org_id"]].append(deserialize_canonical_facts(host_data))
+            except Exception:
+                continue
+
+        batch_host_finder = host_repository.BatchHostFinder()
+        try:
+            for org_id, canonical_facts_list in canonical_facts_by_org.items():
+                batch_host_finder.prefetch(org_id, canonical_facts_list)
+        except Exception:
+            # The existing hosts are looked up one message at a time instead. Nothing was written yet,
+            # so the rollback only ends the transaction the failed query aborted.
+            metrics.ingress_batch_preparation_failure.inc()
+            logger.exception("Prefetching the batch's existing hosts failed; looking them up individually")
+            db.session.rollback()
+            return
+
+        self.batch_host_finder = batch_host_finder
+
+    def process_message(self, host_data, platform_metadata, operation_args=None, validated_host_data=None):
         if operation_args is None:
             operation_args = {}
 
         sp_fields_to_log = extract_host_dict_sp_to_log(host_data)
         try:
             identity = _get_identity(host_data, platform_metadata)
-            input_host = deserialize_host(host_data)
+            if validated_host_data is None:
+                input_host = deserialize_host(host_data)
+            else:
+                input_host = deserialize_validated_host(validated_host_data)
 
             # basic-auth does not need owner_id
             if identity.identity_type == IdentityType.SYSTEM:
                 input_host = _set_owner(input_host, identity)
 
             log_add_host_attempt(logger, input_host, sp_fields_to_log, identity)
-            host_row, add_result = host_repository.add_host(input_host, identity, operation_args=operation_args)
+            host_row, add_result = host_repository.add_host(
+                input_host, identity, operation_args=operation_args, batch_host_finder=self.batch_host_finder
+            )
 
             # If this is a new host, assign it to the "ungrouped hosts" group/workspace
             if add_result == host_repository.AddHostResult.created and get_flag_value(
@@ -334,14 +439,19 @@ class IngressMessageConsumer(HostMessageConsumer):
 
 
 class SystemProfileMessageConsumer(HostMessageConsumer):
-    def process_message(self, host_data, platform_metadata, operation_args=None):  # noqa: ARG002, required by process_message
+    host_schema = LimitedHostSchema
+
+    def process_message(self, host_data, platform_metadata, operation_args=None, validated_host_data=None):  # noqa: ARG002, required by process_message
         if operation_args is None:
             operation_args = {}
 
         sp_fields_to_log = extract_host_dict_sp_to_log(host_data)
 
         try:
-            input_host = deserialize_host(host_data, schema=LimitedHostSchema)
+            if validated_host_data is None:
+                input_host = deserialize_host(host_data, schema=LimitedHostSchema)
+            else:
+                input_host = deserialize_validated_host(validated_host_data, schema=LimitedHostSchema)
             input_host.id = host_data.get("id")
             identity = create_mock_identity_with_org_id(input_host.org_id)
             output_host, update_result = host_repository.update_system_profile(input_host, identity)
@@ -458,6 +568,24 @@ def _validate_json_object_for_utf8(json_object):
         pass
 
 
+def prevalidate_host_operation_message(message, host_schema: type[LimitedHostSchema]) -> tuple[dict, dict] | None:
+    """
+    Parses a host operation message and loads its host data, without touching the DB.
+    Runs in the prevalidation worker processes, so it must stay free of side effects:
+    if anything fails, None is returned and the message is handled from scratch
+    by the consumer, which takes care of the logging, metrics and notifications.
+    """
+    try:
+        parsed_message = json.loads(message)
+        _validate_json_object_for_utf8(parsed_message)
+        validated_operation_msg = HostOperationSchema().load(parsed_message)
+        validated_host_data = host_schema().load(validated_operation_msg["data"])
+    except Exception:
+        return None
+
+    return validated_operation_msg, validated_host_data
+
+
 @metrics.ingress_message_parsing_time.time()
 def parse_operation_message(message, schema: Schema):
     parsed_message = common_message_parser(message)
@@ -503,13 +631,15 @@ def sync_event_message(message, session, event_producer):
                 host.system_profile_facts.get("operating_system", {}).get("name"),
                 str(host.system_profile_facts.get("bootc_status", {}).get("booted") is not None),
             )
-            # add back "wait=True", if needed.
-            event_producer.write_event(event, host.id, headers, wait=True)
+            # The caller flushes the producer once per chunk of messages.
+            event_producer.write_event(event, host.id, headers)
 
     return
 
 
-def write_delete_event_message(event_producer: EventProducer, result: OperationResult, initiated_by_frontend: bool):
+def write_delete_event_message(
+    event_producer: EventProducer, result: OperationResult, initiated_by_frontend: bool, *, wait: bool = True
+) -> MessageDetails:
     event = build_event(
         EventType.delete,
         result.host_row,
@@ -524,19 +654,22 @@ def write_delete_event_message(event_producer: EventProducer, result: OperationR
         result.host_row.system_profile_facts.get("operating_system", {}).get("name"),
         str(result.host_row.system_profile_facts.get("bootc_status", {}).get("booted") is not None),
     )
-    event_producer.write_event(event, str(result.host_row.id), headers, wait=True)
+    message_details = event_producer.write_event(event, str(result.host_row.id), headers, wait=wait)
     insights_id = result.host_row.canonical_facts.get("insights_id")
     owner_id = result.host_row.system_profile_facts.get("owner_id")
     if insights_id and owner_id:
-        delete_cached_system_keys(
-            insights_id=insights_id, org_id=result.host_row.org_id, owner_id=owner_id, spawn=True
-        )
+        invalidate_cached_systems(insights_id=insights_id, org_id=result.host_row.org_id, spawn=True)
     result.success_logger()
+    return message_details
 
 
 def write_add_update_event_message(
-    event_producer: EventProducer, notification_event_producer: EventProducer, result: OperationResult
-):
+    event_producer: EventProducer,
+    notification_event_producer: EventProducer,
+    result: OperationResult,
+    *,
+    wait: bool = True,
+) -> MessageDetails:
     # The request ID in the headers is fetched from threadctx.request_id
     request_id = result.platform_metadata.get("request_id")
     initialize_thread_local_storage(request_id, result.host_row.org_id, result.host_row.account)
@@ -561,7 +694,7 @@ def write_add_update_event_message(
             str(output_host.get("system_profile", {}).get("bootc_status", {}).get("booted") is not None),
         )
 
-    event_producer.write_event(event, str(result.host_row.id), headers, wait=True)
+    message_details = event_producer.write_event(event, str(result.host_row.id), headers, wait=wait)
 
     if result.event_type.name == HOST_EVENT_TYPE_CREATED:
         # Notifications are expected to omit null canonical facts
@@ -570,6 +703,7 @@ def write_add_update_event_message(
             notification_event_producer,
             notification_type=NotificationType.new_system_registered,
             host=output_host,
+            wait=wait,
         )
     result.success_logger(output_host)
 
@@ -583,24 +717,124 @@ def write_add_update_event_message(
                     del output_host["tags"]
                 if "system_profile" in output_host:
                     del output_host["system_profile"]
-                set_cached_system(system_key, output_host, inventory_config())
+                if system_key := versioned_system_key(system_key, insights_id, org_id):
+                    set_cached_system(system_key, output_host, inventory_config())
         except Exception as ex:
             logger.error("Error during set cache", ex)
 
+    return message_details
+
+
+def flush_and_report_undelivered(
+    event_producer: EventProducer,
+    notification_event_producer: EventProducer,
+    produced_messages: list[tuple[OperationResult, MessageDetails]],
+) -> None:
+    # Wait for the whole batch to be delivered at once,
+    # then report the messages that could not be delivered one by one.
+    notification_event_producer.flush()
+    event_producer.flush()
+
+    for result, message_details in produced_messages:
+        if not message_details.delivered:
+            logger.error(
+                f"Event for host {result.host_row.id} was not delivered: {message_details.error}",
+                extra={"request_id": (result.platform_metadata or {}).get("request_id")},
+            )
+
+
+def coalesce_operation_results(
+    processed_rows: list[OperationResult],
+) -> tuple[list[OperationResult], list[OperationResult]]:
+    """
+    Keeps only the last result for each host in the batch. All the results for a host share the same
+    host row, so its event already carries the state after every message was applied.
+    Returns the results to produce events for, and the superseded ones.
+    """
+    last_result_by_host: dict[UUID, OperationResult] = {}
+    created_host_ids = set()
+    superseded_results = []
+    for result in processed_rows:
+        if result is None:
+            continue
+
+        host_id = result.host_row.id
+        if result.event_type == EventType.created:
+            created_host_ids.add(host_id)
+        if (previous_result := last_result_by_host.pop(host_id, None)) is not None:
+            superseded_results.append(previous_result)
+        last_result_by_host[host_id] = result
+
+    # A host created within the batch is still reported as created, no matter how many updates followed.
+    for host_id in created_host_ids:
+        result = last_result_by_host[host_id]
+        last_result_by_host[host_id] = OperationResult(
+            result.host_row,
+            result.platform_metadata,
+            result.staleness_timestamps,
+            result.staleness_object,
+            EventType.created,
+            result.success_logger,
+        )
+
+    return list(last_result_by_host.values()), superseded_results
+
+
+def report_result_without_event(result: OperationResult) -> None:
+    # The request was applied, but no event is produced for it: either the host's data didn't change,
+    # or the event is produced by a later message for the same host.
+    request_id = result.platform_metadata.get("request_id")
+    initialize_thread_local_storage(request_id, result.host_row.org_id, result.host_row.account)
+    payload_tracker = get_payload_tracker(request_id=request_id)
+
+    with PayloadTrackerProcessingContext(
+        payload_tracker,
+        processing_status_message="host operation complete",
+        current_operation="write_message_batch",
+        inventory_id=result.host_row.id,
+    ):
+        output_host = serialize_host(result.host_row, result.staleness_timestamps, staleness=result.staleness_object)
+
+    result.success_logger(output_host)
+
 
 def write_message_batch(
     event_producer: EventProducer,
     notification_event_producer: EventProducer,
     processed_rows: list[OperationResult],
+    *,
+    coalesce: bool = False,
 ):
+    if coalesce:
+        processed_rows, superseded_results = coalesce_operation_results(processed_rows)
+        for result in superseded_results:
+            try:
+                report_result_without_event(result)
+            except Exception as exc:
+                logger.exception("Error while reporting a coalesced message", exc_info=exc)
+
+        metrics.ingress_coalesced_host_events.inc(len(superseded_results))
+
+    produced_messages = []
     for result in processed_rows:
-        if result is not None:
+        if result is not None and result.skip_event:
             try:
-                write_add_update_event_message(event_producer, notification_event_producer, result)
+                report_result_without_event(result)
+                metrics.ingress_skipped_unchanged_host_events.inc()
+            except Exception as exc:
+                logger.exception("Error while reporting an unchanged host", exc_info=exc)
+        elif result is not None:
+            try:
+                message_details = write_add_update_event_message(
+                    event_producer, notification_event_producer, result, wait=False
+                )
+                produced_messages.append((result, message_details))
             except Exception as exc:
                 metrics.ingress_message_handler_failure.inc()
                 logger.exception("Error while producing message", exc_info=exc)
 
+    flush_and_report_undelivered(event_producer, notification_event_producer, produced_messages)
+
 
 def initialize_thread_local_storage(request_id: str, org_id: str | None = None, account: str | None = None):
     threadctx.request_id = request_id
@@ -37,6 +37,22 @@ ingress_message_handler_success = Counter(
 ingress_message_handler_failure = Counter(
     "inventory_ingress_message_handler_failures", "Total amount of failures handling messages from the ingress queue"
 )
+ingress_coalesced_host_events = Counter(
+    "inventory_ingress_coalesced_host_events",
+    "Total amount of host events not produced because a later message in the batch updated the same host",
+)
+ingress_skipped_unchanged_host_events = Counter(
+    "inventory_ingress_skipped_unchanged_host_events",
+    "Total amount of host events not produced because the host's data did not change",
+)
+ingress_batch_preparation_failure = Counter(
+    "inventory_ingress_batch_preparation_failures",
+    "Total amount of failures prevalidating or prefetching a batch of messages, which are then handled one at a time",
+)
+ingress_message_prevalidation_time = Summary(
+    "inventory_ingress_message_prevalidation_seconds",
+    "Time spent parsing and validating a batch of messages in the worker processes",
+)
 ingress_message_handler_time = Summary(
     "inventory_ingress_message_handler_seconds", "Total time spent handling messages from the ingress queue"
 )
@@ -102,3 +118,6 @@ export_service_message_handler_failure = Counter(
 export_service_message_handler_time = Summary(
     "export_service_message_handler_seconds", "Total time spent handling messages from the export service queue"
 )
+export_service_export_wait_time = Summary(
+    "export_service_export_wait_seconds", "Time the export requests spent queued before an export worker ran them"
+)
@@ -25,6 +25,7 @@ from lib.feature_flags import get_flag_value
 
 __all__ = (
     "deserialize_host",
+    "deserialize_validated_host",
     "serialize_host",
     "serialize_host_system_profile",
     "serialize_canonical_facts",
@@ -46,7 +47,7 @@ _EXPORT_SERVICE_FIELDS = [
     "host_type",
 ]
 
-_CANONICAL_FACTS_FIELDS = (
+CANONICAL_FACTS_FIELDS = (
     "insights_id",
     "subscription_manager_id",
     "satellite_id",
@@ -75,6 +76,12 @@ DEFAULT_FIELDS = (
     "groups",
 )
 
+# The top-level fields of the hosts in the API responses, that can be requested as a sparse fieldset
+HOST_FIELDS = CANONICAL_FACTS_FIELDS + DEFAULT_FIELDS + ("last_check_in",)
+
+# The fields computed from the host's staleness timestamps
+_STALENESS_FIELDS = ("stale_timestamp", "stale_warning_timestamp", "culled_timestamp", "state")
+
 ADDITIONAL_HOST_MQ_FIELDS = (
     "tags",
     "system_profile",
@@ -98,6 +105,13 @@ def deserialize_host(
         invalid_data = {k: e.data.get(k, "<missing>") for k in e.messages.keys()}
         raise ValidationException(str(e.messages) + "; Invalid data: " + str(invalid_data)) from None
 
+    return deserialize_validated_host(validated_data, schema)
+
+
+def deserialize_validated_host(
+    validated_data: dict, schema: type[HostSchema | LimitedHostSchema] = HostSchema
+) -> Host | LimitedHost:
+    """Builds the host model from data that has already been loaded by the given schema."""
     canonical_facts = _deserialize_canonical_facts(validated_data)
     facts = _deserialize_facts(validated_data.get("facts"))
     tags = _deserialize_tags(validated_data.get("tags"))
@@ -119,7 +133,7 @@ def deserialize_canonical_facts(raw_data, all=False):
 
 # Removes any null canonical facts from a serialized host.
 def remove_null_canonical_facts(serialized_host: dict):
-    for field_name in [f for f in _CANONICAL_FACTS_FIELDS if serialized_host[f] is None]:
+    for field_name in [f for f in CANONICAL_FACTS_FIELDS if serialized_host[f] is None]:
         del serialized_host[field_name]
 
 
@@ -130,22 +144,34 @@ def serialize_host(
     additional_fields=None,
     staleness=None,
     system_profile_fields=None,
+    host_fields=None,
 ):
     # Ensure additional_fields is a tuple
     additional_fields = additional_fields or tuple()
 
-    timestamps = get_staleness_timestamps(host, staleness_timestamps, staleness)
-
     if get_flag_value(FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS):
-        fields = DEFAULT_FIELDS + ("last_check_in",) + additional_fields
+        fields = DEFAULT_FIELDS + ("last_check_in",)
     else:
-        fields = DEFAULT_FIELDS + additional_fields
+        fields = DEFAULT_FIELDS
+
+    # A sparse fieldset only has the requested fields, and the id. The host has only the columns they need.
+    if host_fields is not None:
+        fields = tuple(field for field in fields if field == "id" or field in host_fields)
 
+    fields += additional_fields
     if for_mq:
         fields += ADDITIONAL_HOST_MQ_FIELDS
 
+    if any(field in fields for field in _STALENESS_FIELDS):
+        timestamps = get_staleness_timestamps(host, staleness_timestamps, staleness)
+
     # Base serialization
-    serialized_host = {**serialize_canonical_facts(host.canonical_facts)}
+    if host_fields is None:
+        serialized_host = {**serialize_canonical_facts(host.canonical_facts)}
+    else:
+        serialized_host = {
+            field: host.canonical_facts.get(field) for field in CANONICAL_FACTS_FIELDS if field in host_fields
+        }
 
     # Define field mapping to avoid repeated "if" conditions
     field_mapping = {
@@ -268,15 +294,15 @@ def _recursive_casefold(field_data):
 
 
 def _deserialize_canonical_facts(data):
-    return {field: _recursive_casefold(data[field]) for field in _CANONICAL_FACTS_FIELDS if data.get(field)}
+    return {field: _recursive_casefold(data[field]) for field in CANONICAL_FACTS_FIELDS if data.get(field)}
 
 
 def _deserialize_all_canonical_facts(data):
-    return {field: _recursive_casefold(data[field]) if data.get(field) else None for field in _CANONICAL_FACTS_FIELDS}
+    return {field: _recursive_casefold(data[field]) if data.get(field) else None for field in CANONICAL_FACTS_FIELDS}
 
 
 def serialize_canonical_facts(canonical_facts):
-    return {field: canonical_facts.get(field) for field in _CANONICAL_FACTS_FIELDS}
+    return {field: canonical_facts.get(field) for field in CANONICAL_FACTS_FIELDS}
 
 
 def _deserialize_facts(data):
@@ -1,12 +1,19 @@
 #!/usr/bin/python
 import sys
+from argparse import ArgumentParser
+from argparse import ArgumentTypeError
 from functools import partial
+from multiprocessing import get_context
 
 from sqlalchemy import ColumnElement
 from sqlalchemy import and_
+from sqlalchemy import func
 from sqlalchemy import or_
+from sqlalchemy import true
 from sqlalchemy.dialects.postgresql import array
 
+from api.cache import invalidate_cached_responses
+from api.host_count_query import invalidate_host_count_cache
 from app.environment import RuntimeEnvironment
 from app.logging import get_logger
 from app.logging import threadctx
@@ -17,12 +24,14 @@ from app.queue.metrics import event_producer_success
 from app.queue.metrics import event_serialization_time
 from jobs.common import excepthook
 from jobs.common import job_setup as host_reaper_job_setup
+from lib.handlers import ShutdownHandler
 from lib.host_delete import delete_hosts
 from lib.host_repository import find_hosts_by_staleness_job
 from lib.host_repository import find_hosts_sys_default_staleness
 from lib.metrics import delete_host_count
 from lib.metrics import delete_host_processing_time
 from lib.metrics import host_reaper_fail_count
+from lib.metrics import host_reaper_remaining_count
 
 PROMETHEUS_JOB = "inventory-reaper"
 LOGGER_NAME = "host_reaper"
@@ -30,15 +39,40 @@ COLLECTED_METRICS = (
     delete_host_count,
     delete_host_processing_time,
     host_reaper_fail_count,
+    host_reaper_remaining_count,
     event_producer_failure,
     event_producer_success,
     event_serialization_time,
 )
 RUNTIME_ENVIRONMENT = RuntimeEnvironment.JOB
+SHARD_PROCESS_POLL_SECONDS = 1
 
 
-def filter_hosts_in_state_using_custom_staleness(logger, session, state: list):
-    staleness_objects = session.query(Staleness).all()
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses a shard given as "index/count", where 0 <= index < count."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ArgumentTypeError(f"{value} is not a shard; expected index/count, such as 0/4") from None
+    if not 0 <= index < count:
+        raise ArgumentTypeError(f"The shard index must be at least 0 and less than the count, got {value}")
+    return index, count
+
+
+def org_shard_filter(org_id_column, shard: tuple[int, int]) -> ColumnElement:
+    # An org always falls into the same shard, so the org's staleness settings and its hosts go together
+    index, count = shard
+    if count == 1:
+        return true()
+    return func.hashtext(org_id_column).op("&")(0x7FFFFFFF) % count == index
+
+
+def shard_label(shard: tuple[int, int]) -> str:
+    return f"{shard[0]}/{shard[1]}"
+
+
+def filter_hosts_in_state_using_custom_staleness(logger, session, state: list, shard: tuple[int, int] = (0, 1)):
+    staleness_objects = session.query(Staleness).filter(org_shard_filter(Staleness.org_id, shard)).all()
     org_ids = []
 
     query_filters = []
@@ -61,9 +95,9 @@ def filter_hosts_in_state_using_sys_default_staleness(logger, org_ids, state: li
     return and_(~Host.org_id.in_(org_ids), find_hosts_sys_default_staleness(state))
 
 
-def find_hosts_in_state(logger, session, state: list):
+def find_hosts_in_state(logger, session, state: list, shard: tuple[int, int] = (0, 1)):
     # Find all host ids that are using custom staleness
-    query_filters, org_ids = filter_hosts_in_state_using_custom_staleness(logger, session, state)
+    query_filters, org_ids = filter_hosts_in_state_using_custom_staleness(logger, session, state, shard)
 
     # Find all host ids that are not using custom staleness,
     # excluding the hosts for the org_ids that use custom staleness
@@ -73,9 +107,23 @@ def find_hosts_in_state(logger, session, state: list):
 
 
 @host_reaper_fail_count.count_exceptions()
-def run(config, logger, session, event_producer, notification_event_producer, shutdown_handler, application):
+def run(
+    config,
+    logger,
+    session,
+    event_producer,
+    notification_event_producer,
+    shutdown_handler,
+    application,
+    shard: tuple[int, int] = (0, 1),
+):
     with application.app.app_context():
-        filter_hosts_to_delete = find_hosts_in_state(logger, session, ["culled"])
+        filter_hosts_to_delete = [
+            and_(
+                org_shard_filter(Host.org_id, shard),
+                or_(False, *find_hosts_in_state(logger, session, ["culled"], shard)),
+            )
+        ]
 
         # Adhoc fix for RHINENG-16901
         # hosts reporter by rhsm-system-profile-bridge are not being deleted
@@ -95,37 +143,93 @@ def run(config, logger, session, event_producer, notification_event_producer, sh
         for host in rhsm_bridge_hosts_query.yield_per(config.host_delete_chunk_size):
             host._update_modified_date()
             host._update_last_check_in_date()
+            invalidate_host_count_cache(host.org_id, session)
+            invalidate_cached_responses(host.org_id, session)
 
         query = session.query(Host).filter(and_(or_(False, *filter_hosts_to_delete)))
-        hosts_processed = config.host_delete_chunk_size
         deletions_remaining = query.count()
-
-        while hosts_processed == config.host_delete_chunk_size:
-            logger.info(f"Reaper starting batch; {deletions_remaining} remaining.")
-            try:
-                events = delete_hosts(
-                    query,
-                    event_producer,
-                    notification_event_producer,
-                    config.host_delete_chunk_size,
-                    shutdown_handler.shut_down,
-                    control_rule="REAPER",
-                )
-                hosts_processed = len(list(events))
-            except InterruptedError:
-                events = []
-                hosts_processed = 0
-
-            deletions_remaining -= hosts_processed
-
-
-if __name__ == "__main__":
+        host_reaper_remaining_count.set(deletions_remaining)
+        logger.info(f"Reaper shard {shard_label(shard)} starting; {deletions_remaining} to delete.")
+
+        events = delete_hosts(
+            query,
+            event_producer,
+            notification_event_producer,
+            config.host_delete_chunk_size,
+            shutdown_handler.shut_down,
+            control_rule="REAPER",
+        )
+        hosts_processed = 0
+        try:
+            # The hosts are deleted in chunks; the progress is reported once per chunk
+            for hosts_processed, _ in enumerate(events, start=1):
+                if hosts_processed % config.host_delete_chunk_size == 0:
+                    host_reaper_remaining_count.set(deletions_remaining - hosts_processed)
+                    logger.info(
+                        f"Reaper shard {shard_label(shard)} deleted a batch; "
+                        f"{deletions_remaining - hosts_processed} remaining."
+                    )
+        except InterruptedError:
+            pass
+
+        host_reaper_remaining_count.set(deletions_remaining - hosts_processed)
+
+
+def run_shard(shard: tuple[int, int]):
     logger = get_logger(LOGGER_NAME)
-    job_type = "Host reaper"
+    job_type = f"Host reaper shard {shard_label(shard)}"
     sys.excepthook = partial(excepthook, logger, job_type)
 
     threadctx.request_id = None
+    # The metrics of each shard are pushed separately, labeled with the shard
     config, session, event_producer, notification_event_producer, shutdown_handler, application = (
-        host_reaper_job_setup(COLLECTED_METRICS, PROMETHEUS_JOB)
+        host_reaper_job_setup(COLLECTED_METRICS, PROMETHEUS_JOB, grouping_key={"shard": f"{shard[0]}-of-{shard[1]}"})
     )
-    run(config, logger, session, event_producer, notification_event_producer, shutdown_handler, application)
+    run(config, logger, session, event_producer, notification_event_producer, shutdown_handler, application, shard)
+
+
+def run_shards(count: int):
+    # Every shard runs in its own process, with its own DB session and Kafka producers.
+    # The shutdown signal is passed on to the shard processes, which finish their current batch.
+    logger = get_logger(LOGGER_NAME)
+    shutdown_handler = ShutdownHandler()
+    shutdown_handler.register()
+
+    context = get_context("spawn")
+    processes = [context.Process(target=run_shard, args=((index, count),)) for index in range(count)]
+    for process in processes:
+        process.start()
+
+    terminated = False
+    while any(process.is_alive() for process in processes):
+        if shutdown_handler.shut_down() and not terminated:
+            for process in processes:
+                process.terminate()
+            terminated = True
+        for process in processes:
+            process.join(SHARD_PROCESS_POLL_SECONDS / count)
+
+    failed = [index for index, process in enumerate(processes) if process.exitcode]
+    if failed:
+        logger.error(f"Host reaper shards {failed} of {count} failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Deletes the culled hosts.")
+    shard_options = parser.add_mutually_exclusive_group()
+    shard_options.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=(0, 1),
+        help="only delete the hosts of the orgs in this shard, given as index/count, such as 0/4",
+    )
+    shard_options.add_argument(
+        "--shards", type=int, default=1, help="delete the hosts of all of the shards, each in its own process"
+    )
+    args = parser.parse_args()
+
+    if args.shards > 1:
+        run_shards(args.shards)
+    else:
+        run_shard(args.shard)
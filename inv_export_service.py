@@ -25,6 +25,8 @@ def main():
             "bootstrap.servers": config.bootstrap_servers,
             "auto.offset.reset": "earliest",
             **config.kafka_consumer,
+            # With export workers, the consumer stores the offsets of the finished exports itself
+            **({"enable.auto.offset.store": False} if config.export_svc_workers else {}),
         }
     )
     consumer.subscribe([config.export_service_topic])
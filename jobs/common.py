@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from functools import partial
 
 from prometheus_client import CollectorRegistry
@@ -37,7 +39,7 @@ def excepthook(logger, job_type, value, traceback):  # noqa: ARG001, needed by s
     logger.exception("%s failed", job_type, exc_info=value)
 
 
-def job_setup(collected_metrics: tuple, prometheus_job_name: str):
+def job_setup(collected_metrics: tuple, prometheus_job_name: str, grouping_key: dict | None = None):
     config = init_config()
     application = create_app(RUNTIME_ENVIRONMENT)
     init_cache(config, application)
@@ -46,7 +48,9 @@ def job_setup(collected_metrics: tuple, prometheus_job_name: str):
     for metric in collected_metrics:
         registry.register(metric)
     job = prometheus_job(config.kubernetes_namespace, prometheus_job_name)
-    prometheus_shutdown = partial(push_to_gateway, config.prometheus_pushgateway, job, registry)
+    prometheus_shutdown = partial(
+        push_to_gateway, config.prometheus_pushgateway, job, registry, grouping_key=grouping_key
+    )
     register_shutdown(prometheus_shutdown, "Pushing metrics")
 
     Session = init_db(config)
@@ -1,7 +1,37 @@
+import select
+import time
 from contextlib import contextmanager
 
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import func
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.common import inventory_config
+from app.logging import get_logger
+from app.models import READ_REPLICA_BIND_KEY
+from app.models import USE_READ_REPLICA_KEY
 from app.models import db
 
+logger = get_logger(__name__)
+
+NOTIFICATION_LISTENER_POLL_SECONDS = 5
+NOTIFICATION_LISTENER_RECONNECT_SECONDS = 5
+
+# Postgres functions take at most 100 arguments, so larger objects are built in parts
+JSONB_BUILD_OBJECT_MAX_KEYS = 50
+
+# The time since the last replayed transaction, or 0 when the replica has replayed everything it received.
+# It is NULL on a database that is not a replica.
+READ_REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Whether the read replica was usable when last checked, and when (monotonic time)
+_read_replica_usable = False
+_read_replica_checked_at = None
+
 
 @contextmanager
 def session_guard(session):
@@ -15,6 +45,98 @@ def session_guard(session):
         session.close()
 
 
+def _check_read_replica(max_lag_seconds):
+    try:
+        with db.engines[READ_REPLICA_BIND_KEY].connect() as connection:
+            lag_seconds = connection.execute(READ_REPLICA_LAG_QUERY).scalar() or 0
+    except Exception:
+        logger.exception("Checking the read replica failed; reading from the primary")
+        return False
+
+    if lag_seconds > max_lag_seconds:
+        logger.warning(f"The read replica lags {lag_seconds:.1f} seconds behind; reading from the primary")
+        return False
+
+    return True
+
+
+def read_replica_usable():
+    """
+    Whether the read replica is configured, reachable, and less than the max lag behind the primary.
+    The replica is checked at most once per lag check interval.
+    """
+    global _read_replica_usable
+    global _read_replica_checked_at
+
+    config = inventory_config()
+    if not config.read_replica_db_uri:
+        return False
+
+    now = time.monotonic()
+    if _read_replica_checked_at is None or now - _read_replica_checked_at >= config.read_replica_lag_check_interval:
+        _read_replica_usable = _check_read_replica(config.read_replica_max_lag_seconds)
+        _read_replica_checked_at = now
+
+    return _read_replica_usable
+
+
+def use_read_replica(session=None):
+    """
+    Routes the session's reads to the read replica, if it's usable. The writes stay on the primary.
+    Returns whether the reads are routed to the replica.
+    """
+    if session is None:
+        session = db.session
+
+    session.info[USE_READ_REPLICA_KEY] = read_replica_usable()
+    return session.info[USE_READ_REPLICA_KEY]
+
+
+@contextmanager
+def read_replica(session=None):
+    """Routes the session's reads to the read replica inside the block, if it's usable."""
+    if session is None:
+        session = db.session
+
+    use_read_replica(session)
+    try:
+        yield session
+    finally:
+        session.info.pop(USE_READ_REPLICA_KEY, None)
+
+
+@contextmanager
+def primary_reads(session=None):
+    """
+    Routes the session's reads to the primary inside the block. The values cached for the other requests
+    are read there: the replica may not have a write yet, whose invalidation already happened on commit.
+    """
+    if session is None:
+        session = db.session
+
+    routed_to_replica = session.info.pop(USE_READ_REPLICA_KEY, None)
+    try:
+        yield session
+    finally:
+        if routed_to_replica is not None:
+            session.info[USE_READ_REPLICA_KEY] = routed_to_replica
+
+
+def jsonb_subset(column, keys):
+    # The object of the column's values of the keys, with a null for each missing key
+    keys = list(dict.fromkeys(keys))
+    parts = [
+        func.jsonb_build_object(
+            *[kv for key in keys[i : i + JSONB_BUILD_OBJECT_MAX_KEYS] for kv in (key, column[key])], type_=JSONB
+        )
+        for i in range(0, len(keys), JSONB_BUILD_OBJECT_MAX_KEYS)
+    ]
+    subset = parts[0]
+    for part in parts[1:]:
+        subset = subset.op("||", return_type=JSONB)(part)
+    return subset
+
+
 @contextmanager
 def multi_session_guard(session_list):
     yield session_list
@@ -28,3 +150,35 @@ def multi_session_guard(session_list):
             session.close()
 
     db.session.expunge_all()
+
+
+def listen_for_notifications(flask_app, channel, on_notify, on_reset):
+    """
+    Runs forever, calling on_notify with the payload of every notification sent to the channel.
+    on_reset is called whenever notifications could have been missed: on (re)connecting and after failures.
+    """
+    while True:
+        try:
+            with flask_app.app_context():
+                connection = db.engine.raw_connection()
+            connection.detach()
+            dbapi_connection = connection.driver_connection
+            try:
+                dbapi_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                dbapi_connection.cursor().execute(f"LISTEN {channel};")
+                # Notifications sent while nobody was listening are lost.
+                on_reset()
+
+                while True:
+                    if select.select([dbapi_connection], [], [], NOTIFICATION_LISTENER_POLL_SECONDS) == ([], [], []):
+                        continue
+
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        on_notify(dbapi_connection.notifies.pop(0).payload)
+            finally:
+                connection.close()
+        except Exception:
+            logger.exception(f"Listener for the {channel} channel failed; reconnecting")
+            on_reset()
+            time.sleep(NOTIFICATION_LISTENER_RECONNECT_SECONDS)
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from collections.abc import Iterator
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy import event
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import scoped_session
+
+from app.logging import get_logger
+from app.models import FacetRollup
+from app.models import Host
+from app.models import db
+
+__all__ = (
+    "FACET_OPERATING_SYSTEM",
+    "FACET_SAP_SIDS",
+    "FACET_SAP_SYSTEM",
+    "FACET_TAGS",
+    "get_facet_rollup",
+    "host_facet_counts",
+    "reconcile_facet_rollup",
+    "update_facet_rollup",
+)
+
+logger = get_logger(__name__)
+
+FACET_TAGS = "tags"
+FACET_OPERATING_SYSTEM = "operating_system"
+FACET_SAP_SIDS = "sap_sids"
+FACET_SAP_SYSTEM = "sap_system"
+
+SYSTEM_PROFILE_FACETS = (FACET_OPERATING_SYSTEM, FACET_SAP_SIDS, FACET_SAP_SYSTEM)
+
+# The session info key of the facet count changes to be written when the session commits
+PENDING_DELTA_KEY = "facet_rollup_delta"
+
+
+def _facet_value_key(value: Any) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def _null_to_none(value):
+    # Like in the facet queries, "null" stands for no namespace, key or value
+    return None if value in (None, "null") else value
+
+
+def _tag_values(tags: dict | None) -> Iterator[dict]:
+    for namespace, keys in (tags or {}).items():
+        for key, values in (keys or {}).items():
+            # A key without values is a single tag without a value. A "null" value is kept apart from it,
+            # because the tags are searched and sorted by "None" for a "null" value, but by "" for no value.
+            for value in (values if isinstance(values, list) else [values]) or [None]:
+                yield {"namespace": _null_to_none(namespace), "key": _null_to_none(key), "value": value}
+
+
+def _operating_system_values(operating_system) -> Iterator[dict]:
+    if isinstance(operating_system, dict) and all(
+        operating_system.get(field) is not None for field in ("name", "major", "minor")
+    ):
+        yield {
+            "name": operating_system["name"],
+            "major": int(operating_system["major"]),
+            "minor": int(operating_system["minor"]),
+        }
+
+
+def _sap_sids_values(sap_sids) -> Iterator[str]:
+    if isinstance(sap_sids, list):
+        yield from sap_sids
+
+
+def _sap_system_values(sap_system) -> Iterator[bool]:
+    if isinstance(sap_system, bool):
+        yield sap_system
+
+
+def facet_counts(org_id: str, tags: dict | None, system_profile: dict | None, sign: int = 1) -> Counter:
+    """
+    The host's contribution to the org's facet counts, keyed by (org_id, facet, value).
+    Every value counts the host once. A sign of -1 takes the host out of the counts.
+    """
+    system_profile = system_profile or {}
+    values = {
+        FACET_TAGS: _tag_values(tags),
+        FACET_OPERATING_SYSTEM: _operating_system_values(system_profile.get(FACET_OPERATING_SYSTEM)),
+        FACET_SAP_SIDS: _sap_sids_values(system_profile.get(FACET_SAP_SIDS)),
+        FACET_SAP_SYSTEM: _sap_system_values(system_profile.get(FACET_SAP_SYSTEM)),
+    }
+    return Counter(
+        {
+            (org_id, facet, _facet_value_key(value)): sign
+            for facet, facet_values in values.items()
+            for value in facet_values
+        }
+    )
+
+
+def host_facet_counts(host: Host, sign: int = 1) -> Counter:
+    return facet_counts(host.org_id, host.tags, host.system_profile_facts, sign)
+
+
+def _hosts_facet_counts(query: Query) -> Counter:
+    # Sums the facet counts of the hosts the query selects, loading only the facet fields.
+    columns = [Host.system_profile_facts[facet].label(facet) for facet in SYSTEM_PROFILE_FACETS]
+    counts: Counter = Counter()
+    for row in query.with_entities(Host.org_id, Host.tags, *columns).yield_per(1000):
+        system_profile = {facet: getattr(row, facet) for facet in SYSTEM_PROFILE_FACETS}
+        counts.update(facet_counts(row.org_id, row.tags, system_profile))
+
+    return counts
+
+
+def update_facet_rollup(delta: Counter, session: Session | scoped_session | None = None) -> None:
+    """
+    Adds the facet count changes to the session's transaction. They are written when the transaction
+    commits, in a single statement ordered by row, so that concurrent transactions lock the shared rows
+    in the same order, and only for the duration of their commit.
+    """
+    if session is None:
+        session = db.session
+
+    session.info.setdefault(PENDING_DELTA_KEY, Counter()).update(delta)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_facet_rollup_delta(session):
+    if delta := session.info.pop(PENDING_DELTA_KEY, None):
+        _write_facet_rollup_delta(session, delta)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_facet_rollup_delta(session, transaction):
+    # Whatever was not written with the commit was rolled back.
+    if transaction.parent is None:
+        session.info.pop(PENDING_DELTA_KEY, None)
+
+
+def _write_facet_rollup_delta(session: Session, delta: Counter) -> None:
+    changes = sorted((key, count) for key, count in delta.items() if count)
+    if not changes:
+        return
+
+    insert_statement = insert(FacetRollup).values(
+        [
+            {"org_id": org_id, "facet": facet, "value": value, "count": count}
+            for (org_id, facet, value), count in changes
+        ]
+    )
+    session.execute(
+        insert_statement.on_conflict_do_update(
+            index_elements=[FacetRollup.org_id, FacetRollup.facet, FacetRollup.value],
+            set_={"count": FacetRollup.count + insert_statement.excluded.count},
+        )
+    )
+
+    # The values no host has any more are removed
+    decremented = {(org_id, facet) for (org_id, facet, _), count in changes if count < 0}
+    if decremented:
+        session.execute(
+            delete(FacetRollup).where(
+                tuple_(FacetRollup.org_id, FacetRollup.facet).in_(sorted(decremented)), FacetRollup.count <= 0
+            )
+        )
+
+
+def get_facet_rollup(org_id: str, facet: str, excluded_hosts_query: Query | None = None) -> list[tuple[Any, int]]:
+    """
+    The (value, count) pairs of the org's facet, read from its rollup rows. The hosts selected
+    by excluded_hosts_query are taken out of the counts.
+    """
+    counts = {
+        row.value: row.count
+        for row in db.session.query(FacetRollup.value, FacetRollup.count).filter(
+            FacetRollup.org_id == org_id, FacetRollup.facet == facet
+        )
+    }
+    if excluded_hosts_query is not None:
+        for (_, excluded_facet, value), count in _hosts_facet_counts(excluded_hosts_query).items():
+            if excluded_facet == facet and value in counts:
+                counts[value] -= count
+
+    return [(json.loads(value), count) for value, count in counts.items() if count > 0]
+
+
+def reconcile_facet_rollup(session: Session, org_id: str) -> int:
+    """
+    Recounts the org's facets from its hosts and rewrites the rollup rows that drifted.
+    Returns the number of rewritten rows. The caller commits.
+    """
+    # The org's rows are locked first, so the changes of the concurrent transactions either are
+    # already in the recounted hosts, or are added to the rewritten rows after this commits.
+    stored = {
+        (org_id, row.facet, row.value): row.count
+        for row in session.query(FacetRollup.facet, FacetRollup.value, FacetRollup.count)
+        .filter(FacetRollup.org_id == org_id)
+        .with_for_update()
+    }
+    actual = _hosts_facet_counts(session.query(Host).filter(Host.org_id == org_id))
+
+    drifted = sorted(key for key in stored.keys() | actual.keys() if stored.get(key, 0) != actual.get(key, 0))
+    updated = [key for key in drifted if actual.get(key, 0) > 0]
+    if updated:
+        insert_statement = insert(FacetRollup).values(
+            [
+                {"org_id": org_id, "facet": facet, "value": value, "count": actual[(org_id, facet, value)]}
+                for org_id, facet, value in updated
+            ]
+        )
+        session.execute(
+            insert_statement.on_conflict_do_update(
+                index_elements=[FacetRollup.org_id, FacetRollup.facet, FacetRollup.value],
+                set_={"count": insert_statement.excluded.count},
+            )
+        )
+
+    removed = [key for key in drifted if actual.get(key, 0) <= 0]
+    if removed:
+        session.execute(
+            delete(FacetRollup).where(tuple_(FacetRollup.org_id, FacetRollup.facet, FacetRollup.value).in_(removed))
+        )
+
+    logger.debug(f"Rewrote {len(drifted)} drifted facet rollup rows for org_id {org_id}")
+    return len(drifted)
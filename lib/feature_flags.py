@@ -12,6 +12,9 @@ FLAG_INVENTORY_USE_CACHED_INSIGHTS_CLIENT_SYSTEM = "hbi.api.use-cached-insights-
 FLAG_INVENTORY_KESSEL_WORKSPACE_MIGRATION = "hbi.api.kessel-workspace-migration"
 FLAG_INVENTORY_API_READ_ONLY = "hbi.api.read-only"
 FLAG_INVENTORY_DEDUPLICATION_ELEVATE_SUBMAN_ID = "hbi.deduplication-elevate-subman_id"
+FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP = "hbi.deduplication-canonical-facts-lookup"
+FLAG_INVENTORY_STALENESS_COLUMNS = "hbi.staleness-columns"
+FLAG_INVENTORY_FACET_ROLLUP = "hbi.api.facet-rollup"
 FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS = (
     "hbi.create_last_check_in_update_per_reporter_staleness"
 )
@@ -21,6 +24,9 @@ FLAG_FALLBACK_VALUES = {
     FLAG_INVENTORY_KESSEL_WORKSPACE_MIGRATION: False,
     FLAG_INVENTORY_API_READ_ONLY: False,
     FLAG_INVENTORY_DEDUPLICATION_ELEVATE_SUBMAN_ID: True,
+    FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP: False,
+    FLAG_INVENTORY_STALENESS_COLUMNS: False,
+    FLAG_INVENTORY_FACET_ROLLUP: False,
     FLAG_INVENTORY_CREATE_LAST_CHECK_IN_UPDATE_PER_REPORTER_STALENESS: False,
 }
 
@@ -1,11 +1,15 @@
 import time
+from datetime import datetime
+from datetime import timezone
 from typing import Optional
 from uuid import UUID
 
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from sqlalchemy import select
 
-from api.cache import delete_cached_system_keys
+from api.cache import invalidate_cached_responses
+from api.cache import invalidate_cached_systems
+from api.host_count_query import invalidate_host_count_cache
 from api.host_query import staleness_timestamps
 from api.staleness_query import get_staleness_obj
 from app.auth import get_current_identity
@@ -26,6 +30,7 @@ from app.models import Host
 from app.models import HostGroupAssoc
 from app.models import db
 from app.models import deleted_by_this_query
+from app.models import staleness_columns_values
 from app.queue.event_producer import EventProducer
 from app.queue.events import EventType
 from app.queue.events import build_event
@@ -55,8 +60,18 @@ def _update_hosts_for_group_changes(host_id_list: list[str], group_id_list: list
         for group_id in group_id_list
     ]
 
-    # Update groups data on each host record
-    Host.query.filter(Host.id.in_(host_id_list)).update({"groups": serialized_groups}, synchronize_session="fetch")
+    # Update groups data on each host record, along with the staleness columns derived from modified_on
+    modified_on = datetime.now(timezone.utc)
+    Host.query.filter(Host.id.in_(host_id_list)).update(
+        {
+            "groups": serialized_groups,
+            "modified_on": modified_on,
+            **staleness_columns_values(get_staleness_obj(identity.org_id), modified_on),
+        },
+        synchronize_session="fetch",
+    )
+    invalidate_host_count_cache(identity.org_id)
+    invalidate_cached_responses(identity.org_id)
     db.session.commit()
     host_list = get_host_list_by_id_list_from_db(host_id_list, identity)
     return serialized_groups, host_list
@@ -78,7 +93,9 @@ def _produce_host_update_events(event_producer, serialized_groups, host_list, id
             str(host.system_profile_facts.get("bootc_status", {}).get("booted") is not None),
         )
         event = build_event(EventType.updated, serialized_host, platform_metadata=metadata)
-        event_producer.write_event(event, serialized_host["id"], headers, wait=True)
+        event_producer.write_event(event, serialized_host["id"], headers)
+
+    event_producer.flush()
 
 
 def _invalidate_system_cache(host_list: list[Host], identity: Identity):
@@ -86,7 +103,7 @@ def _invalidate_system_cache(host_list: list[Host], identity: Identity):
         insights_id = host.canonical_facts.get("insights_id")
         owner_id = host.system_profile_facts.get("owner_id")
         if insights_id and owner_id:
-            delete_cached_system_keys(insights_id=insights_id, org_id=identity.org_id, owner_id=owner_id)
+            invalidate_cached_systems(insights_id=insights_id, org_id=identity.org_id)
 
 
 def validate_add_host_list_to_group_for_group_create(host_id_list: list[str], group_name: str, org_id: str):
@@ -1,40 +1,139 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
 from functools import partial
+from uuid import UUID
 
 from confluent_kafka import KafkaException
-
+from sqlalchemy import any_
+from sqlalchemy import bindparam
+from sqlalchemy import cast
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from api.cache import invalidate_cached_responses
+from api.host_count_query import invalidate_host_count_cache
 from app.auth.identity import to_auth_header
+from app.common import inventory_config
 from app.instrumentation import log_host_delete_succeeded
 from app.logging import get_logger
 from app.models import Host
 from app.models import HostGroupAssoc
-from app.models import deleted_by_this_query
 from app.queue.event_producer import EventProducer
 from app.queue.events import EventType
 from app.queue.host_mq import OperationResult
+from app.queue.host_mq import flush_and_report_undelivered
 from app.queue.host_mq import write_delete_event_message
 from app.queue.notifications import NotificationType
 from app.queue.notifications import send_notification
+from lib.db import jsonb_subset
 from lib.db import session_guard
+from lib.facet_rollup import facet_counts
+from lib.facet_rollup import update_facet_rollup
 from lib.host_kafka import kafka_available
 from lib.metrics import delete_host_count
 from lib.metrics import delete_host_processing_time
-from utils.system_profile_log import extract_host_model_sp_to_log
+from utils.system_profile_log import extract_sp_to_log
 
 __all__ = ("delete_hosts",)
 logger = get_logger(__name__)
 
 
-def _delete_host_db_records(select_query, chunk_size, identity, interrupt, control_rule) -> list[OperationResult]:
-    results_list = []
+# The system profile fields the delete events, notifications and facet counts are built from
+DELETED_HOST_SYSTEM_PROFILE_FIELDS = (
+    "bootc_status",
+    "host_type",
+    "operating_system",
+    "owner_id",
+    "sap_sids",
+    "sap_system",
+)
+
+
+@dataclass
+class DeletedHost:
+    """The fields of a deleted host returned by the DELETE statement, see _delete_host_db_records."""
+
+    id: UUID
+    account: str | None
+    org_id: str
+    display_name: str | None
+    canonical_facts: dict
+    tags: dict | None
+    groups: list | None
+    reporter: str | None
+    system_profile_facts: dict
+
+
+def _deleted_host_columns():
+    # Only the system profile fields needed after the deletion are returned
+    sp_fields = sorted(
+        set(DELETED_HOST_SYSTEM_PROFILE_FIELDS) | {field for field in inventory_config().sp_fields_to_log if field}
+    )
+    system_profile_facts = func.jsonb_strip_nulls(jsonb_subset(Host.system_profile_facts, sp_fields), type_=JSONB)
+    return (
+        Host.id,
+        Host.account,
+        Host.org_id,
+        Host.display_name,
+        Host.canonical_facts,
+        Host.tags,
+        Host.groups,
+        Host.reporter,
+        system_profile_facts.label("system_profile_facts"),
+    )
 
-    for host in select_query.limit(chunk_size):
-        with delete_host_processing_time.time():
-            result = _delete_host(select_query.session, host, identity, control_rule)
-        if deleted_by_this_query(result.host_row):
-            results_list.append(result)
 
-        if interrupt():
-            raise InterruptedError()
+def _next_host_id_chunk(select_query, chunk_size, last_id) -> list[UUID]:
+    # The ids are selected by keyset, so the chunks never scan the hosts already deleted or skipped again
+    id_query = select_query.with_entities(Host.id).order_by(None).order_by(Host.id)
+    if last_id is not None:
+        id_query = id_query.filter(Host.id > last_id)
+    return [host_id for (host_id,) in id_query.limit(chunk_size)]
+
+
+def _delete_host_db_records(session, host_ids, identity, control_rule) -> list[OperationResult]:
+    host_ids_param = cast(bindparam("host_ids", host_ids), ARRAY(PG_UUID(as_uuid=True)))
+    session.execute(delete(HostGroupAssoc).where(HostGroupAssoc.host_id == any_(host_ids_param)))
+    # Only the hosts this statement deleted are returned. A host deleted concurrently by another process
+    # is not, so its delete event is emitted and its facet counts are taken out only by that process.
+    deleted_hosts = [
+        DeletedHost(**row._mapping)
+        for row in session.execute(
+            delete(Host).where(Host.id == any_(host_ids_param)).returning(*_deleted_host_columns()),
+            execution_options={"synchronize_session": False},
+        )
+    ]
+
+    facet_rollup_delta: Counter = Counter()
+    results_list = []
+    for host in deleted_hosts:
+        facet_rollup_delta.update(facet_counts(host.org_id, host.tags, host.system_profile_facts, sign=-1))
+        results_list.append(
+            OperationResult(
+                host,
+                {"b64_identity": to_auth_header(identity)} if identity else None,
+                None,
+                None,
+                EventType.delete,
+                partial(
+                    log_host_delete_succeeded,
+                    logger,
+                    host.id,
+                    control_rule,
+                    extract_sp_to_log(host.system_profile_facts),
+                ),
+            )
+        )
+
+    update_facet_rollup(facet_rollup_delta, session)
+    for org_id in {host.org_id for host in deleted_hosts}:
+        invalidate_host_count_cache(org_id, session)
+        invalidate_cached_responses(org_id, session)
 
     return results_list
 
@@ -45,11 +144,17 @@ def _send_delete_messages_for_batch(
     notification_event_producer: EventProducer,
     initiated_by_frontend: bool,
 ):
+    produced_messages = []
     for result in processed_rows:
         if result is not None:
             delete_host_count.inc()
-            write_delete_event_message(event_producer, result, initiated_by_frontend)
-            send_notification(notification_event_producer, NotificationType.system_deleted, vars(result.host_row))
+            message_details = write_delete_event_message(event_producer, result, initiated_by_frontend, wait=False)
+            produced_messages.append((result, message_details))
+            send_notification(
+                notification_event_producer, NotificationType.system_deleted, vars(result.host_row), wait=False
+            )
+
+    flush_and_report_undelivered(event_producer, notification_event_producer, produced_messages)
 
 
 def delete_hosts(
@@ -62,33 +167,23 @@ def delete_hosts(
     control_rule=None,
     initiated_by_frontend=False,
 ):
-    while select_query.count():
-        if kafka_available():
-            with session_guard(select_query.session):
-                batch_events = _delete_host_db_records(select_query, chunk_size, identity, interrupt, control_rule)
-                _send_delete_messages_for_batch(
-                    batch_events, event_producer, notification_event_producer, initiated_by_frontend
-                )
-
-                # yield the items in batch_events
-                yield from batch_events
-
-        else:
+    session = select_query.session
+    last_id = None
+    while host_ids := _next_host_id_chunk(select_query, chunk_size, last_id):
+        if not kafka_available():
             logger.error("Host batch not deleted because Kafka server not available.")
             raise KafkaException("Kafka server not available. Stopping host deletions.")
+        if interrupt():
+            session.rollback()
+            raise InterruptedError()
 
+        last_id = host_ids[-1]
+        with session_guard(session):
+            with delete_host_processing_time.time():
+                batch_events = _delete_host_db_records(session, host_ids, identity, control_rule)
+            _send_delete_messages_for_batch(
+                batch_events, event_producer, notification_event_producer, initiated_by_frontend
+            )
 
-def _delete_host(session, host, identity, control_rule) -> OperationResult:
-    sp_fields_to_log = extract_host_model_sp_to_log(host)
-    assoc_delete_query = session.query(HostGroupAssoc).filter(HostGroupAssoc.host_id == host.id)
-    host_delete_query = session.query(Host).filter(Host.id == host.id)
-    assoc_delete_query.delete(synchronize_session="fetch")
-    host_delete_query.delete(synchronize_session="fetch")
-    return OperationResult(
-        host,
-        {"b64_identity": to_auth_header(identity)} if identity else None,
-        None,
-        None,
-        EventType.delete,
-        partial(log_host_delete_succeeded, logger, host.id, control_rule, sp_fields_to_log),
-    )
+            # yield the items in batch_events
+            yield from batch_events
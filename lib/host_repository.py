@@ -1,34 +1,51 @@
 from __future__ import annotations
 
+import json
 from enum import Enum
 from uuid import UUID
 
 from flask import current_app
 from sqlalchemy import and_
+from sqlalchemy import literal
 from sqlalchemy import not_
 from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy import union_all
+from sqlalchemy.orm.base import instance_state
 
+from api.cache import invalidate_cached_responses
 from api.filtering.db_filters import find_stale_host_in_window
+from api.filtering.db_filters import stale_in_window_columns_filter
 from api.filtering.db_filters import stale_timestamp_filter
+from api.filtering.db_filters import staleness_columns_enabled
+from api.filtering.db_filters import staleness_columns_filter
 from api.filtering.db_filters import staleness_to_conditions
 from api.filtering.db_filters import update_query_for_owner_id
+from api.host_count_query import invalidate_host_count_cache
 from api.staleness_query import get_staleness_obj
 from app.auth.identity import Identity
+from app.auth.identity import create_mock_identity_with_org_id
 from app.config import ALL_STALENESS_STATES
 from app.config import HOST_TYPES
 from app.exceptions import InventoryException
 from app.logging import get_logger
 from app.models import Group
 from app.models import Host
+from app.models import HostCanonicalFact
 from app.models import HostGroupAssoc
 from app.serialization import serialize_staleness_to_dict
 from app.staleness_serialization import get_sys_default_staleness
 from lib import metrics
+from lib.facet_rollup import host_facet_counts
+from lib.facet_rollup import update_facet_rollup
+from lib.feature_flags import FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP
 from lib.feature_flags import FLAG_INVENTORY_DEDUPLICATION_ELEVATE_SUBMAN_ID
 from lib.feature_flags import get_flag_value
 
 __all__ = (
     "add_host",
+    "BatchHostFinder",
     "single_canonical_fact_host_query",
     "multiple_canonical_facts_host_query",
     "create_new_host",
@@ -59,7 +76,11 @@ logger = get_logger(__name__)
 
 
 def add_host(
-    input_host: Host, identity: Identity, update_system_profile: bool = True, operation_args: dict | None = None
+    input_host: Host,
+    identity: Identity,
+    update_system_profile: bool = True,
+    operation_args: dict | None = None,
+    batch_host_finder: BatchHostFinder | None = None,
 ) -> tuple[Host, AddHostResult]:
     """
     Add or update a host
@@ -67,10 +88,16 @@ def add_host(
     Required parameters:
      - at least one of the canonical facts fields is required
      - org_id
+
+    When a batch_host_finder is provided, the existing host is looked up among the
+    hosts it has already loaded for the current batch instead of querying the DB.
     """
     if operation_args is None:
         operation_args = {}
-    existing_host = find_existing_host(identity, input_host.canonical_facts)
+    if batch_host_finder:
+        existing_host = batch_host_finder.find_existing_host(identity, input_host.canonical_facts)
+    else:
+        existing_host = find_existing_host(identity, input_host.canonical_facts)
     if existing_host:
         defer_to_reporter = operation_args.get("defer_to_reporter", None)
         if defer_to_reporter is not None:
@@ -81,7 +108,10 @@ def add_host(
 
         return update_existing_host(existing_host, input_host, update_system_profile)
     else:
-        return create_new_host(input_host)
+        created_host, add_result = create_new_host(input_host)
+        if batch_host_finder:
+            batch_host_finder.add_created_host(created_host)
+        return created_host, add_result
 
 
 @metrics.host_dedup_processing_time.time()
@@ -103,21 +133,24 @@ def find_existing_host_by_id(identity: Identity, host_id: str) -> Host | None:
     return find_non_culled_hosts(query, identity).order_by(Host.modified_on.desc()).first()
 
 
-@metrics.find_host_using_elevated_ids.time()
-def _find_host_by_elevated_ids(identity: Identity, canonical_facts: dict) -> Host | None:
+def _get_elevated_fields(org_id: str) -> tuple[str, ...]:
+    if current_app.config["USE_SUBMAN_ID"]:
+        return ELEVATED_CANONICAL_FACT_FIELDS_USE_SUBMAN_ID
+
+    if get_flag_value(FLAG_INVENTORY_DEDUPLICATION_ELEVATE_SUBMAN_ID, context={"orgId": org_id}):
+        return ELEVATED_CANONICAL_FACT_FIELDS_V2
+
+    return ELEVATED_CANONICAL_FACT_FIELDS
+
+
+def _elevated_search_facts(canonical_facts: dict, elevated_fields: tuple[str, ...]) -> list[dict]:
+    """
+    Returns the canonical facts to search by, one dict per search, in order of priority.
+    """
     elevated_facts = {}
     elevated_keys = []
     immutable_facts = {}
 
-    elevated_fields = (
-        ELEVATED_CANONICAL_FACT_FIELDS_V2
-        if get_flag_value(FLAG_INVENTORY_DEDUPLICATION_ELEVATE_SUBMAN_ID, context={"orgId": identity.org_id})
-        else ELEVATED_CANONICAL_FACT_FIELDS
-    )
-    if current_app.config["USE_SUBMAN_ID"]:
-        elevated_fields = ELEVATED_CANONICAL_FACT_FIELDS_USE_SUBMAN_ID  # type: ignore
-    logger.info(f"Using {elevated_fields} as elevated fields for org {identity.org_id}")
-
     for key in elevated_fields:
         if key not in canonical_facts.keys():
             continue
@@ -132,17 +165,7 @@ def _find_host_by_elevated_ids(identity: Identity, canonical_facts: dict) -> Hos
             elevated_keys.append(key)
 
     # First search based on immutable elevated canonical facts.
-    if immutable_facts:
-        existing_host = (
-            multiple_canonical_facts_host_query(identity, immutable_facts, False)
-            .order_by(Host.modified_on.desc())
-            .first()
-        )
-        if existing_host:
-            return existing_host
-
-    if not elevated_facts:
-        return None
+    search_facts = [immutable_facts] if immutable_facts else []
 
     for target_key in elevated_keys:
         #
@@ -155,15 +178,34 @@ def _find_host_by_elevated_ids(identity: Identity, canonical_facts: dict) -> Hos
         if compound_fact := COMPOUND_CANONICAL_FACTS_MAP.get(target_key):  # noqa: SIM102
             if compound_fact_val := canonical_facts.get(compound_fact):
                 target_facts[compound_fact] = compound_fact_val
-        existing_host = (
-            multiple_canonical_facts_host_query(identity, target_facts, False)
-            .order_by(Host.modified_on.desc())
-            .first()
+        search_facts.append(target_facts)
+
+    return search_facts
+
+
+@metrics.find_host_using_elevated_ids.time()
+def _find_host_by_elevated_ids(identity: Identity, canonical_facts: dict) -> Host | None:
+    elevated_fields = _get_elevated_fields(identity.org_id)
+    logger.info(f"Using {elevated_fields} as elevated fields for org {identity.org_id}")
+
+    search_facts = _elevated_search_facts(canonical_facts, elevated_fields)
+    if not search_facts:
+        return None
+
+    # All the searches run in a single statement: each one is a probe tagged with its priority,
+    # and the staleness filter is applied once, to the hosts matched by any of them.
+    probes = []
+    for priority, target_facts in enumerate(search_facts):
+        _check_compound_canonical_facts(target_facts)
+        probes.append(
+            select(Host.id, literal(priority).label("priority")).where(
+                _canonical_facts_match_filter(identity.org_id, target_facts)
+            )
         )
-        if existing_host:
-            return existing_host
+    candidates = union_all(*probes).subquery()
 
-    return None
+    query = Host.query.join(candidates, Host.id == candidates.c.id)
+    return find_non_culled_hosts(query, identity).order_by(candidates.c.priority, Host.modified_on.desc()).first()
 
 
 def single_canonical_fact_host_query(identity, canonical_fact, value, restrict_to_owner_id=True):
@@ -184,14 +226,21 @@ def _check_compound_canonical_facts(canonical_facts):
             raise InventoryException(title="Invalid request", detail=f"Unpaired compound fact: {key} missing {value}")
 
 
-def multiple_canonical_facts_host_query(identity, canonical_facts, restrict_to_owner_id=True):
-    _check_compound_canonical_facts(canonical_facts)
-
-    query = Host.query.filter(
-        (Host.org_id == identity.org_id)
+def _canonical_facts_match_filter(org_id, canonical_facts):
+    filter_ = (
+        (Host.org_id == org_id)
         & (contains_no_incorrect_facts_filter(canonical_facts))
         & (matches_at_least_one_canonical_fact_filter(canonical_facts))
     )
+    if (lookup_filter := canonical_facts_lookup_filter(org_id, [canonical_facts])) is not None:
+        filter_ &= lookup_filter
+    return filter_
+
+
+def multiple_canonical_facts_host_query(identity, canonical_facts, restrict_to_owner_id=True):
+    _check_compound_canonical_facts(canonical_facts)
+
+    query = Host.query.filter(_canonical_facts_match_filter(identity.org_id, canonical_facts))
     if restrict_to_owner_id:
         query = update_query_for_owner_id(identity, query)
     return find_non_culled_hosts(query, identity)
@@ -220,8 +269,122 @@ def find_host_by_multiple_canonical_facts(identity: Identity, canonical_facts: d
     return host
 
 
+def _fact_key(key: str, value) -> tuple[str, str]:
+    return key, json.dumps(value, sort_keys=True)
+
+
+def _host_contains_fact(host_canonical_facts: dict, key: str, value) -> bool:
+    # In-memory equivalent of Host.canonical_facts.contains({key: value})
+    if key not in host_canonical_facts:
+        return False
+
+    host_value = host_canonical_facts[key]
+    if isinstance(value, list):
+        return isinstance(host_value, list) and all(item in host_value for item in value)
+
+    return host_value == value
+
+
+def _host_matches_canonical_facts(host: Host, canonical_facts: dict) -> bool:
+    # In-memory equivalent of contains_no_incorrect_facts_filter() & matches_at_least_one_canonical_fact_filter()
+    host_canonical_facts = host.canonical_facts or {}
+    if any(
+        key in host_canonical_facts and not _host_contains_fact(host_canonical_facts, key, value)
+        for key, value in canonical_facts.items()
+    ):
+        return False
+
+    return any(
+        _host_contains_fact(host_canonical_facts, key, value)
+        for key, value in canonical_facts.items()
+        if key not in COMPOUND_CANONICAL_FACTS
+    )
+
+
+class BatchHostFinder:
+    """
+    Looks up existing hosts for a whole batch of incoming hosts.
+
+    prefetch() loads, with a single query per org, every non-culled host that shares
+    at least one canonical fact with the hosts in the batch. find_existing_host() then
+    applies the same deduplication rules as the module-level find_existing_host(),
+    but against the prefetched hosts instead of the DB. Canonical facts that were not
+    prefetched are looked up in the DB, as usual.
+    """
+
+    def __init__(self):
+        self._candidates: dict[str, list[Host]] = {}
+        self._prefetched_facts: dict[str, set[tuple[str, str]]] = {}
+
+    @metrics.host_dedup_batch_prefetch_time.time()
+    def prefetch(self, org_id: str, canonical_facts_list: list[dict]) -> None:
+        prefetched_facts = self._prefetched_facts.setdefault(org_id, set())
+        candidates = self._candidates.setdefault(org_id, [])
+
+        new_facts = {}
+        for canonical_facts in canonical_facts_list:
+            for key, value in canonical_facts.items():
+                if key not in COMPOUND_CANONICAL_FACTS and _fact_key(key, value) not in prefetched_facts:
+                    new_facts[_fact_key(key, value)] = {key: value}
+
+        if not new_facts:
+            return
+
+        query = Host.query.filter(
+            (Host.org_id == org_id) & or_(*(Host.canonical_facts.contains(fact) for fact in new_facts.values()))
+        )
+        if (lookup_filter := canonical_facts_lookup_filter(org_id, list(new_facts.values()))) is not None:
+            query = query.filter(lookup_filter)
+        query = find_non_culled_hosts(query, create_mock_identity_with_org_id(org_id))
+        known_host_ids = {host.id for host in candidates}
+        candidates.extend(
+            host for host in query.order_by(Host.modified_on.desc()).all() if host.id not in known_host_ids
+        )
+        prefetched_facts.update(new_facts.keys())
+
+        logger.debug(f"Prefetched {len(candidates)} candidate hosts for org {org_id}")
+
+    def add_created_host(self, host: Host) -> None:
+        # Hosts created in this batch are not flushed yet, so they must be matched in memory.
+        if host.org_id in self._candidates:
+            self._candidates[host.org_id].insert(0, host)
+
+    def _is_prefetched(self, org_id: str, canonical_facts: dict) -> bool:
+        prefetched_facts = self._prefetched_facts.get(org_id)
+        return prefetched_facts is not None and all(
+            _fact_key(key, value) in prefetched_facts
+            for key, value in canonical_facts.items()
+            if key not in COMPOUND_CANONICAL_FACTS
+        )
+
+    def _first_matching_host(self, org_id: str, canonical_facts: dict) -> Host | None:
+        _check_compound_canonical_facts(canonical_facts)
+
+        return next(
+            (host for host in self._candidates[org_id] if _host_matches_canonical_facts(host, canonical_facts)), None
+        )
+
+    @metrics.host_dedup_processing_time.time()
+    def find_existing_host(self, identity: Identity, canonical_facts: dict) -> Host | None:
+        if not self._is_prefetched(identity.org_id, canonical_facts):
+            return find_existing_host(identity, canonical_facts)
+
+        logger.debug("BatchHostFinder.find_existing_host(%s, %s)", identity, canonical_facts)
+        for target_facts in _elevated_search_facts(canonical_facts, _get_elevated_fields(identity.org_id)):
+            if existing_host := self._first_matching_host(identity.org_id, target_facts):
+                return existing_host
+
+        if current_app.config["USE_SUBMAN_ID"] or not canonical_facts:
+            return None
+
+        return self._first_matching_host(identity.org_id, canonical_facts)
+
+
 def find_hosts_by_staleness(staleness_types, query, identity):
     logger.debug("find_hosts_by_staleness(%s)", staleness_types)
+    if staleness_columns_enabled():
+        return query.filter(staleness_columns_filter(staleness_types))
+
     staleness_obj = serialize_staleness_to_dict(get_staleness_obj(identity.org_id))
     staleness_conditions = [
         or_(False, *staleness_to_conditions(staleness_obj, staleness_types, host_type, stale_timestamp_filter))
@@ -233,6 +396,9 @@ def find_hosts_by_staleness(staleness_types, query, identity):
 
 def find_hosts_by_staleness_job(staleness_types, org_id):
     logger.debug("find_hosts_by_staleness(%s)", staleness_types)
+    if staleness_columns_enabled():
+        return staleness_columns_filter(staleness_types)
+
     staleness_obj = serialize_staleness_to_dict(get_staleness_obj(org_id))
     staleness_conditions = [
         or_(
@@ -247,6 +413,9 @@ def find_hosts_by_staleness_job(staleness_types, org_id):
 
 def find_stale_hosts(org_id, last_run_secs, job_start_time):
     logger.debug("finding stale hosts with custom staleness")
+    if staleness_columns_enabled():
+        return stale_in_window_columns_filter(last_run_secs, job_start_time)
+
     staleness_obj = serialize_staleness_to_dict(get_staleness_obj(org_id))
     staleness_conditions = [
         or_(
@@ -261,6 +430,9 @@ def find_stale_hosts(org_id, last_run_secs, job_start_time):
 
 def find_stale_host_sys_default_staleness(last_run_secs, job_start_time):
     logger.debug("finding stale hosts with system default staleness")
+    if staleness_columns_enabled():
+        return stale_in_window_columns_filter(last_run_secs, job_start_time)
+
     sys_default_staleness = serialize_staleness_to_dict(get_sys_default_staleness())
     staleness_conditions = [
         or_(
@@ -275,6 +447,9 @@ def find_stale_host_sys_default_staleness(last_run_secs, job_start_time):
 
 def find_hosts_sys_default_staleness(staleness_types):
     logger.debug("find hosts with system default staleness")
+    if staleness_columns_enabled():
+        return staleness_columns_filter(staleness_types)
+
     sys_default_staleness = serialize_staleness_to_dict(get_sys_default_staleness())
     staleness_conditions = [
         or_(
@@ -295,7 +470,11 @@ def find_non_culled_hosts(query, identity):
 def create_new_host(input_host: Host) -> tuple[Host, AddHostResult]:
     logger.debug("Creating a new host")
 
+    _sync_canonical_facts_lookup(input_host)
     input_host.save()
+    update_facet_rollup(host_facet_counts(input_host))
+    invalidate_host_count_cache(input_host.org_id)
+    invalidate_cached_responses(input_host.org_id)
 
     metrics.create_host_count.inc()
     logger.debug("Created host (uncommitted):%s", input_host)
@@ -310,7 +489,15 @@ def update_existing_host(
     logger.debug("Updating an existing host")
     logger.debug(f"existing host = {existing_host}")
 
+    facet_rollup_delta = host_facet_counts(existing_host, sign=-1)
     existing_host.update(input_host, update_system_profile)
+    facet_rollup_delta.update(host_facet_counts(existing_host))
+    update_facet_rollup(facet_rollup_delta)
+    invalidate_host_count_cache(existing_host.org_id)
+    invalidate_cached_responses(existing_host.org_id)
+    state = instance_state(existing_host)
+    if state.attrs.canonical_facts.history.has_changes() or state.attrs.org_id.history.has_changes():
+        _sync_canonical_facts_lookup(existing_host)
 
     metrics.update_host_count.inc()
     logger.debug("Updated host (uncommitted):%s", existing_host)
@@ -347,6 +534,52 @@ def matches_at_least_one_canonical_fact_filter(canonical_facts):
     return or_(*filter_)
 
 
+def _canonical_facts_lookup_values(canonical_facts: dict) -> list[tuple[str, str]]:
+    # The (fact_name, fact_value) pairs stored in the host_canonical_facts lookup table.
+    values = []
+    for key, value in canonical_facts.items():
+        if key in COMPOUND_CANONICAL_FACTS:
+            continue
+
+        for item in value if isinstance(value, list) else (value,):
+            if item is not None:
+                values.append((key, item if isinstance(item, str) else json.dumps(item)))
+
+    return values
+
+
+def _sync_canonical_facts_lookup(host: Host) -> None:
+    # Replaces the host's lookup rows. Rows with unchanged values are kept as they are.
+    host.canonical_fact_rows = [
+        HostCanonicalFact(host.org_id, fact_name, fact_value)
+        for fact_name, fact_value in dict.fromkeys(_canonical_facts_lookup_values(host.canonical_facts))
+    ]
+
+
+def canonical_facts_lookup_filter(org_id: str, canonical_facts_list: list[dict]):
+    """
+    Restricts a canonical facts query to the hosts that share at least one fact value with the given ones,
+    as found in the host_canonical_facts lookup table. The JSONB filters still apply to these candidates,
+    so the matching rules don't change. Returns None when the lookup table is not to be used.
+    """
+    if not get_flag_value(FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP, context={"orgId": org_id}):
+        return None
+
+    # An empty list is contained in any list, so it can't be looked up by its items.
+    if any(value == [] for canonical_facts in canonical_facts_list for value in canonical_facts.values()):
+        return None
+
+    lookup_values = dict.fromkeys(
+        value for canonical_facts in canonical_facts_list for value in _canonical_facts_lookup_values(canonical_facts)
+    )
+    return Host.id.in_(
+        select(HostCanonicalFact.host_id).where(
+            (HostCanonicalFact.org_id == org_id)
+            & tuple_(HostCanonicalFact.fact_name, HostCanonicalFact.fact_value).in_(list(lookup_values))
+        )
+    )
+
+
 def update_system_profile(input_host, identity):
     if not input_host.system_profile_facts:
         raise InventoryException(
@@ -362,7 +595,12 @@ def update_system_profile(input_host, identity):
         logger.debug("Updating system profile on an existing host")
         logger.debug(f"existing host = {existing_host}")
 
+        facet_rollup_delta = host_facet_counts(existing_host, sign=-1)
         existing_host.update_system_profile(input_host.system_profile_facts)
+        facet_rollup_delta.update(host_facet_counts(existing_host))
+        update_facet_rollup(facet_rollup_delta)
+        invalidate_host_count_cache(existing_host.org_id)
+        invalidate_cached_responses(existing_host.org_id)
 
         metrics.update_host_count.inc()
         logger.debug("Updated system profile for host (uncommitted):%s", existing_host)
@@ -52,7 +52,7 @@ def synchronize_hosts(
             # in case of a failed update event, event_producer logs the message.
             # Workaround to solve: https://issues.redhat.com/browse/RHINENG-4856
             try:
-                event_producer.write_event(event, str(host.id), headers, wait=True)
+                event_producer.write_event(event, str(host.id), headers)
                 synchronize_host_count.inc()
                 logger.info("Synchronized host: %s", str(host.id))
 
@@ -63,7 +63,7 @@ def synchronize_hosts(
 
         try:
             # pace the events production speed as flush completes sending all buffered records.
-            event_producer._kafka_producer.flush(300)
+            event_producer.flush(300)
         except ProduceError as e:
             raise ProduceError(f"ProduceError: Kafka failure to flush {chunk_size} records within 300 seconds") from e
 
@@ -1,9 +1,13 @@
 from prometheus_client import Counter
+from prometheus_client import Gauge
 from prometheus_client import Summary
 
 host_dedup_processing_time = Summary(
     "inventory_dedup_processing_seconds", "Time spent looking for existing host (dedup logic)"
 )
+host_dedup_batch_prefetch_time = Summary(
+    "inventory_dedup_batch_prefetch_seconds", "Time spent loading candidate hosts for a batch (batch dedup logic)"
+)
 find_host_using_elevated_ids = Summary(
     "inventory_find_host_using_elevated_ids_processing_seconds",
     "Time spent looking for existing host using the elevated ids",
@@ -21,6 +25,9 @@ delete_host_processing_time = Summary(
     "inventory_delete_host_commit_seconds", "Time spent deleting hosts from the database"
 )
 host_reaper_fail_count = Counter("inventory_reaper_fail_count", "The total amount of Host Reaper failures.")
+host_reaper_remaining_count = Gauge(
+    "inventory_reaper_remaining_hosts", "The number of culled hosts the Host Reaper has yet to delete"
+)
 
 # Inventory Groups
 create_group_count = Counter("inventory_create_group_count", "The total amount of groups created")
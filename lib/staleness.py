@@ -1,12 +1,31 @@
+from api.cache import invalidate_cached_responses
+from api.host_count_query import invalidate_host_count_cache
+from api.staleness_query import get_staleness_obj
+from api.staleness_query import invalidate_staleness_cache
 from app.auth import get_current_identity
 from app.logging import get_logger
+from app.models import Host
 from app.models import Staleness
 from app.models import db
+from app.models import staleness_columns_values
 from lib.db import session_guard
 
 logger = get_logger(__name__)
 
 
+def _recompute_hosts_staleness_columns(org_id):
+    # The hosts' staleness columns depend on the org's staleness settings, so they're recomputed in bulk.
+    # modified_on is set to itself, so that the hosts don't look modified.
+    staleness = get_staleness_obj(org_id)
+    updated_count = Host.query.filter(Host.org_id == org_id).update(
+        {"modified_on": Host.modified_on, **staleness_columns_values(staleness, Host.modified_on)},
+        synchronize_session=False,
+    )
+    logger.debug(f"Recomputed the staleness columns of {updated_count} hosts for org_id {org_id}")
+    invalidate_host_count_cache(org_id)
+    invalidate_cached_responses(org_id)
+
+
 def add_staleness(staleness_data) -> Staleness:
     logger.debug("Creating a new AccountStaleness: %s", staleness_data)
     conventional_time_to_stale = staleness_data.get("conventional_time_to_stale")
@@ -29,6 +48,8 @@ def add_staleness(staleness_data) -> Staleness:
         )
         db.session.add(new_staleness)
         db.session.flush()
+        invalidate_staleness_cache(org_id)
+        _recompute_hosts_staleness_columns(org_id)
 
     # gets the Staleness object after it has been committed
     created_staleness = Staleness.query.filter(Staleness.org_id == org_id).one_or_none()
@@ -43,6 +64,8 @@ def patch_staleness(staleness_data) -> Staleness:
     updated_data = {key: value for (key, value) in staleness_data.items() if value}
 
     Staleness.query.filter(Staleness.org_id == org_id).update(updated_data)
+    invalidate_staleness_cache(org_id)
+    _recompute_hosts_staleness_columns(org_id)
     db.session.commit()
 
     updated_staleness = Staleness.query.filter(Staleness.org_id == org_id).one_or_none()
@@ -56,4 +79,6 @@ def remove_staleness() -> None:
     logger.debug("Removing AccountStaleness for org_id: %s", org_id)
     staleness = Staleness.query.filter(Staleness.org_id == org_id).one()
     db.session.delete(staleness)
+    invalidate_staleness_cache(org_id)
+    _recompute_hosts_staleness_columns(org_id)
     db.session.commit()
@@ -0,0 +1,75 @@
+"""Add stale_at, stale_warning_at and culled_at columns to hosts
+
+Revision ID: 4e1e2e524281
+Revises: ccc96fc9bf64
+Create Date: 2026-10-17 14:02:48.915307
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from flask import current_app
+
+# revision identifiers, used by Alembic.
+revision = "4e1e2e524281"
+down_revision = "ccc96fc9bf64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("hosts", sa.Column("stale_at", sa.DateTime(timezone=True), nullable=True), schema="hbi")
+    op.add_column("hosts", sa.Column("stale_warning_at", sa.DateTime(timezone=True), nullable=True), schema="hbi")
+    op.add_column("hosts", sa.Column("culled_at", sa.DateTime(timezone=True), nullable=True), schema="hbi")
+
+    # Backfill the columns from modified_on, using the org's custom staleness or the system default.
+    config = current_app.config["INVENTORY_CONFIG"]
+    op.execute(
+        sa.text("""
+            UPDATE hbi.hosts h
+            SET stale_at = h.modified_on + MAKE_INTERVAL(secs => CASE WHEN sub.edge
+                    THEN sub.immutable_time_to_stale ELSE sub.conventional_time_to_stale END),
+                stale_warning_at = h.modified_on + MAKE_INTERVAL(secs => CASE WHEN sub.edge
+                    THEN sub.immutable_time_to_stale_warning ELSE sub.conventional_time_to_stale_warning END),
+                culled_at = h.modified_on + MAKE_INTERVAL(secs => CASE WHEN sub.edge
+                    THEN sub.immutable_time_to_delete ELSE sub.conventional_time_to_delete END)
+            FROM (
+                SELECT hosts.id,
+                    COALESCE(hosts.system_profile_facts ->> 'host_type' = 'edge', FALSE) AS edge,
+                    COALESCE(s.conventional_time_to_stale, :conventional_time_to_stale)
+                        AS conventional_time_to_stale,
+                    COALESCE(s.conventional_time_to_stale_warning, :conventional_time_to_stale_warning)
+                        AS conventional_time_to_stale_warning,
+                    COALESCE(s.conventional_time_to_delete, :conventional_time_to_delete)
+                        AS conventional_time_to_delete,
+                    COALESCE(s.immutable_time_to_stale, :immutable_time_to_stale) AS immutable_time_to_stale,
+                    COALESCE(s.immutable_time_to_stale_warning, :immutable_time_to_stale_warning)
+                        AS immutable_time_to_stale_warning,
+                    COALESCE(s.immutable_time_to_delete, :immutable_time_to_delete) AS immutable_time_to_delete
+                FROM hbi.hosts hosts
+                    LEFT JOIN hbi.staleness s ON s.org_id = hosts.org_id
+            ) AS sub
+            WHERE h.id = sub.id;
+        """).bindparams(
+            conventional_time_to_stale=int(config.conventional_time_to_stale_seconds),
+            conventional_time_to_stale_warning=int(config.conventional_time_to_stale_warning_seconds),
+            conventional_time_to_delete=int(config.conventional_time_to_delete_seconds),
+            immutable_time_to_stale=int(config.immutable_time_to_stale_seconds),
+            immutable_time_to_stale_warning=int(config.immutable_time_to_stale_warning_seconds),
+            immutable_time_to_delete=int(config.immutable_time_to_delete_seconds),
+        )
+    )
+
+    op.create_index("idxhosts_stale_at", "hosts", ["stale_at"], if_not_exists=True, schema="hbi")
+    op.create_index("idxhosts_stale_warning_at", "hosts", ["stale_warning_at"], if_not_exists=True, schema="hbi")
+    op.create_index("idxhosts_culled_at", "hosts", ["culled_at"], if_not_exists=True, schema="hbi")
+
+
+def downgrade():
+    op.drop_index("idxhosts_stale_at", table_name="hosts", if_exists=True, schema="hbi")
+    op.drop_index("idxhosts_stale_warning_at", table_name="hosts", if_exists=True, schema="hbi")
+    op.drop_index("idxhosts_culled_at", table_name="hosts", if_exists=True, schema="hbi")
+
+    op.drop_column("hosts", "stale_at", schema="hbi")
+    op.drop_column("hosts", "stale_warning_at", schema="hbi")
+    op.drop_column("hosts", "culled_at", schema="hbi")
@@ -0,0 +1,33 @@
+"""Add facet_rollup table
+
+Revision ID: 673dbbc186c5
+Revises: 4e1e2e524281
+Create Date: 2026-10-17 16:21:07.503912
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "673dbbc186c5"
+down_revision = "4e1e2e524281"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table is filled by the reconcile_facet_rollup job, which computes the values the way the
+    # ingest path does. Until then the rollups are incomplete, so they must not be read yet.
+    op.create_table(
+        "facet_rollup",
+        sa.Column("org_id", sa.String(length=36), primary_key=True),
+        sa.Column("facet", sa.String(length=32), primary_key=True),
+        sa.Column("value", sa.Text(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        schema="hbi",
+    )
+
+
+def downgrade():
+    op.drop_table("facet_rollup", schema="hbi")
@@ -0,0 +1,61 @@
+"""Add host_canonical_facts lookup table
+
+Revision ID: ccc96fc9bf64
+Revises: 84ef628a2a99
+Create Date: 2026-10-17 10:12:31.482210
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "ccc96fc9bf64"
+down_revision = "84ef628a2a99"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "host_canonical_facts",
+        sa.Column(
+            "host_id",
+            sa.UUID(as_uuid=True),
+            sa.ForeignKey("hbi.hosts.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("fact_name", sa.String(length=64), primary_key=True),
+        sa.Column("fact_value", sa.Text(), primary_key=True),
+        sa.Column("org_id", sa.String(length=36), nullable=False),
+        schema="hbi",
+    )
+
+    op.create_index(
+        "idxhostcanonicalfacts_lookup",
+        "host_canonical_facts",
+        ["org_id", "fact_name", "fact_value"],
+        if_not_exists=True,
+        schema="hbi",
+    )
+
+    # Backfill one row per canonical fact value, and one per item of the list facts.
+    # provider_type is only ever matched together with provider_id, so it's not stored.
+    op.execute("""
+        INSERT INTO hbi.host_canonical_facts (host_id, fact_name, fact_value, org_id)
+        SELECT DISTINCT h.id, cf.key, v.value, h.org_id
+        FROM hbi.hosts h
+            CROSS JOIN LATERAL JSONB_EACH(h.canonical_facts) AS cf(key, value)
+            CROSS JOIN LATERAL (
+                SELECT JSONB_ARRAY_ELEMENTS_TEXT(cf.value) WHERE JSONB_TYPEOF(cf.value) = 'array'
+                UNION ALL
+                SELECT cf.value #>> '{}' WHERE JSONB_TYPEOF(cf.value) <> 'array'
+            ) AS v(value)
+        WHERE h.org_id IS NOT NULL AND cf.key <> 'provider_type' AND v.value IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    """)
+
+
+def downgrade():
+    op.drop_index("idxhostcanonicalfacts_lookup", table_name="host_canonical_facts", if_exists=True, schema="hbi")
+    op.drop_table("host_canonical_facts", schema="hbi")
@@ -81,7 +81,7 @@ def run(config, logger, session, consumer, event_producer, shutdown_handler):
                     logger.exception("Unable to process message", extra={"incoming_message": message.value()})
         try:
             # pace the events production speed as flush completes sending all buffered records.
-            event_producer._kafka_producer.flush(300)
+            event_producer.flush(300)
         except ProduceError as e:
             raise ProduceError("ProduceError: Failed to flush produced Kafka messages within 300 seconds") from e
 
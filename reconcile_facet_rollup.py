@@ -0,0 +1,46 @@
+#!/usr/bin/python
+import sys
+from functools import partial
+from logging import Logger
+
+from connexion import FlaskApp
+from sqlalchemy import select
+from sqlalchemy import union
+from sqlalchemy.orm import Session
+
+from app.environment import RuntimeEnvironment
+from app.logging import get_logger
+from app.models import FacetRollup
+from app.models import Host
+from jobs.common import excepthook
+from jobs.common import job_setup
+from lib.facet_rollup import reconcile_facet_rollup
+
+PROMETHEUS_JOB = "inventory-reconcile-facet-rollup"
+LOGGER_NAME = "reconcile-facet-rollup"
+RUNTIME_ENVIRONMENT = RuntimeEnvironment.JOB
+
+
+def run(logger: Logger, session: Session, application: FlaskApp):
+    with application.app.app_context():
+        logger.info("Starting reconcile facet rollup job")
+        # The orgs with hosts, and the orgs with rollup rows left over from deleted hosts
+        org_ids = session.scalars(
+            union(select(Host.org_id).where(Host.org_id.isnot(None)), select(FacetRollup.org_id))
+        ).all()
+
+        drifted_count = 0
+        for org_id in org_ids:
+            drifted_count += reconcile_facet_rollup(session, org_id)
+            session.commit()
+
+        logger.info(f"Rewrote {drifted_count} drifted facet rollup rows in {len(org_ids)} orgs")
+
+
+if __name__ == "__main__":
+    logger = get_logger(LOGGER_NAME)
+    job_type = "Reconcile facet rollup"
+    sys.excepthook = partial(excepthook, logger, job_type)
+
+    _, session, _, _, _, application = job_setup(tuple(), PROMETHEUS_JOB)
+    run(logger, session, application)
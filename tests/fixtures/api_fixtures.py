@@ -1,5 +1,7 @@
 import pytest
 
+from lib.feature_flags import FLAG_FALLBACK_VALUES
+from lib.feature_flags import FLAG_INVENTORY_FACET_ROLLUP
 from tests.helpers.api_utils import GROUP_URL
 from tests.helpers.api_utils import HOST_URL
 from tests.helpers.api_utils import STALENESS_URL
@@ -182,6 +184,14 @@ def _enable_unleash(inventory_config):
     inventory_config.unleash_token = "mockUnleashTokenValue"
 
 
+@pytest.fixture(scope="function")
+def facet_rollup_enabled(mocker):
+    mocker.patch(
+        "api.host_query_db.get_flag_value",
+        side_effect=lambda flag, **_: flag == FLAG_INVENTORY_FACET_ROLLUP or FLAG_FALLBACK_VALUES[flag],
+    )
+
+
 @pytest.fixture(scope="function")
 def api_create_staleness(flask_client):
     def _api_create_staleness(staleness_data, identity=USER_IDENTITY, query_parameters=None, extra_headers=None):
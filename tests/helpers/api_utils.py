@@ -1,6 +1,7 @@
 import json
 import math
 from base64 import b64encode
+from collections.abc import Iterable
 from datetime import timedelta
 from http import HTTPStatus
 from itertools import product
@@ -606,9 +607,9 @@ def assert_resource_types_pagination(
     assert links["last"] == f"{expected_path_base}?per_page={expected_per_page}&page={expected_number_of_pages}"
 
 
-def mocked_export_post(_self: Any, url: str, *, data: bytes, **_: Any) -> Response:
-    # This will raise UnicodeDecodeError if not correctly encoded or AttributeError if data is str
-    data.decode("utf-8")
+def mocked_export_post(_self: Any, url: str, *, data: Iterable[bytes], **_: Any) -> Response:
+    # This will raise UnicodeDecodeError if not correctly encoded or TypeError if the chunks are str
+    b"".join(data).decode("utf-8")
     response = Response()
     response.url = url
     response.status_code = HTTPStatus.ACCEPTED
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import csv
 import json
 
@@ -64,40 +66,42 @@ EXPORT_DATA = [
 ]
 
 
-def create_export_message_mock(format: str = "json") -> str:
-    return json.dumps(
-        {
-            "id": "b4228e37-8ae8-4c67-81d5-d03f39bbe309",
-            "$schema": "someSchema",
-            "source": "urn:redhat:source:console:app:export-service",
-            "subject": "urn:redhat:subject:export-service:request:9becbc61-49a4-49be-beb1-1f0a7cbc6e36",
-            "specversion": "1.0",
-            "type": "com.redhat.console.export-service.request",
-            "time": "2024-05-28T14:59:36Z",
-            "redhatorgid": "test",
-            "dataschema": "https://console.redhat.com/api/schemas/apps/export-service/v1/resource-request.json",
-            "data": {
-                "resource_request": {
-                    "application": "urn:redhat:application:inventory",
-                    "export_request_uuid": "9becbc61-49a4-49be-beb1-1f0a7cbc6e36",
-                    "filters": {
-                        "endDate": "2024-03-01T00:00:00Z",
-                        "productId": "RHEL",
-                        "startDate": "2024-01-01T00:00:00Z",
-                    },
-                    "format": format,
-                    "resource": "urn:redhat:application:inventory:export:systems",
-                    "uuid": "2844f3a1-e047-45b1-b0ce-fb9812ad6a6f",
-                    "x-rh-identity": (
-                        "eyJpZGVudGl0eSI6IHsib3JnX2lkIjogInRlc3QiL"
-                        "CAidHlwZSI6ICJVc2VyIiwgImF1dGhfdHlwZSI6IC"
-                        "JiYXNpYy1hdXRoIiwgInVzZXIiOiB7ImVtYWlsIjo"
-                        "gInRlc3RAcmVkaGF0LmNvbSIsICJmaXJzdF9uYW1lIjogInRlc3QifX19"
-                    ),
-                }
-            },
-        }
-    )
+def create_export_message_mock(format: str = "json", compression: str | None = None) -> str:
+    message: dict = {
+        "id": "b4228e37-8ae8-4c67-81d5-d03f39bbe309",
+        "$schema": "someSchema",
+        "source": "urn:redhat:source:console:app:export-service",
+        "subject": "urn:redhat:subject:export-service:request:9becbc61-49a4-49be-beb1-1f0a7cbc6e36",
+        "specversion": "1.0",
+        "type": "com.redhat.console.export-service.request",
+        "time": "2024-05-28T14:59:36Z",
+        "redhatorgid": "test",
+        "dataschema": "https://console.redhat.com/api/schemas/apps/export-service/v1/resource-request.json",
+        "data": {
+            "resource_request": {
+                "application": "urn:redhat:application:inventory",
+                "export_request_uuid": "9becbc61-49a4-49be-beb1-1f0a7cbc6e36",
+                "filters": {
+                    "endDate": "2024-03-01T00:00:00Z",
+                    "productId": "RHEL",
+                    "startDate": "2024-01-01T00:00:00Z",
+                },
+                "format": format,
+                "resource": "urn:redhat:application:inventory:export:systems",
+                "uuid": "2844f3a1-e047-45b1-b0ce-fb9812ad6a6f",
+                "x-rh-identity": (
+                    "eyJpZGVudGl0eSI6IHsib3JnX2lkIjogInRlc3QiL"
+                    "CAidHlwZSI6ICJVc2VyIiwgImF1dGhfdHlwZSI6IC"
+                    "JiYXNpYy1hdXRoIiwgInVzZXIiOiB7ImVtYWlsIjo"
+                    "gInRlc3RAcmVkaGF0LmNvbSIsICJmaXJzdF9uYW1lIjogInRlc3QifX19"
+                ),
+            }
+        },
+    }
+    if compression:
+        message["data"]["resource_request"]["compression"] = compression
+
+    return json.dumps(message)
 
 
 def create_export_message_missing_field_mock(field_to_remove):
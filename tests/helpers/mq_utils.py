@@ -36,6 +36,10 @@ class MockEventProducer:
         self.key = key
         self.headers = headers
         self.wait = wait
+        return SimpleNamespace(delivered=True, error=None)
+
+    def flush(self, timeout=None):  # noqa: ARG002
+        return 0
 
 
 class FakeMessage:
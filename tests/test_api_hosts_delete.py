@@ -5,11 +5,11 @@ from unittest.mock import patch
 import pytest
 from confluent_kafka import KafkaException
 
+import lib.host_delete
 from app.models import Host
 from app.queue.event_producer import MessageDetails
 from app.queue.event_producer import logger as event_producer_logger
 from lib.host_delete import delete_hosts
-from lib.host_repository import get_host_list_by_id_list_from_db
 from tests.helpers.api_utils import HOST_WRITE_ALLOWED_RBAC_RESPONSE_FILES
 from tests.helpers.api_utils import HOST_WRITE_PROHIBITED_RBAC_RESPONSE_FILES
 from tests.helpers.api_utils import assert_response_status
@@ -337,19 +337,22 @@ def test_delete_hosts_chunk_size(
     mocker,
     inventory_config,
 ):
-    inventory_config.host_delete_chunk_size = 5
-
-    query_wrapper = DeleteQueryWrapper(mocker)
-    mocker.patch("api.host.get_host_list_by_id_list_from_db", query_wrapper.mock_get_host_list_by_id_list)
+    inventory_config.host_delete_chunk_size = 2
+    delete_records_mock = mocker.patch(
+        "lib.host_delete._delete_host_db_records", wraps=lib.host_delete._delete_host_db_records
+    )
 
-    hosts = db_create_multiple_hosts(how_many=2)
-    host_id_list = [str(host.id) for host in hosts]
+    hosts = db_create_multiple_hosts(how_many=5)
+    host_id_list = sorted(str(host.id) for host in hosts)
 
     response_status, response_data = api_delete_host(",".join(host_id_list))
 
     assert_response_status(response_status, expected_status=200)
+    assert response_data["hosts_deleted"] == 5
 
-    query_wrapper.query.limit.assert_called_with(5)
+    # The chunks are selected by id, each one after the last
+    chunks = [[str(host_id) for host_id in call.args[1]] for call in delete_records_mock.call_args_list]
+    assert chunks == [host_id_list[0:2], host_id_list[2:4], host_id_list[4:5]]
 
 
 @pytest.mark.parametrize("send_side_effects", ((mock.Mock(), KafkaException()), (mock.Mock(), KafkaException("oops"))))
@@ -471,8 +474,8 @@ def test_delete_host_that_belongs_to_group_fail(
     assert len(hosts_before) == 3
 
     # Patch it so the DB deletion fails
-    deleted_by_this_query_mock = mocker.patch("lib.host_delete.deleted_by_this_query")
-    deleted_by_this_query_mock.side_effect = InterruptedError()
+    facet_counts_mock = mocker.patch("lib.host_delete.facet_counts")
+    facet_counts_mock.side_effect = InterruptedError()
 
     # Delete the first host
     api_delete_host(host_id_list[0])
@@ -702,14 +705,3 @@ def test_attempt_delete_host_read_only(api_delete_host):
     with patch("lib.middleware.get_flag_value", return_value=True):
         response_status, _ = api_delete_host(generate_uuid())
         assert_response_status(response_status, expected_status=503)
-
-
-class DeleteQueryWrapper:
-    def __init__(self, mocker):
-        self.query = None
-        self.mocker = mocker
-
-    def mock_get_host_list_by_id_list(self, host_id_list, identity, rbac_filter=None):
-        self.query = get_host_list_by_id_list_from_db(host_id_list, identity, rbac_filter)
-        self.query.limit = self.mocker.Mock(wraps=self.query.limit)
-        return self.query
@@ -1,3 +1,4 @@
+import base64
 import random
 from datetime import timedelta
 from itertools import chain
@@ -5,6 +6,7 @@ from unittest.mock import patch
 
 import pytest
 
+from api import host_count_query
 from lib.host_repository import find_hosts_by_staleness
 from tests.helpers.api_utils import HOST_READ_ALLOWED_RBAC_RESPONSE_FILES
 from tests.helpers.api_utils import HOST_READ_PROHIBITED_RBAC_RESPONSE_FILES
@@ -1033,6 +1035,33 @@ def test_query_by_id_sparse_fields(db_create_multiple_hosts, api_get):
         assert "owner_id" in result["system_profile"]
 
 
+def test_query_host_sparse_fields(db_create_multiple_hosts, api_get, subtests):
+    sp_data = {"system_profile_facts": {"arch": "x86_64", "host_type": "edge"}}
+    created_hosts = db_create_multiple_hosts(how_many=2, extra_data=sp_data)
+
+    for url_builder_kwargs in ({}, {"host_list_or_id": created_hosts}):
+        with subtests.test(url_builder_kwargs=url_builder_kwargs):
+            url = build_hosts_url(
+                query="?fields[host]=display_name,fqdn,stale_timestamp&fields[system_profile]=arch",
+                **url_builder_kwargs,
+            )
+            response_status, response_data = api_get(url)
+
+            assert response_status == 200
+            assert len(response_data["results"]) == 2
+            for result in response_data["results"]:
+                assert set(result.keys()) == {"id", "display_name", "fqdn", "stale_timestamp", "system_profile"}
+                assert result["stale_timestamp"] is not None
+                assert result["system_profile"] == {"arch": "x86_64"}
+
+
+@pytest.mark.parametrize("query", ("?fields[host]=foo", "?fields[host]=display_name&fields[foo]=bar"))
+def test_query_host_sparse_fields_invalid(query, api_get):
+    response_status, _ = api_get(build_hosts_url(query=query))
+
+    assert response_status == 400
+
+
 def test_query_by_id_culled_hosts(db_create_host, api_get):
     # Create a culled host
     with patch("app.models.datetime", **{"now.return_value": now() - timedelta(days=365)}):
@@ -2103,3 +2132,122 @@ def test_get_host_from_different_org(mocker, api_get):
     url = build_hosts_url()
     response_status, _ = api_get(url)
     assert_response_status(response_status, 403)
+
+
+@pytest.mark.parametrize(
+    "order_by,order_how",
+    (
+        ("updated", "DESC"),
+        ("updated", "ASC"),
+        ("display_name", "ASC"),
+        ("group_name", "ASC"),
+        ("group_name", "DESC"),
+        ("operating_system", "DESC"),
+    ),
+)
+def test_get_hosts_cursor_pagination(
+    db_create_group_with_hosts, db_create_multiple_hosts, api_get, order_by, order_how
+):
+    db_create_group_with_hosts("cursor group", 3)
+    db_create_multiple_hosts(how_many=4)
+
+    url = build_hosts_url(query=f"?order_by={order_by}&order_how={order_how}")
+    response_status, response_data = api_get(url)
+    assert response_status == 200
+    expected_ids = [host["id"] for host in response_data["results"]]
+    assert response_data["next_cursor"] is None
+
+    cursor_ids = []
+    cursor = None
+    for _ in range(len(expected_ids)):
+        query = f"?order_by={order_by}&order_how={order_how}&per_page=2"
+        if cursor:
+            query += f"&cursor={cursor}"
+        response_status, response_data = api_get(build_hosts_url(query=query))
+        assert response_status == 200
+        cursor_ids += [host["id"] for host in response_data["results"]]
+        cursor = response_data["next_cursor"]
+        if not cursor:
+            break
+
+    assert cursor_ids[: len(expected_ids)] == expected_ids
+    assert len(set(cursor_ids)) == len(cursor_ids)
+
+
+def test_get_hosts_cursor_with_different_ordering(db_create_multiple_hosts, api_get):
+    db_create_multiple_hosts(how_many=3)
+
+    response_status, response_data = api_get(build_hosts_url(query="?per_page=1"))
+    assert response_status == 200
+    assert response_data["next_cursor"]
+
+    url = build_hosts_url(query=f"?per_page=1&order_by=display_name&cursor={response_data['next_cursor']}")
+    response_status, _ = api_get(url)
+    assert response_status == 400
+
+
+def test_get_hosts_invalid_cursor(db_create_host, api_get):
+    db_create_host()
+
+    for cursor in ("not-a-cursor", base64.urlsafe_b64encode(b'{"order": ":", "values": 1}').decode()):
+        response_status, _ = api_get(build_hosts_url(query=f"?cursor={cursor}"))
+        assert response_status == 400
+
+
+def test_get_system_profile_cursor_pagination(db_create_multiple_hosts, api_get):
+    created_hosts = db_create_multiple_hosts(how_many=5)
+
+    response_status, response_data = api_get(build_system_profile_url(created_hosts, query="?per_page=3"))
+    assert response_status == 200
+    first_page_ids = [host["id"] for host in response_data["results"]]
+
+    query = f"?per_page=3&cursor={response_data['next_cursor']}"
+    response_status, response_data = api_get(build_system_profile_url(created_hosts, query=query))
+    assert response_status == 200
+    second_page_ids = [host["id"] for host in response_data["results"]]
+
+    assert len(second_page_ids) == 2
+    assert response_data["next_cursor"] is None
+    assert set(first_page_ids + second_page_ids) == {str(host.id) for host in created_hosts}
+
+
+@pytest.mark.usefixtures("event_producer_mock", "notification_event_producer_mock")
+def test_get_hosts_total_is_cached_until_hosts_change(
+    db_create_multiple_hosts, api_get, api_delete_host, inventory_config
+):
+    inventory_config.host_count_cache_timeout = 60
+    host_count_query.HOST_COUNT_CACHE.clear()
+    created_hosts = db_create_multiple_hosts(how_many=3)
+
+    response_status, response_data = api_get(build_hosts_url())
+    assert response_status == 200
+    assert response_data["total"] == 3
+
+    # Hosts written directly to the database don't invalidate the cached count
+    db_create_multiple_hosts(how_many=1)
+    response_status, response_data = api_get(build_hosts_url())
+    assert response_status == 200
+    assert response_data["total"] == 3
+    assert response_data["count"] == 4
+
+    response_status, _ = api_delete_host(created_hosts[0].id)
+    assert response_status == 200
+
+    response_status, response_data = api_get(build_hosts_url())
+    assert response_status == 200
+    assert response_data["total"] == 3
+    assert response_data["count"] == 3
+
+
+def test_get_hosts_estimated_total(db_create_multiple_hosts, api_get):
+    db_create_multiple_hosts(how_many=3)
+
+    # Small estimates are replaced with the exact count
+    response_status, response_data = api_get(build_hosts_url(query="?total=estimate"))
+    assert response_status == 200
+    assert response_data["total"] == 3
+
+
+def test_get_hosts_invalid_total(api_get):
+    response_status, _ = api_get(build_hosts_url(query="?total=approximate"))
+    assert response_status == 400
@@ -7,6 +7,7 @@ from unittest.mock import patch
 
 import pytest
 
+from api import host_count_query
 from app.auth.identity import from_auth_header
 from app.queue.event_producer import MessageDetails
 from app.serialization import deserialize_canonical_facts
@@ -359,6 +360,31 @@ def test_patch_by_namespace_on_multiple_hosts_produces_multiple_update_events(
     assert event_producer.write_event.call_count == 2
 
 
+@pytest.mark.usefixtures("event_producer_mock")
+def test_patch_by_namespace_invalidates_the_host_count_cache(db_create_host, api_patch, inventory_config):
+    inventory_config.host_count_cache_timeout = 60
+    created_host = db_create_host(host=db_host(), extra_data={"facts": DB_FACTS})
+    generation = host_count_query._generations.get(created_host.org_id, 0)
+
+    facts_url = build_facts_url(host_list_or_id=created_host.id, namespace=DB_FACTS_NAMESPACE)
+    response_status, _ = api_patch(facts_url, DB_NEW_FACTS)
+    assert_response_status(response_status, expected_status=200)
+
+    assert host_count_query._generations[created_host.org_id] > generation
+
+
+@pytest.mark.usefixtures("event_producer_mock")
+def test_checkin_invalidates_the_host_count_cache(db_create_host, api_post, inventory_config):
+    inventory_config.host_count_cache_timeout = 60
+    created_host = db_create_host()
+    generation = host_count_query._generations.get(created_host.org_id, 0)
+
+    response_status, _ = api_post(build_host_checkin_url(), created_host.canonical_facts)
+    assert_response_status(response_status, expected_status=201)
+
+    assert host_count_query._generations[created_host.org_id] > generation
+
+
 @pytest.mark.parametrize(
     "patched_function,error",
     (
@@ -1,5 +1,6 @@
 import pytest
 
+from api.staleness_query import get_staleness_obj
 from tests.helpers.api_utils import STALENESS_WRITE_ALLOWED_RBAC_RESPONSE_FILES
 from tests.helpers.api_utils import STALENESS_WRITE_PROHIBITED_RBAC_RESPONSE_FILES
 from tests.helpers.api_utils import assert_response_status
@@ -18,6 +19,24 @@ def test_update_existing_record(api_patch, db_create_staleness_culling):
     assert saved_staleness.conventional_time_to_stale == 99
 
 
+def test_update_invalidates_cached_staleness(api_patch, db_create_staleness_culling, inventory_config):
+    inventory_config.staleness_cache_timeout = 60
+    saved_staleness = db_create_staleness_culling(conventional_time_to_stale=1)
+    org_id = saved_staleness.org_id
+
+    cached_staleness = get_staleness_obj(org_id)
+    assert cached_staleness.conventional_time_to_stale == 1
+
+    # The cached object is a copy
+    cached_staleness["conventional_time_to_stale"] = 2
+    assert get_staleness_obj(org_id).conventional_time_to_stale == 1
+
+    url = build_staleness_url()
+    response_status, _ = api_patch(url, host_data=_INPUT_DATA)
+    assert_response_status(response_status, 200)
+    assert get_staleness_obj(org_id).conventional_time_to_stale == 99
+
+
 def test_update_non_existing_record(api_patch):
     url = build_staleness_url()
     response_status, _ = api_patch(url, host_data=_INPUT_DATA)
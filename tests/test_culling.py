@@ -7,6 +7,7 @@ import pytest
 import pytz
 from confluent_kafka import KafkaException
 
+from api import cache
 from app.logging import threadctx
 from app.models import db
 from host_reaper import run as host_reaper_run
@@ -267,6 +268,108 @@ def test_non_culled_host_is_not_removed(
     assert notification_event_producer_mock.event is None
 
 
+@pytest.mark.host_reaper
+def test_culled_hosts_are_removed_by_their_org_shard(
+    flask_app, event_producer_mock, notification_event_producer_mock, db_create_host, db_get_hosts, inventory_config
+):
+    staleness_timestamps = get_staleness_timestamps()
+    host_ids_by_org = {
+        org_id: [
+            db_create_host(host=minimal_db_host(stale_timestamp=staleness_timestamps["culled"], org_id=org_id)).id
+            for _ in range(2)
+        ]
+        for org_id in (f"shard-org-{index}" for index in range(16))
+    }
+    created_host_ids = [host_id for host_ids in host_ids_by_org.values() for host_id in host_ids]
+
+    threadctx.request_id = None
+    remaining_org_ids = set(host_ids_by_org)
+    deleted_org_ids_by_shard = []
+    for shard in ((0, 2), (1, 2)):
+        host_reaper_run(
+            inventory_config,
+            mock.Mock(),
+            db.session,
+            event_producer_mock,
+            notification_event_producer_mock,
+            shutdown_handler=mock.Mock(**{"shut_down.return_value": False}),
+            application=flask_app,
+            shard=shard,
+        )
+        shard_remaining_org_ids = {host.org_id for host in db_get_hosts(created_host_ids)}
+        # An org's hosts are all deleted by the same shard
+        assert all(
+            {host.id for host in db_get_hosts(host_ids_by_org[org_id])} == set(host_ids_by_org[org_id])
+            for org_id in shard_remaining_org_ids
+        )
+        deleted_org_ids_by_shard.append(remaining_org_ids - shard_remaining_org_ids)
+        remaining_org_ids = shard_remaining_org_ids
+
+    first_shard_org_ids, second_shard_org_ids = deleted_org_ids_by_shard
+    assert first_shard_org_ids
+    assert second_shard_org_ids
+    assert first_shard_org_ids.isdisjoint(second_shard_org_ids)
+    assert first_shard_org_ids | second_shard_org_ids == set(host_ids_by_org)
+    assert not remaining_org_ids
+
+
+@pytest.mark.host_reaper
+def test_reaper_reports_the_remaining_count_per_chunk(
+    flask_app, event_producer_mock, notification_event_producer_mock, db_create_host, inventory_config
+):
+    staleness_timestamps = get_staleness_timestamps()
+    for _ in range(5):
+        db_create_host(host=minimal_db_host(stale_timestamp=staleness_timestamps["culled"], reporter="some reporter"))
+
+    threadctx.request_id = None
+    inventory_config.host_delete_chunk_size = 2
+
+    with patch("host_reaper.host_reaper_remaining_count") as remaining_count_mock:
+        host_reaper_run(
+            inventory_config,
+            mock.Mock(),
+            db.session,
+            event_producer_mock,
+            notification_event_producer_mock,
+            shutdown_handler=mock.Mock(**{"shut_down.return_value": False}),
+            application=flask_app,
+        )
+
+    assert remaining_count_mock.set.call_args_list == [mock.call(5), mock.call(3), mock.call(1), mock.call(0)]
+
+
+@pytest.mark.host_reaper
+def test_reaper_deletion_invalidates_the_cached_responses(
+    flask_app, event_producer_mock, notification_event_producer_mock, db_create_host, db_get_host, inventory_config
+):
+    # The reaper does not cache responses itself, but the API processes do
+    staleness_timestamps = get_staleness_timestamps()
+    created_host = db_create_host(
+        host=minimal_db_host(stale_timestamp=staleness_timestamps["culled"], reporter="some reporter")
+    )
+
+    threadctx.request_id = None
+    with (
+        patch.object(cache, "RESPONSE_CACHE_TIMEOUT", 0),
+        patch.object(cache, "CACHE_CONFIG", {"CACHE_TYPE": cache.CACHE_TYPE_REDIS_CACHE}),
+        patch.object(cache, "increment_generation") as increment_generation,
+    ):
+        host_reaper_run(
+            inventory_config,
+            mock.Mock(),
+            db.session,
+            event_producer_mock,
+            notification_event_producer_mock,
+            shutdown_handler=mock.Mock(**{"shut_down.return_value": False}),
+            application=flask_app,
+        )
+
+    assert not db_get_host(created_host.id)
+    assert mock.call(cache._response_generation_key(created_host.org_id), spawn=True) in (
+        increment_generation.call_args_list
+    )
+
+
 @pytest.mark.host_reaper
 def test_reaper_shutdown_handler(
     flask_app, db_create_host, db_get_hosts, inventory_config, notification_event_producer_mock
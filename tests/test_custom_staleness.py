@@ -4,11 +4,18 @@ from datetime import timedelta
 from unittest import mock
 from unittest.mock import patch
 
+import pytest
+
 from app.logging import threadctx
+from app.models import Host
 from app.models import db
+from app.staleness_serialization import get_sys_default_staleness
 from host_reaper import run as host_reaper_run
+from lib.host_repository import find_non_culled_hosts
+from lib.host_repository import find_stale_hosts
 from tests.helpers.api_utils import build_hosts_url
 from tests.helpers.api_utils import build_staleness_url
+from tests.helpers.test_utils import SYSTEM_IDENTITY
 from tests.helpers.test_utils import now
 
 CUSTOM_STALENESS_DELETE_ONLY_IMMUTABLE = {
@@ -337,3 +344,152 @@ def test_async_update_host_update_custom_staleness(
                 )
                 stale_timestamp = stale_timestamp.isoformat()
                 assert hosts_after_update[0].per_reporter_staleness[reporter]["stale_timestamp"] == stale_timestamp
+
+
+def _assert_staleness_columns(host, staleness):
+    staleness_type = "immutable" if host.system_profile_facts.get("host_type") == "edge" else "conventional"
+    assert host.stale_at == host.modified_on + timedelta(seconds=staleness[f"{staleness_type}_time_to_stale"])
+    assert host.stale_warning_at == host.modified_on + timedelta(
+        seconds=staleness[f"{staleness_type}_time_to_stale_warning"]
+    )
+    assert host.culled_at == host.modified_on + timedelta(seconds=staleness[f"{staleness_type}_time_to_delete"])
+
+
+def test_delete_only_immutable_hosts_using_staleness_columns(
+    flask_app,
+    db_create_staleness_culling,
+    inventory_config,
+    db_create_multiple_hosts,
+    event_producer_mock,
+    notification_event_producer_mock,
+    db_get_hosts,
+):
+    db_create_staleness_culling(**CUSTOM_STALENESS_DELETE_ONLY_IMMUTABLE)
+
+    with patch("app.models.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime.now() - timedelta(minutes=1)
+        immutable_hosts = db_create_multiple_hosts(
+            how_many=2, extra_data={"system_profile_facts": {"host_type": "edge"}}
+        )
+        immutable_hosts = [host.id for host in immutable_hosts]
+        conventional_hosts = db_create_multiple_hosts(how_many=2)
+        conventional_hosts = [host.id for host in conventional_hosts]
+
+    threadctx.request_id = None
+    with patch("api.filtering.db_filters.get_flag_value", return_value=True):
+        host_reaper_run(
+            inventory_config,
+            mock.Mock(),
+            db.session,
+            event_producer_mock,
+            notification_event_producer_mock,
+            shutdown_handler=mock.Mock(**{"shut_down.return_value": False}),
+            application=flask_app,
+        )
+    assert len(db_get_hosts(immutable_hosts).all()) == 0
+    assert len(db_get_hosts(conventional_hosts).all()) == 2
+
+
+def test_find_non_culled_hosts_using_staleness_columns(
+    flask_app,  # noqa: ARG001
+    db_create_staleness_culling,
+    db_create_multiple_hosts,
+):
+    db_create_staleness_culling(**CUSTOM_STALENESS_DELETE_ONLY_CONVENTIONAL)
+
+    with patch("app.models.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime.now() - timedelta(minutes=1)
+        immutable_host_ids = {
+            host.id
+            for host in db_create_multiple_hosts(
+                how_many=2, extra_data={"system_profile_facts": {"host_type": "edge"}}
+            )
+        }
+        db_create_multiple_hosts(how_many=2)
+
+    with patch("api.filtering.db_filters.get_flag_value", return_value=True):
+        non_culled_host_ids = {host.id for host in find_non_culled_hosts(Host.query, mock.Mock())}
+
+    assert non_culled_host_ids == immutable_host_ids
+
+
+def test_find_stale_hosts_in_window_using_staleness_columns(
+    flask_app,  # noqa: ARG001
+    db_create_staleness_culling,
+    db_create_multiple_hosts,
+):
+    db_create_staleness_culling(**CUSTOM_STALENESS_HOST_BECAME_STALE)
+
+    # The hosts became stale a second after they were modified, 59 seconds ago
+    with patch("app.models.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime.now() - timedelta(minutes=1)
+        host_ids = {host.id for host in db_create_multiple_hosts(how_many=2)}
+
+    job_start_time = datetime.now()
+    with patch("api.filtering.db_filters.get_flag_value", return_value=True):
+        stale_in_last_run = Host.query.filter(find_stale_hosts(SYSTEM_IDENTITY["org_id"], 120, job_start_time))
+        stale_before_last_run = Host.query.filter(find_stale_hosts(SYSTEM_IDENTITY["org_id"], 30, job_start_time))
+
+    assert {host.id for host in stale_in_last_run} == host_ids
+    assert not stale_before_last_run.all()
+
+
+@pytest.mark.parametrize("use_staleness_columns", (False, True))
+def test_staleness_filter_keeps_the_host_types_using_staleness_columns(
+    db_create_multiple_hosts, api_get, use_staleness_columns
+):
+    # Only the requested host types are listed and counted, whether or not the staleness columns are used
+    host_ids = {
+        str(host.id)
+        for host in (
+            *db_create_multiple_hosts(how_many=2),
+            *db_create_multiple_hosts(how_many=2, extra_data={"system_profile_facts": {"host_type": "edge"}}),
+        )
+    }
+    db_create_multiple_hosts(how_many=2, extra_data={"system_profile_facts": {"host_type": "unknown"}})
+
+    with patch("api.filtering.db_filters.get_flag_value", return_value=use_staleness_columns):
+        response_status, response_data = api_get(build_hosts_url(query="?staleness=fresh&per_page=10"))
+
+    assert response_status == 200
+    assert response_data["total"] == len(host_ids)
+    assert {host["id"] for host in response_data["results"]} == host_ids
+
+
+@pytest.mark.parametrize("staleness_change", ("create", "update", "delete"))
+def test_staleness_columns_are_recomputed_on_custom_staleness_change(
+    db_create_staleness_culling,
+    db_get_hosts,
+    db_create_multiple_hosts,
+    api_post,
+    api_patch,
+    api_delete_staleness,
+    staleness_change,
+):
+    if staleness_change != "create":
+        db_create_staleness_culling(**CUSTOM_STALENESS_HOST_BECAME_STALE)
+
+    host_ids = [host.id for host in db_create_multiple_hosts(how_many=2)]
+    host_ids.append(
+        db_create_multiple_hosts(how_many=1, extra_data={"system_profile_facts": {"host_type": "edge"}})[0].id
+    )
+    modified_on = {host.id: host.modified_on for host in db_get_hosts(host_ids)}
+
+    if staleness_change == "create":
+        status, _ = api_post(build_staleness_url(), CUSTOM_STALENESS_HOST_BECAME_STALE)
+        assert status == 201
+        expected_staleness = CUSTOM_STALENESS_HOST_BECAME_STALE
+    elif staleness_change == "update":
+        status, _ = api_patch(build_staleness_url(), CUSTOM_STALENESS_NO_HOSTS_TO_DELETE)
+        assert status == 200
+        expected_staleness = CUSTOM_STALENESS_NO_HOSTS_TO_DELETE
+    else:
+        status, _ = api_delete_staleness()
+        assert status == 204
+        expected_staleness = get_sys_default_staleness()
+
+    db.session.expire_all()
+    for host in db_get_hosts(host_ids):
+        # The hosts don't look modified
+        assert host.modified_on == modified_on[host.id]
+        _assert_staleness_columns(host, expected_staleness)
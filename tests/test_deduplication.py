@@ -1,16 +1,24 @@
+from uuid import UUID
+
 import pytest
 from pytest import mark
 
 from app.auth.identity import Identity
 from app.exceptions import InventoryException
 from app.exceptions import ValidationException
+from app.models import HostCanonicalFact
 from app.models import ProviderType
+from app.models import db
+from lib.feature_flags import FLAG_FALLBACK_VALUES
+from lib.feature_flags import FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP
 from lib.host_repository import IMMUTABLE_CANONICAL_FACTS
+from lib.host_repository import BatchHostFinder
 from lib.host_repository import find_existing_host
 from tests.helpers.db_utils import assert_host_exists_in_db
 from tests.helpers.db_utils import assert_host_missing_from_db
 from tests.helpers.db_utils import minimal_db_host
 from tests.helpers.test_utils import SYSTEM_IDENTITY
+from tests.helpers.test_utils import USER_IDENTITY
 from tests.helpers.test_utils import base_host
 from tests.helpers.test_utils import generate_fact
 from tests.helpers.test_utils import generate_fact_dict
@@ -560,3 +568,110 @@ def test_find_correct_host_varying_provider_type(db_create_host, mq_create_or_up
     assert ibm_found_host.id == str(ibm_host_id)
 
     assert aws_found_host.id != ibm_found_host.id
+
+
+@pytest.mark.parametrize(
+    "search_canonical_facts",
+    (
+        {"fqdn": "fred"},
+        {"insights_id": "e5e3d9bb-5c0e-4a79-a9e4-3a5dd2bd1d1c"},
+        {"insights_id": generate_uuid(), "fqdn": "fred"},
+        {"insights_id": "e5e3d9bb-5c0e-4a79-a9e4-3a5dd2bd1d1c", "bios_uuid": generate_uuid()},
+        {"fqdn": "fred", "ip_addresses": ["10.0.0.1"]},
+        {"fqdn": "barney"},
+    ),
+)
+def test_batch_host_finder_matches_find_existing_host(db_create_host, search_canonical_facts):
+    older_host = db_create_host(
+        host=minimal_db_host(
+            canonical_facts={"fqdn": "fred", "bios_uuid": generate_uuid(), "ip_addresses": ["10.0.0.1", "10.0.0.2"]}
+        )
+    )
+    newer_host = db_create_host(
+        host=minimal_db_host(
+            canonical_facts={"fqdn": "fred", "insights_id": "e5e3d9bb-5c0e-4a79-a9e4-3a5dd2bd1d1c"},
+        )
+    )
+    assert older_host.modified_on < newer_host.modified_on
+
+    identity = Identity(USER_IDENTITY)
+    batch_host_finder = BatchHostFinder()
+    batch_host_finder.prefetch(identity.org_id, [search_canonical_facts])
+
+    expected_host = find_existing_host(identity, search_canonical_facts)
+    found_host = batch_host_finder.find_existing_host(identity, search_canonical_facts)
+
+    assert found_host is expected_host
+
+
+@pytest.mark.usefixtures("flask_app")
+def test_batch_host_finder_finds_host_created_in_batch():
+    identity = Identity(USER_IDENTITY)
+    canonical_facts = {"insights_id": generate_uuid()}
+
+    batch_host_finder = BatchHostFinder()
+    batch_host_finder.prefetch(identity.org_id, [canonical_facts])
+    assert batch_host_finder.find_existing_host(identity, canonical_facts) is None
+
+    created_host = minimal_db_host(canonical_facts=canonical_facts)
+    batch_host_finder.add_created_host(created_host)
+
+    assert batch_host_finder.find_existing_host(identity, canonical_facts) is created_host
+
+
+@pytest.fixture(scope="function")
+def canonical_facts_lookup_enabled(mocker):
+    mocker.patch(
+        "lib.host_repository.get_flag_value",
+        side_effect=lambda flag, **_: flag == FLAG_INVENTORY_DEDUPLICATION_CANONICAL_FACTS_LOOKUP
+        or FLAG_FALLBACK_VALUES[flag],
+    )
+
+
+def _canonical_facts_lookup_rows(host_id):
+    return {
+        (row.fact_name, row.fact_value)
+        for row in db.session.query(HostCanonicalFact).filter(HostCanonicalFact.host_id == UUID(host_id))
+    }
+
+
+@pytest.mark.usefixtures("canonical_facts_lookup_enabled")
+def test_canonical_facts_lookup_table_is_kept_in_sync(mq_create_or_update_host):
+    insights_id = generate_uuid()
+    mac_addresses = [random_mac(), random_mac()]
+    created_host = mq_create_or_update_host(minimal_host(insights_id=insights_id, mac_addresses=mac_addresses))
+
+    assert {
+        ("insights_id", insights_id),
+        ("mac_addresses", mac_addresses[0]),
+        ("mac_addresses", mac_addresses[1]),
+    } <= _canonical_facts_lookup_rows(created_host.id)
+
+    fqdn = "fred.flintstone.com"
+    updated_host = mq_create_or_update_host(minimal_host(insights_id=insights_id, fqdn=fqdn))
+
+    assert updated_host.id == created_host.id
+    assert ("fqdn", fqdn) in _canonical_facts_lookup_rows(created_host.id)
+
+
+@pytest.mark.usefixtures("canonical_facts_lookup_enabled")
+@pytest.mark.parametrize(
+    "search_canonical_facts",
+    (
+        {"insights_id": "e5e3d9bb-5c0e-4a79-a9e4-3a5dd2bd1d1c"},
+        {"fqdn": "fred"},
+        {"fqdn": "barney"},
+        {"fqdn": "fred", "ip_addresses": ["10.0.0.1"]},
+        {"fqdn": "fred", "ip_addresses": ["10.0.0.1", "10.0.0.3"]},
+    ),
+)
+def test_canonical_facts_lookup_matches_jsonb_lookup(mq_create_or_update_host, mocker, search_canonical_facts):
+    mq_create_or_update_host(minimal_host(fqdn="fred", ip_addresses=["10.0.0.1", "10.0.0.2"]))
+    mq_create_or_update_host(minimal_host(fqdn="barney", insights_id="e5e3d9bb-5c0e-4a79-a9e4-3a5dd2bd1d1c"))
+    identity = Identity(SYSTEM_IDENTITY)
+
+    found_host = find_existing_host(identity, search_canonical_facts)
+    mocker.patch("lib.host_repository.canonical_facts_lookup_filter", return_value=None)
+    expected_host = find_existing_host(identity, search_canonical_facts)
+
+    assert found_host is expected_host
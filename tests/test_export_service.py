@@ -1,16 +1,21 @@
+import gzip
 import io
 import json
+from copy import deepcopy
 from datetime import datetime
 from datetime import timedelta
 from unittest import mock
 
+import pyarrow.parquet as pq
 import pytest
+import zstandard
 from marshmallow.exceptions import ValidationError
 from sqlalchemy.orm.exc import ObjectDeletedError
 
 from app.auth.identity import Identity
 from app.culling import Timestamps
 from app.culling import _Config as CullingConfig
+from app.queue.export_service import _export_data_chunks
 from app.queue.export_service import _format_export_data
 from app.queue.export_service import create_export
 from app.queue.export_service import get_host_list
@@ -87,6 +92,15 @@ def test_handle_create_export_missing_field(field_to_remove, flask_app, export_s
             export_service_consumer_mock.handle_message(export_message)
 
 
+@pytest.mark.parametrize("field,value", (("format", "xml"), ("compression", "bzip2")))
+def test_handle_create_export_unsupported_format(field, value):
+    export_message = json.loads(es_utils.create_export_message_mock())
+    export_message["data"]["resource_request"][field] = value
+
+    with pytest.raises(ValidationError):
+        parse_export_service_message(json.dumps(export_message))
+
+
 def test_handle_create_export_wrong_application(flask_app, export_service_consumer_mock):
     with flask_app.app.app_context():
         export_message = es_utils.create_export_message_mock()
@@ -211,7 +225,7 @@ def test_do_not_export_culled_hosts(flask_app, db_create_host, db_create_stalene
         identity = Identity(USER_IDENTITY)
         host_list = get_host_list(identity=identity, rbac_filter=None, inventory_config=inventory_config)
 
-        assert len(host_list) == 0
+        assert len(list(host_list)) == 0
 
 
 def test_export_one_host(flask_app, db_create_host, inventory_config):
@@ -220,7 +234,7 @@ def test_export_one_host(flask_app, db_create_host, inventory_config):
         identity = Identity(USER_IDENTITY)
         host_list = get_host_list(identity=identity, rbac_filter=None, inventory_config=inventory_config)
 
-        assert len(host_list) == 1
+        assert len(list(host_list)) == 1
 
 
 @mock.patch("api.host_query_db.db.session.scalars", side_effect=ObjectDeletedError(None))
@@ -233,3 +247,32 @@ def test_export_catches_db_error(flask_app, inventory_config, mocker):
 
         create_export(validated_msg, base64_x_rh_identity, inventory_config)
         handle_export_error_mock.assert_called_once()
+
+
+@pytest.mark.parametrize("format", ("json", "csv"))
+def test_export_data_gzip_compression(format):
+    uncompressed = b"".join(_export_data_chunks(deepcopy(es_utils.EXPORT_DATA), format))
+    compressed = b"".join(_export_data_chunks(deepcopy(es_utils.EXPORT_DATA), format, compression="gzip"))
+
+    assert gzip.decompress(compressed) == uncompressed
+
+
+@pytest.mark.parametrize("format", ("json", "csv"))
+def test_export_data_zstd_compression(format):
+    uncompressed = b"".join(_export_data_chunks(deepcopy(es_utils.EXPORT_DATA), format))
+    compressed = b"".join(_export_data_chunks(deepcopy(es_utils.EXPORT_DATA), format, compression="zstd"))
+
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == uncompressed
+
+
+@pytest.mark.parametrize("compression", (None, "zstd"))
+def test_export_data_parquet(compression):
+    data = b"".join(
+        _export_data_chunks(deepcopy(es_utils.EXPORT_DATA), "parquet", compression=compression, batch_size=2)
+    )
+
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == len(es_utils.EXPORT_DATA)
+    assert table.to_pylist() == [
+        {field: host[field] for field in _EXPORT_SERVICE_FIELDS} for host in es_utils.EXPORT_DATA
+    ]
@@ -17,15 +17,23 @@ from app.auth.identity import create_mock_identity_with_org_id
 from app.exceptions import InventoryException
 from app.exceptions import ValidationException
 from app.logging import threadctx
+from app.models import HostSchema
 from app.queue.events import EventType
+from app.queue.host_mq import HostOperationSchema
 from app.queue.host_mq import IngressMessageConsumer
+from app.queue.host_mq import OperationResult
 from app.queue.host_mq import SystemProfileMessageConsumer
 from app.queue.host_mq import WorkspaceMessageConsumer
 from app.queue.host_mq import _validate_json_object_for_utf8
+from app.queue.host_mq import parse_operation_message
+from app.queue.host_mq import prevalidate_host_operation_message
 from app.queue.host_mq import write_add_update_event_message
+from app.queue.host_mq import write_message_batch
 from app.utils import Tag
+from lib import host_repository
 from lib.host_repository import AddHostResult
 from tests.helpers.db_utils import create_reference_host_in_db
+from tests.helpers.db_utils import minimal_db_host
 from tests.helpers.mq_utils import FakeMessage
 from tests.helpers.mq_utils import assert_mq_host_data
 from tests.helpers.mq_utils import expected_headers
@@ -1872,6 +1880,10 @@ def test_batch_mq_add_host_operations(mocker, event_producer, flask_app):
         return_value=SimpleNamespace(
             mq_db_batch_max_messages=7,
             mq_db_batch_max_seconds=1,
+            mq_db_batch_dedup=False,
+            mq_prevalidation_workers=0,
+            mq_coalesce_host_events=False,
+            mq_skip_unchanged_host_events=False,
             culling_stale_warning_offset_delta=1,
             culling_culled_offset_delta=1,
             conventional_time_to_stale_seconds=1,
@@ -1934,6 +1946,10 @@ def test_batch_mq_header_request_id_updates(mocker, flask_app):
         return_value=SimpleNamespace(
             mq_db_batch_max_messages=7,
             mq_db_batch_max_seconds=1,
+            mq_db_batch_dedup=False,
+            mq_prevalidation_workers=0,
+            mq_coalesce_host_events=False,
+            mq_skip_unchanged_host_events=False,
             culling_stale_warning_offset_delta=1,
             culling_culled_offset_delta=1,
             conventional_time_to_stale_seconds=1,
@@ -1984,6 +2000,10 @@ def test_batch_mq_graceful_rollback(mocker, flask_app):
         return_value=SimpleNamespace(
             mq_db_batch_max_messages=3,
             mq_db_batch_max_seconds=1,
+            mq_db_batch_dedup=False,
+            mq_prevalidation_workers=0,
+            mq_coalesce_host_events=False,
+            mq_skip_unchanged_host_events=False,
             culling_stale_warning_offset_delta=1,
             culling_culled_offset_delta=1,
             conventional_time_to_stale_seconds=1,
@@ -2021,6 +2041,261 @@ def test_batch_mq_graceful_rollback(mocker, flask_app):
     assert write_batch_patch.call_count == 1
 
 
+def test_prevalidate_host_operation_message():
+    host = minimal_host(insights_id=generate_uuid(), system_profile={"number_of_cpus": "2", "unknown_field": 1})
+    message = json.dumps(wrap_message(host.data(), "add_host", get_platform_metadata()))
+
+    validated_operation_msg, validated_host_data = prevalidate_host_operation_message(message, HostSchema)
+
+    assert validated_operation_msg["operation"] == "add_host"
+    assert validated_host_data == HostSchema().load(validated_operation_msg["data"])
+    assert validated_host_data["system_profile"] == {"number_of_cpus": 2}
+
+
+@pytest.mark.parametrize(
+    "message",
+    (
+        "not json",
+        json.dumps({"operation": "add_host"}),
+        json.dumps(wrap_message(minimal_host(insights_id="invalid").data(), "add_host", get_platform_metadata())),
+    ),
+)
+def test_prevalidate_host_operation_message_invalid(message):
+    assert prevalidate_host_operation_message(message, HostSchema) is None
+
+
+def test_batch_mq_prevalidation(mocker, flask_app):
+    # Verifies that the messages prevalidated by the worker processes are processed as usual,
+    # and that the messages which failed the prevalidation are handled individually.
+    msg_list = [
+        json.dumps(wrap_message(minimal_host(insights_id=generate_uuid()).data(), "add_host", get_platform_metadata()))
+        for _ in range(3)
+    ]
+    msg_list.append(
+        json.dumps(wrap_message(minimal_host(insights_id="invalid").data(), "add_host", get_platform_metadata()))
+    )
+
+    # Patch batch settings in inventory_config()
+    mocker.patch(
+        "app.queue.host_mq.inventory_config",
+        return_value=SimpleNamespace(
+            mq_db_batch_max_messages=4,
+            mq_db_batch_max_seconds=1,
+            mq_db_batch_dedup=False,
+            mq_prevalidation_workers=2,
+            mq_coalesce_host_events=False,
+            mq_skip_unchanged_host_events=False,
+            culling_stale_warning_offset_delta=1,
+            culling_culled_offset_delta=1,
+            conventional_time_to_stale_seconds=1,
+            conventional_time_to_stale_warning_seconds=1,
+            conventional_time_to_delete_seconds=1,
+            immutable_time_to_stale_seconds=1,
+            immutable_time_to_stale_warning_seconds=1,
+            immutable_time_to_delete_seconds=1,
+        ),
+    )
+    write_batch_patch = mocker.patch("app.queue.host_mq.write_message_batch")
+    parse_patch = mocker.patch("app.queue.host_mq.parse_operation_message", wraps=parse_operation_message)
+
+    fake_consumer = mocker.Mock(**{"consume.side_effect": [[FakeMessage(message=msg) for msg in msg_list], [], []]})
+    consumer = IngressMessageConsumer(fake_consumer, flask_app, mocker.Mock(), mocker.Mock())
+    consumer.event_loop(interrupt=mocker.Mock(side_effect=([False for _ in range(2)] + [True])))
+    consumer.prevalidation_pool.shutdown()
+
+    processed_rows = write_batch_patch.call_args_list[0][0][2]
+    assert len(processed_rows) == 3
+    assert all(row.event_type == EventType.created for row in processed_rows)
+
+    # Only the invalid message was parsed again in the main process
+    parse_patch.assert_called_once_with(msg_list[3], HostOperationSchema)
+
+
+def _batch_preparation_config(**kwargs):
+    return SimpleNamespace(
+        mq_db_batch_max_messages=3,
+        mq_db_batch_max_seconds=1,
+        mq_coalesce_host_events=False,
+        mq_skip_unchanged_host_events=False,
+        culling_stale_warning_offset_delta=1,
+        culling_culled_offset_delta=1,
+        conventional_time_to_stale_seconds=1,
+        conventional_time_to_stale_warning_seconds=1,
+        conventional_time_to_delete_seconds=1,
+        immutable_time_to_stale_seconds=1,
+        immutable_time_to_stale_warning_seconds=1,
+        immutable_time_to_delete_seconds=1,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(
+    "config,failing_call",
+    (
+        (
+            _batch_preparation_config(mq_db_batch_dedup=True, mq_prevalidation_workers=0),
+            "lib.host_repository.BatchHostFinder.prefetch",
+        ),
+        (
+            _batch_preparation_config(mq_db_batch_dedup=False, mq_prevalidation_workers=2),
+            "concurrent.futures.ProcessPoolExecutor.map",
+        ),
+    ),
+)
+def test_batch_mq_preparation_failure_handles_messages_individually(mocker, flask_app, config, failing_call):
+    # Verifies that a failed prefetch or prevalidation doesn't drop the batch
+    msg_list = [
+        json.dumps(wrap_message(minimal_host(insights_id=generate_uuid()).data(), "add_host", get_platform_metadata()))
+        for _ in range(3)
+    ]
+    mocker.patch("app.queue.host_mq.inventory_config", return_value=config)
+    mocker.patch(failing_call, side_effect=OperationalError("SELECT", {}, Exception("statement timeout")))
+    failure_metric = mocker.patch("app.queue.host_mq.metrics.ingress_batch_preparation_failure")
+    write_batch_patch = mocker.patch("app.queue.host_mq.write_message_batch")
+
+    fake_consumer = mocker.Mock(**{"consume.side_effect": [[FakeMessage(message=msg) for msg in msg_list], [], []]})
+    consumer = IngressMessageConsumer(fake_consumer, flask_app, mocker.Mock(), mocker.Mock())
+    consumer.event_loop(interrupt=mocker.Mock(side_effect=([False for _ in range(2)] + [True])))
+    if consumer.prevalidation_pool:
+        consumer.prevalidation_pool.shutdown()
+
+    failure_metric.inc.assert_called_once()
+    assert consumer.batch_host_finder is None
+    processed_rows = write_batch_patch.call_args_list[0][0][2]
+    assert len(processed_rows) == 3
+    assert all(row.event_type == EventType.created for row in processed_rows)
+
+
+def test_write_message_batch_flushes_once(mocker):
+    # Verifies that events are produced without waiting, and the producers are flushed once per batch
+    event_producer = mocker.Mock()
+    notification_event_producer = mocker.Mock()
+    delivered = SimpleNamespace(delivered=True, error=None)
+    undelivered = SimpleNamespace(delivered=False, error="Message timed out")
+    write_patch = mocker.patch(
+        "app.queue.host_mq.write_add_update_event_message", side_effect=[delivered, undelivered, delivered]
+    )
+    logger_patch = mocker.patch("app.queue.host_mq.logger")
+    processed_rows = [
+        SimpleNamespace(host_row=SimpleNamespace(id=generate_uuid()), platform_metadata={}, skip_event=False)
+        for _ in range(3)
+    ]
+
+    write_message_batch(event_producer, notification_event_producer, processed_rows)
+
+    assert write_patch.call_count == 3
+    for call in write_patch.call_args_list:
+        assert call.kwargs["wait"] is False
+    event_producer.flush.assert_called_once()
+    notification_event_producer.flush.assert_called_once()
+
+    # Only the message that was not delivered is reported
+    logger_patch.error.assert_called_once()
+    assert str(processed_rows[1].host_row.id) in logger_patch.error.call_args[0][0]
+
+
+def test_write_message_batch_skips_unchanged_host_events(mocker):
+    # Verifies that no event is produced for a host whose data didn't change,
+    # while its request still gets its payload tracker status and success log.
+    write_patch = mocker.patch(
+        "app.queue.host_mq.write_add_update_event_message", return_value=SimpleNamespace(delivered=True, error=None)
+    )
+    report_patch = mocker.patch("app.queue.host_mq.report_result_without_event")
+    changed_result = OperationResult(
+        SimpleNamespace(id=generate_uuid()), {}, None, None, EventType.updated, mocker.Mock()
+    )
+    unchanged_result = OperationResult(
+        SimpleNamespace(id=generate_uuid()), {}, None, None, EventType.updated, mocker.Mock(), skip_event=True
+    )
+
+    write_message_batch(mocker.Mock(), mocker.Mock(), [changed_result, unchanged_result])
+
+    write_patch.assert_called_once()
+    assert write_patch.call_args.args[2] is changed_result
+    report_patch.assert_called_once_with(unchanged_result)
+
+
+def test_write_message_batch_coalesces_host_events(mocker):
+    # Verifies that with coalescing enabled, one event is produced per host,
+    # while every request still gets its payload tracker status and success log.
+    write_patch = mocker.patch(
+        "app.queue.host_mq.write_add_update_event_message", return_value=SimpleNamespace(delivered=True, error=None)
+    )
+    report_patch = mocker.patch("app.queue.host_mq.report_result_without_event")
+    first_host_row = SimpleNamespace(id=generate_uuid())
+    second_host_row = SimpleNamespace(id=generate_uuid())
+    processed_rows = [
+        OperationResult(first_host_row, {"request_id": "1"}, None, None, EventType.created, mocker.Mock()),
+        OperationResult(second_host_row, {"request_id": "2"}, None, None, EventType.updated, mocker.Mock()),
+        OperationResult(first_host_row, {"request_id": "3"}, None, None, EventType.updated, mocker.Mock()),
+        None,
+        OperationResult(first_host_row, {"request_id": "4"}, None, None, EventType.updated, mocker.Mock()),
+    ]
+
+    write_message_batch(mocker.Mock(), mocker.Mock(), processed_rows, coalesce=True)
+
+    produced_results = [call.args[2] for call in write_patch.call_args_list]
+    assert [result.platform_metadata["request_id"] for result in produced_results] == ["2", "4"]
+    # The host was created within the batch, so the event for its last update is still a "created" event
+    assert produced_results[1].event_type == EventType.created
+    assert produced_results[1].success_logger is processed_rows[4].success_logger
+
+    reported_results = [call.args[0] for call in report_patch.call_args_list]
+    assert [result.platform_metadata["request_id"] for result in reported_results] == ["1", "3"]
+
+
+def test_batch_mq_dedup(mocker, flask_app, db_create_host):
+    # Verifies that with batch dedup enabled, hosts are deduplicated against the DB
+    # and against the hosts created earlier in the same batch.
+    existing_host = db_create_host(host=minimal_db_host(canonical_facts={"insights_id": generate_uuid()}))
+    existing_insights_id = existing_host.canonical_facts["insights_id"]
+    new_insights_id = generate_uuid()
+
+    msg_list = [
+        json.dumps(wrap_message(minimal_host(insights_id=insights_id).data(), "add_host", get_platform_metadata()))
+        for insights_id in (existing_insights_id, new_insights_id, new_insights_id)
+    ]
+
+    # Patch batch settings in inventory_config()
+    mocker.patch(
+        "app.queue.host_mq.inventory_config",
+        return_value=SimpleNamespace(
+            mq_db_batch_max_messages=3,
+            mq_db_batch_max_seconds=1,
+            mq_db_batch_dedup=True,
+            mq_prevalidation_workers=0,
+            mq_coalesce_host_events=False,
+            mq_skip_unchanged_host_events=False,
+            culling_stale_warning_offset_delta=1,
+            culling_culled_offset_delta=1,
+            conventional_time_to_stale_seconds=1,
+            conventional_time_to_stale_warning_seconds=1,
+            conventional_time_to_delete_seconds=1,
+            immutable_time_to_stale_seconds=1,
+            immutable_time_to_stale_warning_seconds=1,
+            immutable_time_to_delete_seconds=1,
+        ),
+    )
+    write_batch_patch = mocker.patch("app.queue.host_mq.write_message_batch")
+    find_existing_host_patch = mocker.patch(
+        "lib.host_repository.find_existing_host", wraps=host_repository.find_existing_host
+    )
+
+    fake_consumer = mocker.Mock(
+        **{"consume.side_effect": [[FakeMessage(message=msg) for msg in msg_list], [], [], []]}
+    )
+    consumer = IngressMessageConsumer(fake_consumer, flask_app, mocker.Mock(), mocker.Mock())
+    consumer.event_loop(interrupt=mocker.Mock(side_effect=([False for _ in range(2)] + [True])))
+
+    processed_rows = write_batch_patch.call_args_list[0][0][2]
+    assert [row.event_type for row in processed_rows] == [EventType.updated, EventType.created, EventType.updated]
+    assert processed_rows[0].host_row.id == existing_host.id
+    assert processed_rows[1].host_row.id == processed_rows[2].host_row.id
+
+    # All the hosts were resolved using the prefetched candidates
+    find_existing_host_patch.assert_not_called()
+
+
 @pytest.mark.usefixtures("flask_app")
 @pytest.mark.parametrize("identity", (SYSTEM_IDENTITY,))
 def test_add_host_logs(identity, mocker, caplog):
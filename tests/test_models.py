@@ -6,6 +6,7 @@ from datetime import timedelta
 
 import pytest
 from marshmallow import ValidationError as MarshmallowValidationError
+from sqlalchemy import event
 from sqlalchemy.exc import DataError
 from sqlalchemy.exc import IntegrityError
 
@@ -416,6 +417,90 @@ def test_host_model_updated_timestamp(db_create_host):
     assert host.modified_on < after_update_commit
 
 
+def _content_host(**kwargs):
+    return Host(
+        canonical_facts={"fqdn": "fqdn"},
+        display_name="display_name",
+        facts={"ns": {"key": "value"}},
+        tags={"ns": {"key": ["value"]}},
+        system_profile_facts={"number_of_cpus": 1, "arch": "x86_64"},
+        reporter="puptoo",
+        stale_timestamp=now(),
+        org_id=USER_IDENTITY["org_id"],
+        **kwargs,
+    )
+
+
+def test_update_host_with_identical_data_is_not_a_content_change(db_create_host):
+    existing_host = db_create_host(host=_content_host())
+
+    existing_host.update(_content_host(), update_system_profile=True)
+
+    assert not existing_host.content_modified()
+    # Only the check-in fields are written
+    db.session.commit()
+    assert existing_host.system_profile_facts == {"number_of_cpus": 1, "arch": "x86_64"}
+
+
+@pytest.mark.parametrize(
+    "input_host_kwargs",
+    (
+        {"system_profile_facts": {"number_of_cpus": 2}},
+        {"facts": {"ns": {"key": "other value"}}},
+        {"tags": {"ns": {"key": ["other value"]}}},
+        {"display_name": "other_display_name"},
+    ),
+)
+def test_update_host_with_different_data_is_a_content_change(db_create_host, input_host_kwargs):
+    existing_host = db_create_host(host=_content_host())
+    input_host = _content_host()
+    for field, value in input_host_kwargs.items():
+        setattr(input_host, field, value)
+
+    existing_host.update(input_host, update_system_profile=True)
+
+    assert existing_host.content_modified()
+    db.session.commit()
+    assert not existing_host.content_modified()
+
+
+@pytest.mark.parametrize("host_type", (None, "edge"))
+def test_host_staleness_columns_are_computed_on_write(db_create_host, host_type):
+    staleness = get_sys_default_staleness()
+    staleness_type = "immutable" if host_type == "edge" else "conventional"
+    host = _content_host()
+    host.system_profile_facts = {"host_type": host_type} if host_type else {}
+    db_create_host(host=host)
+
+    for _ in range(2):
+        assert host.stale_at == host.modified_on + timedelta(seconds=staleness[f"{staleness_type}_time_to_stale"])
+        assert host.stale_warning_at == host.modified_on + timedelta(
+            seconds=staleness[f"{staleness_type}_time_to_stale_warning"]
+        )
+        assert host.culled_at == host.modified_on + timedelta(seconds=staleness[f"{staleness_type}_time_to_delete"])
+
+        # The columns follow modified_on when the host is updated
+        host.display_name = "updated_display_name"
+        db.session.commit()
+
+
+def test_host_staleness_is_loaded_once_per_flush(flask_app, db_create_multiple_hosts):  # noqa: ARG001
+    staleness_statements = []
+
+    def _count_staleness_statements(conn, cursor, statement, parameters, context, executemany):  # noqa: ARG001
+        if "hbi.staleness" in statement:
+            staleness_statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count_staleness_statements)
+    try:
+        hosts = db_create_multiple_hosts(how_many=3)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count_staleness_statements)
+
+    assert len(staleness_statements) == 1
+    assert all(host.stale_at is not None for host in hosts)
+
+
 def test_host_model_timestamp_timezones(db_create_host):
     host = Host(
         account=USER_IDENTITY["account_number"],
@@ -331,6 +331,33 @@ def test_system_profile_operating_system(mq_create_or_update_host, api_get):
         assert item_count == os_dict[item_key]["count"]
 
 
+def test_system_profile_operating_system_ordering_and_pagination(mq_create_or_update_host, api_get):
+    sp_data = [
+        {"operating_system": {"name": "RHEL", "major": 8, "minor": 1}},
+        {"operating_system": {"name": "RHEL", "major": 8, "minor": 1}},
+        {"operating_system": {"name": "RHEL", "major": 8, "minor": 1}},
+        {"operating_system": {"name": "CentOS", "major": 7, "minor": 9}},
+        {"operating_system": {"name": "CentOS", "major": 7, "minor": 9}},
+        {"operating_system": {"name": "RHEL", "major": 9, "minor": 0}},
+    ]
+    for system_profile in sp_data:
+        mq_create_or_update_host(minimal_host(insights_id=generate_uuid(), system_profile=system_profile))
+
+    # The most common operating systems come first, and the total counts all of them
+    response_status, response_data = api_get(build_system_profile_operating_system_url(query="?per_page=2&page=1"))
+    assert response_status == 200
+    assert response_data["total"] == 3
+    assert response_data["results"] == [
+        {"value": {"name": "RHEL", "major": 8, "minor": 1}, "count": 3},
+        {"value": {"name": "CentOS", "major": 7, "minor": 9}, "count": 2},
+    ]
+
+    response_status, response_data = api_get(build_system_profile_operating_system_url(query="?per_page=2&page=2"))
+    assert response_status == 200
+    assert response_data["total"] == 3
+    assert response_data["results"] == [{"value": {"name": "RHEL", "major": 9, "minor": 0}, "count": 1}]
+
+
 def test_system_profile_sap_system(mq_create_or_update_host, api_get):
     # Create some sap systems
     ordered_sap_system_data = [True, True, False, False, True, False]
@@ -428,3 +455,40 @@ def test_system_profile_sap_sids_with_search(mq_create_or_update_host, api_get):
         item_count = item["count"]
         if item["value"]:
             assert {item["value"]: item_count} == {item["value"]: expected_counts[item["value"]]}
+
+
+@pytest.mark.usefixtures("facet_rollup_enabled")
+def test_system_profile_facets_from_rollup(mq_create_or_update_host, api_get, api_delete_host):
+    sp_data = [
+        {"operating_system": {"name": "RHEL", "major": 8, "minor": 1}, "sap_sids": ["ABC"], "sap_system": True},
+        {"operating_system": {"name": "RHEL", "major": 8, "minor": 1}, "sap_sids": ["ABC", "XYZ"], "sap_system": True},
+        {"operating_system": {"name": "RHEL", "major": 9, "minor": 0}, "sap_system": False},
+    ]
+    insights_ids = [generate_uuid() for _ in sp_data]
+    hosts = [
+        mq_create_or_update_host(minimal_host(insights_id=insights_id, system_profile=system_profile))
+        for insights_id, system_profile in zip(insights_ids, sp_data)
+    ]
+
+    # The rollups follow the updated and deleted hosts
+    mq_create_or_update_host(
+        minimal_host(
+            insights_id=insights_ids[2],
+            system_profile={"operating_system": {"name": "RHEL", "major": 8, "minor": 1}, "sap_system": False},
+        )
+    )
+    response_status, _ = api_delete_host(hosts[1].id)
+    assert response_status == 200
+
+    response_status, response_data = api_get(build_system_profile_operating_system_url())
+    assert response_status == 200
+    assert response_data["total"] == 1
+    assert response_data["results"] == [{"value": {"name": "RHEL", "major": 8, "minor": 1}, "count": 2}]
+
+    response_status, response_data = api_get(build_system_profile_sap_sids_url())
+    assert response_status == 200
+    assert response_data["results"] == [{"value": "ABC", "count": 1}]
+
+    response_status, response_data = api_get(build_system_profile_sap_system_url())
+    assert response_status == 200
+    assert response_data["results"] == [{"value": False, "count": 1}, {"value": True, "count": 1}]
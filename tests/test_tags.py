@@ -15,6 +15,7 @@ from tests.helpers.api_utils import build_tags_url
 from tests.helpers.api_utils import create_mock_rbac_response
 from tests.helpers.test_utils import SYSTEM_IDENTITY
 from tests.helpers.test_utils import generate_uuid
+from tests.helpers.test_utils import minimal_host
 from tests.helpers.test_utils import now
 
 
@@ -357,3 +358,82 @@ def test_get_tags_with_dollar_signs_via_db(api_get, db_create_host, tag, flatten
 
     assert response_status == 200
     assert flattened_tag == response_data["results"][0]["tag"]
+
+
+def test_get_tags_counts_ordering_and_pagination_via_db(db_create_multiple_hosts, api_get):
+    db_create_multiple_hosts(how_many=3, extra_data={"tags": {"ns1": {"key1": ["val1"], "key2": []}}})
+    db_create_multiple_hosts(how_many=1, extra_data={"tags": {"ns1": {"key1": ["val1", "val2"]}, "null": {"k": None}}})
+
+    response_status, response_data = api_get(build_tags_url(query="?order_by=count&order_how=DESC"))
+    assert_response_status(response_status, 200)
+    assert response_data["total"] == 4
+    assert [(result["tag"], result["count"]) for result in response_data["results"]] == [
+        ({"namespace": "ns1", "key": "key1", "value": "val1"}, 4),
+        ({"namespace": "ns1", "key": "key2", "value": None}, 3),
+        ({"namespace": None, "key": "k", "value": None}, 1),
+        ({"namespace": "ns1", "key": "key1", "value": "val2"}, 1),
+    ]
+
+    response_status, response_data = api_get(build_tags_url(query="?order_by=tag&order_how=ASC&per_page=2&page=2"))
+    assert_response_status(response_status, 200)
+    assert response_data["total"] == 4
+    assert [result["tag"] for result in response_data["results"]] == [
+        {"namespace": "ns1", "key": "key1", "value": "val2"},
+        {"namespace": "ns1", "key": "key2", "value": None},
+    ]
+
+    response_status, response_data = api_get(build_tags_url(query="?per_page=2&page=3"))
+    assert_response_status(response_status, 200)
+    assert response_data["total"] == 4
+    assert response_data["results"] == []
+
+
+@pytest.mark.usefixtures("facet_rollup_enabled")
+def test_get_tags_from_rollup(mq_create_or_update_host, api_get):
+    insights_ids = [generate_uuid() for _ in range(3)]
+    for insights_id in insights_ids:
+        mq_create_or_update_host(
+            minimal_host(
+                insights_id=insights_id,
+                tags=[{"namespace": "ns1", "key": "key1", "value": "val1"}, {"namespace": "ns1", "key": "key2"}],
+            )
+        )
+
+    # The rollup follows the updated tags
+    mq_create_or_update_host(
+        minimal_host(insights_id=insights_ids[0], tags=[{"namespace": "ns1", "key": "key1", "value": "val2"}])
+    )
+
+    response_status, response_data = api_get(build_tags_url(query="?order_by=count&order_how=DESC"))
+    assert_response_status(response_status, 200)
+    assert response_data["total"] == 3
+    assert [(result["tag"], result["count"]) for result in response_data["results"]] == [
+        ({"namespace": "ns1", "key": "key1", "value": "val1"}, 2),
+        ({"namespace": "ns1", "key": "key2", "value": None}, 2),
+        ({"namespace": "ns1", "key": "key1", "value": "val2"}, 1),
+    ]
+
+
+def test_get_tags_from_rollup_sorted_like_the_tags_query(mq_create_or_update_host, api_get, request):
+    for tags in (
+        [{"namespace": "ns1", "key": "key1", "value": "null"}],
+        [{"namespace": "ns1", "key": "key1", "value": "Alpha"}],
+        [{"namespace": "ns1", "key": "key2"}],
+    ):
+        mq_create_or_update_host(minimal_host(insights_id=generate_uuid(), tags=tags))
+
+    url = build_tags_url(query="?order_by=tag&order_how=ASC")
+    response_status, query_response_data = api_get(url)
+    assert_response_status(response_status, 200)
+
+    request.getfixturevalue("facet_rollup_enabled")
+    response_status, rollup_response_data = api_get(url)
+    assert_response_status(response_status, 200)
+
+    # "ns1/key1=Alpha" < "ns1/key1=None" < "ns1/key2="
+    assert [result["tag"] for result in rollup_response_data["results"]] == [
+        {"namespace": "ns1", "key": "key1", "value": "Alpha"},
+        {"namespace": "ns1", "key": "key1", "value": None},
+        {"namespace": "ns1", "key": "key2", "value": None},
+    ]
+    assert rollup_response_data["results"] == query_response_data["results"]
@@ -1,6 +1,9 @@
 import csv
 import io
 
+# The approximate number of characters in each chunk of iter_csv_chunks
+CSV_CHUNK_SIZE = 64 * 1024
+
 
 def _tags_to_string(tags_arr):
     tags_str = ""
@@ -11,17 +14,26 @@ def _tags_to_string(tags_arr):
     return f"{tags_str}"
 
 
-def json_arr_to_csv(json_arr_data):
-    # Prepare a buffer to store the CSV data
+def iter_csv_chunks(json_arr_data, chunk_size=CSV_CHUNK_SIZE):
+    # The rows are written one at a time, and the buffer is emptied every chunk_size characters,
+    # so json_arr_data may be an iterator that is never held in memory as a whole.
     output = io.StringIO()
     writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(json_arr_data[0].keys())
-    for host in json_arr_data:
+    for index, host in enumerate(json_arr_data):
+        if index == 0:
+            writer.writerow(host.keys())
         host["tags"] = _tags_to_string(host["tags"])
         # Write the data row
         writer.writerow(host.values())
 
-    # Get the CSV string from the buffer
-    csv_string = output.getvalue()
+        if output.tell() >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    if output.tell():
+        yield output.getvalue()
 
-    return csv_string
+
+def json_arr_to_csv(json_arr_data):
+    return "".join(iter_csv_chunks(json_arr_data))
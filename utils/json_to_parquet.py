@@ -0,0 +1,63 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.serialization import _EXPORT_SERVICE_FIELDS
+
+# The exported fields are strings, except for the tags, which keep their structure
+_TAG_FIELDS = ("namespace", "key", "value")
+
+
+class _ChunkSink(io.RawIOBase):
+    # Keeps only the bytes written since the last pop, but reports the position in the whole file,
+    # which the Parquet writer records in the file footer.
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema():
+    tag_type = pa.struct([(field, pa.string()) for field in _TAG_FIELDS])
+    return pa.schema(
+        [(field, pa.list_(tag_type) if field == "tags" else pa.string()) for field in _EXPORT_SERVICE_FIELDS]
+    )
+
+
+def iter_parquet_chunks(json_arr_data, batch_size, compression=None):
+    # The hosts are written in record batches of batch_size rows, each one a row group of the file.
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression or "snappy")
+    try:
+        hosts = []
+        for host in json_arr_data:
+            hosts.append(host)
+            if len(hosts) >= batch_size:
+                writer.write_batch(pa.RecordBatch.from_pylist(hosts, schema=schema))
+                hosts = []
+                yield sink.pop()
+
+        if hosts:
+            writer.write_batch(pa.RecordBatch.from_pylist(hosts, schema=schema))
+    finally:
+        writer.close()
+
+    yield sink.pop()
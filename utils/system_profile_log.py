@@ -2,7 +2,7 @@ from app.common import inventory_config
 from app.models import Host
 
 
-def _extract_sp_to_log(sp_data: dict) -> dict:
+def extract_sp_to_log(sp_data: dict) -> dict:
     if not sp_data:
         return {}
     else:
@@ -10,8 +10,8 @@ def _extract_sp_to_log(sp_data: dict) -> dict:
 
 
 def extract_host_model_sp_to_log(host: Host) -> dict:
-    return _extract_sp_to_log(host.system_profile_facts)
+    return extract_sp_to_log(host.system_profile_facts)
 
 
 def extract_host_dict_sp_to_log(host_data: dict) -> dict:
-    return _extract_sp_to_log(host_data.get("system_profile", {}))
+    return extract_sp_to_log(host_data.get("system_profile", {}))